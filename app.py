@@ -1,9 +1,7 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request, g
 import sqlite3
 import pandas as pd
 import os
-import io
-import threading
 
 app = Flask(__name__)
 
@@ -12,34 +10,101 @@ import sys
 # Ensure src can be imported if app.py is run directly
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from src.config import DB_PATH
+from src.db import get_connection, get_read_connection, ensure_schema
 from src.etl import build_tsa_db, fetch_polymarket, get_weather_features, merge_db
 from src.models import train_xgb
+from src.services.job_queue import jobs
+from src.services.response_cache import response_cache, UncacheableResponse
+from src.services.market_sentiment import DEFAULT_LOOKBACK, build_market_sentiment, canonical_lookback
+from src.utils.instrumentation import flush as flush_spans, query_spans, span
+
+# [NEW] 启动时应用 Schema 迁移 (主键 + 覆盖索引)
+try:
+    _schema_conn = get_connection()
+    ensure_schema(_schema_conn)
+    _schema_conn.close()
+except Exception as e:
+    print(f"⚠️ Schema migration skipped: {e}")
 
 # 获取数据库连接的助手函数
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # 允许通过列名访问结果
+    # [NEW] 只读池化连接 (WAL): 后台 ETL 写入期间仍可读取
+    conn = get_read_connection(row_factory=sqlite3.Row)  # 允许通过列名访问结果
     return conn
 
+# [NEW] 后台任务: 有界线程池 + 同类型任务合并 (single-flight)，状态持久化到 jobs 表
+# 验证拟合也移出请求路径: 请求只跑生产模式，验证 MAPE 作为 'validate' 任务在后台补跑
+def schedule_validation():
+    job_id, _ = jobs.submit('validate', lambda job: train_xgb.run(mode='validate'))
+    return job_id
+
+# 生产模型重训的互斥键: run_prediction 与 update_data 是不同的 job_type (single-flight 不合并)，
+# 但都会重训生产模型并重写 prediction_history，须串行执行。训练失败时 train_xgb.run 抛出异常，任务标记为 failed
+RETRAIN_LOCK = 'retrain_production'
+
+def retrain_production(job):
+    with jobs.exclusive(RETRAIN_LOCK, job):
+        train_xgb.run(mode='production')
+
+def job_response(job_id, created, message):
+    """提交任务后的统一响应 (202 Accepted)；前端据 job_id 轮询 /api/jobs/<id>"""
+    return jsonify({
+        'status': 'accepted',
+        'job_id': job_id,
+        'coalesced': not created,
+        'message': message if created else '同类任务正在运行，已合并到现有任务',
+        'poll_url': f'/api/jobs/{job_id}'
+    }), 202
+
+# [NEW] 请求级计时 span (src/utils/instrumentation.py)：墙钟 / CPU / RSS 写入 metric_spans，由 /api/metrics 读取
+# 静态文件与任务轮询 (/api/jobs/<id>) 不计时：请求量大且无分析价值
+_UNTIMED_ENDPOINTS = (None, 'static', 'get_job')
+
+@app.before_request
+def start_request_span():
+    if request.endpoint in _UNTIMED_ENDPOINTS:
+        return
+    g.request_span = span(f"route.{request.endpoint}", method=request.method).__enter__()
+
+@app.after_request
+def tag_request_span(response):
+    request_span = g.get('request_span')
+    if request_span is not None:
+        request_span.tags['status'] = response.status_code
+    return response
+
+@app.teardown_request
+def end_request_span(exc):
+    request_span = g.pop('request_span', None)
+    if request_span is not None:
+        request_span.__exit__(type(exc) if exc else None, exc, None)
+
 # 主页路由：返回仪表盘 HTML
 @app.route('/')
 def index():
     return render_template('index.html')
 
 # API: 获取历史流量数据 (用于绘制主图表)
+# [NEW] 响应缓存: 按数据版本号 (traffic) + 截止日期缓存序列化结果，支持 ETag/304
+# 截止日期只计算一次 (本地日期)，既作缓存 key 又作 SQL 绑定参数；
+# 不再用 SQLite 的 date('now') (UTC)，避免跨日时缓存 key 与查询结果不一致
 @app.route('/api/data')
 def get_data():
+    cutoff = pd.Timestamp.now().strftime('%Y-%m-%d')
+    return response_cache.serve('data', ('traffic',), lambda: _build_data_payload(cutoff), extra=cutoff)
+
+def _build_data_payload(cutoff):
     conn = get_db_connection()
     # 查询全量宽表 (包含天气和节日特征)
-    # 限制为当前时间之前的数据，或者全部数据
+    # 限制为截止日期 (含) 之前的数据
     query = """
         SELECT date, throughput, weather_index, is_holiday, holiday_name 
         FROM traffic_full 
-        WHERE date <= date('now') 
+        WHERE date <= ? 
         ORDER BY date ASC
     """
     try:
-        rows = conn.execute(query).fetchall()
+        rows = conn.execute(query, (cutoff,)).fetchall()
     except sqlite3.OperationalError:
         # Fallback if traffic_full doesn't exist yet
         rows = conn.execute('SELECT date, throughput FROM traffic ORDER BY date ASC').fetchall()
@@ -60,7 +125,7 @@ def get_data():
         
         data.append(item)
         
-    return jsonify(data)
+    return data
 # API: 获取生数据 (Raw Data) - 支持分页
 @app.route('/api/raw_data')
 def get_raw_data():
@@ -110,9 +175,41 @@ def get_raw_data():
         print(f"Error in get_raw_data: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# API: 特征矩阵切片 (Feature Store，与训练/回测共用同一份缓存)
+@app.route('/api/features')
+def get_features():
+    try:
+        from flask import request
+        from src.models.feature_store import FeatureStore
+        start = request.args.get('start')
+        end = request.args.get('end')
+        columns = request.args.get('columns')
+        columns = [c.strip() for c in columns.split(',') if c.strip()] if columns else None
+        
+        df = FeatureStore().get_slice(start, end, columns=columns)
+        if 'ds' in df.columns:
+            df = df.drop(columns=['ds'])
+        df = df.astype(object).where(df.notna(), None)
+        
+        return jsonify({
+            'status': 'success',
+            'count': len(df),
+            'data': df.to_dict(orient='records')
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error in get_features: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 # API: 获取预测结果和历史验证数据
+# [NEW] 响应缓存: traffic + predictions 版本号不变时直接返回缓存字节
 @app.route('/api/predictions')
 def get_predictions():
+    today = pd.Timestamp.now().strftime('%Y-%m-%d')
+    return response_cache.serve('predictions', ('traffic', 'predictions'), _build_predictions_payload, extra=today)
+
+def _build_predictions_payload():
     result = {}
     
     try:
@@ -132,23 +229,21 @@ def get_predictions():
             
         print(f"   [API] Detection Boundary for Forecast: > {boundary_date}")
         
-        # 1. 加载未来预测 (Forecast) - From SQLite 'prediction_history'
+        # 1. 加载未来预测 (Forecast) - From SQLite 'prediction_latest'
         # Logic: Get predictions for Date > Latest Actual Date
+        # [NEW] prediction_latest 每个 target_date 只有最新一条，无需再去重
         query_forecast = """
             SELECT target_date, predicted_throughput, model_run_date, 
                    weather_index, is_holiday, flight_volume, holiday_name 
-            FROM prediction_history 
+            FROM prediction_latest 
             WHERE target_date > ?
+            ORDER BY target_date ASC
         """
         df_preds = pd.read_sql(query_forecast, conn, params=(boundary_date,))
         
         if not df_preds.empty:
-            # Dedupe: keep latest model_run_date for each target_date
             df_preds['target_date'] = pd.to_datetime(df_preds['target_date']).dt.strftime('%Y-%m-%d')
-            # Sort by run_date DESC, keep first
-            df_forecast = df_preds.sort_values('model_run_date', ascending=False).drop_duplicates('target_date')
-            # Sort by date ASC for chart
-            df_forecast = df_forecast.sort_values('target_date')
+            df_forecast = df_preds
             # Fill NaNs for display
             df_forecast[['weather_index', 'is_holiday', 'flight_volume']] = df_forecast[['weather_index', 'is_holiday', 'flight_volume']].fillna(0)
             
@@ -161,13 +256,14 @@ def get_predictions():
 
         result['sniper_latest'] = None
 
-        # 2. 加载历史验证 (Validation) - From SQLite 'prediction_history' & 'traffic_full'
-        # Query History (Past predictions)
+        # 2. 加载历史验证 (Validation) - From SQLite 'prediction_latest' & 'traffic_full'
+        # Query History (Past predictions, latest per target_date)
         query_hist = """
             SELECT target_date, predicted_throughput, model_run_date, 
                    weather_index, is_holiday, flight_volume
-            FROM prediction_history 
+            FROM prediction_latest 
             WHERE target_date <= ?
+            ORDER BY target_date ASC
         """
         df_hist = pd.read_sql(query_hist, conn, params=(boundary_date,))
         
@@ -176,10 +272,7 @@ def get_predictions():
         if not df_hist.empty:
             # 1. Standardize formatting
             df_hist['target_date'] = pd.to_datetime(df_hist['target_date']).dt.strftime('%Y-%m-%d')
-            # 2. Keep latest prediction per date
-            df_hist_clean = df_hist.sort_values('model_run_date', ascending=False).drop_duplicates('target_date')
-            # 3. Sort for chart
-            df_hist_clean = df_hist_clean.sort_values('target_date')
+            df_hist_clean = df_hist.copy()
             # Fill NaNs
             df_hist_clean[['weather_index', 'is_holiday', 'flight_volume']] = df_hist_clean[['weather_index', 'is_holiday', 'flight_volume']].fillna(0)
             
@@ -202,12 +295,9 @@ def get_predictions():
             # df_hist['target_date'] is already standardized above
             df_actual['date'] = pd.to_datetime(df_actual['date']).dt.strftime('%Y-%m-%d')
             
-            # Merge
+            # Merge (df_hist 已是每个日期的最新预测)
             merged = pd.merge(df_hist, df_actual, left_on='target_date', right_on='date', how='inner')
             
-            # Keep latest prediction per target date (using target_date for dedupe logic works, or date)
-            merged = merged.sort_values('model_run_date', ascending=False).drop_duplicates('target_date')
-            
             # Calculate Error
             merged['difference'] = merged['predicted_throughput'] - merged['throughput']
             merged['error_rate'] = (merged['difference'].abs() / merged['throughput']) * 100
@@ -237,8 +327,9 @@ def get_predictions():
         result['forecast'] = []
         result['validation'] = []
         result['history'] = []
+        raise UncacheableResponse(result)
         
-    return jsonify(result)
+    return result
  
 # API V2: 强控协议标头导出 (兼容所有 Flask 版本)
 @app.route('/api/v2/secure_export')
@@ -247,10 +338,9 @@ def secure_export():
         conn = get_db_connection()
         query = """
             SELECT p.target_date, p.predicted_throughput
-            FROM prediction_history p
+            FROM prediction_latest p
             LEFT JOIN traffic t ON p.target_date = t.date
             WHERE (t.throughput IS NULL OR t.throughput = 0)
-            AND p.id IN (SELECT MAX(id) FROM prediction_history GROUP BY target_date)
             ORDER BY p.target_date ASC
         """
         df = pd.read_sql(query, conn)
@@ -275,32 +365,63 @@ def secure_export():
     except Exception as e:
         return str(e), 500
 
+def _job_run_prediction(job):
+    print("🚀 正在触发模型运行 (train_xgb.run, production)...")
+    job.progress(0.1, '训练生产模型并生成预测...')
+    # 直接调用函数 (仅生产模式；验证在后台补跑)
+    retrain_production(job)
+    job.progress(0.95, '调度后台验证...')
+    validation_job = schedule_validation()
+    print("✅ Model Run Success")
+    return {'summary': 'Executed via Job Queue', 'validation_job_id': validation_job}
+
 @app.route('/api/run_prediction', methods=['POST'])
 def run_prediction():
     try:
-        print("🚀 正在触发模型运行 (train_xgb.run)...")
-        
-        # 直接调用函数
-        train_xgb.run()
-        
-        print("✅ Model Run Success")
-        return jsonify({
-            'status': 'success', 
-            'message': '预测完成!数据已更新',
-            'summary': 'Executed via Direct Call'
-        })
-            
+        job_id, created = jobs.submit('run_prediction', _job_run_prediction)
+        return job_response(job_id, created, '预测任务已提交')
     except Exception as e:
         print(f"❌ Execution Error: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-# [NEW] Import Refactored Modules
-from src.etl import build_tsa_db, fetch_polymarket, get_weather_features, merge_db
-from src.models import train_xgb
+# [NEW] 任务状态轮询
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'Job {job_id} not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs')
+def list_jobs():
+    from flask import request
+    job_type = request.args.get('type')
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({'active': jobs.active(), 'jobs': jobs.recent(job_type, limit)})
 
-# ...
+def _job_update_pipeline(job, target_label):
+    print(f"\n🚀 [Async] 后台长耗时任务启动 (Target: {target_label})...")
+    
+    # A. [Async] OpenSky Removed
+    # B. [ASYNC] Sniper Removed
+
+    # C. [ASYNC] 全量 ETL 流水线
+    print("🚀 [Async] 正在执行全量 ETL 合并与模型重训...")
+    changes = {}   # [NEW] TSA changeset -> merge_db 只重算受影响的窗口
+    steps = [
+        ('抓取 TSA 数据', lambda: changes.update(traffic=build_tsa_db.run(latest=True))),
+        ('更新天气特征', get_weather_features.run),
+        ('合并宽表', lambda: merge_db.run(changed_dates=changes.get('traffic'))),
+        ('训练生产模型', lambda: retrain_production(job)),
+    ]
+    for i, (label, step) in enumerate(steps):
+        job.progress(i / len(steps), label)
+        step()
+    validation_job = schedule_validation()
+    print("✅ [Async] 后台流程全部完成")
+    return {'target': target_label, 'validation_job_id': validation_job}
 
 @app.route('/api/update_data', methods=['POST'])
 def update_data():
@@ -321,9 +442,9 @@ def update_data():
         
         query_pred = """
             SELECT target_date, predicted_throughput, holiday_name, model_run_date
-            FROM prediction_history
+            FROM prediction_latest
             WHERE target_date > ?
-            ORDER BY target_date ASC, model_run_date DESC
+            ORDER BY target_date ASC
             LIMIT 1
         """
         pred_row = conn.execute(query_pred, (max_actual_date,)).fetchone()
@@ -342,7 +463,6 @@ def update_data():
         
         # A. [SYNC] 实时同步 Polymarket (较快)
         print(f"🎯 [Sync] 正在实时抓取 Polymarket 最新赔率...")
-        from src.etl import fetch_polymarket
         try:
             fetch_polymarket.run(recent=True)
         except Exception as fe:
@@ -370,34 +490,15 @@ def update_data():
         except: pass
 
     # --- 3. 异步启动：耗时/限流任务 (OpenSky & 全量 ETL) ---
-    def run_async_pipeline():
-        try:
-            print(f"\n🚀 [Async] 后台长耗时任务启动 (Target: {target_date if latest_unresolved else 'None'})...")
-            
-            # A. [Async] OpenSky Removed
-            # print("🚀 [Async] OpenSky Skipped (Deprecated)...")
-
-            # B. [ASYNC] 重新运行深度狙击预测 (允许 JIT，补全数据)
-            # Removed sniper related code
-
-            # C. [ASYNC] 全量 ETL 流水线
-            print("🚀 [Async] 正在执行全量 ETL 合并与模型重训...")
-            build_tsa_db.run(latest=True)
-            get_weather_features.run()
-            merge_db.run()
-            train_xgb.run()
-            print("✅ [Async] 后台流程全部完成")
-        except Exception as e:
-            print(f"❌ [Async] 后台任务崩溃: {e}")
-
-    thread = threading.Thread(target=run_async_pipeline)
-    thread.daemon = True
-    thread.start()
+    # [NEW] 作为 'update_data' 后台任务提交；重复点击会合并到正在运行的任务，不再并发跑多套 ETL
+    pipeline_target = target_date if latest_unresolved else 'None'
+    job_id, created = jobs.submit('update_data', _job_update_pipeline, pipeline_target)
 
     # --- 4. 返回包含实时赔率的结果 ---
     return jsonify({
         'status': 'success',
-        'message': '数据已实时同步并返回，全量更新已在后台触发。',
+        'message': '数据已实时同步并返回，全量更新已在后台触发。' if created else '数据已实时同步并返回，全量更新已在运行中 (已合并)。',
+        'job_id': job_id,
         'prediction_sources': {
             'long_term_forecast': latest_unresolved,
             'short_term_sniper': None,
@@ -409,140 +510,88 @@ def update_data():
 # API: 狙击模型 (T+0 Nowcasting)
 
 
+def _job_run_challenger(job):
+    import subprocess
+    import sys
+    import json
+    
+    print("🟣 启动 FLAML 挑战者训练任务...")
+    job.progress(0.05, 'FLAML 训练中...')
+    
+    # 运行训练脚本
+    result = subprocess.run(
+        [sys.executable, '-m', 'src.models.train_challenger'],
+        capture_output=True,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        timeout=600 # 10分钟超时
+    )
+    
+    if result.returncode != 0:
+        raise RuntimeError(f"Training failed: {result.stderr}")
+        
+    # 读取生成的摘要
+    if not os.path.exists("challenger_summary.json"):
+        raise RuntimeError("Model trained but no summary file found.")
+    with open("challenger_summary.json", 'r') as f:
+        return json.load(f)
+
 @app.route('/api/run_challenger', methods=['POST'])
 def run_challenger():
-    """触发 FLAML 深度分析 (Challenger Model)"""
+    """触发 FLAML 深度分析 (Challenger Model)，后台任务执行，结果通过 /api/jobs/<id> 获取"""
     try:
-        import subprocess
-        import sys
-        import json
-        
-        print("🟣 启动 FLAML 挑战者训练任务...")
-        
-        # 运行训练脚本
-        result = subprocess.run(
-            [sys.executable, '-m', 'src.models.train_challenger'],
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            timeout=600 # 10分钟超时
-        )
-        
-        if result.returncode != 0:
-            return jsonify({
-                'status': 'error', 
-                'message': f"Training failed: {result.stderr}"
-            }), 500
-            
-        # 读取生成的摘要
-        if os.path.exists("challenger_summary.json"):
-            with open("challenger_summary.json", 'r') as f:
-                summary = json.load(f)
-            return jsonify({
-                'status': 'success',
-                'data': summary
-            })
-        else:
-             return jsonify({
-                'status': 'error', 
-                'message': "Model trained but no summary file found."
-            }), 500
-            
+        job_id, created = jobs.submit('run_challenger', _job_run_challenger)
+        return job_response(job_id, created, '挑战者训练任务已提交')
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/market_sentiment')
 def get_market_sentiment():
-    """获取 Polymarket 市场情绪 (仅显示 TSA 官网尚未出分/未结盘的市场)"""
+    """
+    获取 Polymarket 市场情绪 (仅显示 TSA 官网尚未出分/未结盘的市场)
+    ?lookback=1h|6h|24h (默认 6h): 涨跌对比窗口，字段名为 change_<lookback>
+    lookback 先规范化 (06h / 360m -> 6h)，缓存 key 与字段名均使用规范标签
+    """
+    from flask import request
+    try:
+        lookback = canonical_lookback(request.args.get('lookback', DEFAULT_LOOKBACK))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # [NEW] 响应缓存: traffic (结盘日期) + market 版本号；
+    # 历史窗口随时间滑动，额外按小时分桶，最多滞后 1 小时
+    hour = pd.Timestamp.now().strftime('%Y-%m-%d %H')
+    return response_cache.serve(f'market_sentiment:{lookback}', ('traffic', 'market'),
+                                lambda: _build_market_sentiment_payload(lookback), extra=hour)
+
+def _build_market_sentiment_payload(lookback):
     try:
         conn = get_db_connection()
-        
-        # 1. 识别已结盘日期 (TSA 官网已出分)
-        # 即使日期过了，只要 TSA 没出分，市场就不该下架
-        query_resolved = "SELECT date FROM traffic WHERE throughput IS NOT NULL"
-        resolved_dates = [row['date'] for row in conn.execute(query_resolved).fetchall()]
-        
-        # 2. 获取每个 (date, outcome) 的最新快照
-        query_latest = """
-            SELECT target_date, outcome_label, price as current_price, fetched_at, market_slug
-            FROM market_sentiment_snapshots 
-            WHERE id IN (
-                SELECT MAX(id) 
-                FROM market_sentiment_snapshots 
-                GROUP BY target_date, outcome_label
-            )
-            ORDER BY target_date ASC, outcome_label ASC
-        """
-        rows_latest = conn.execute(query_latest).fetchall()
-        
-        # 3. 过滤逻辑：剔除已结盘日期
-        # [NEW] 允许保留最近 1 个已结盘日期作为参考，其他的全部剔除
-        filtered_latest = [r for r in rows_latest if r['target_date'] not in resolved_dates]
-        
-        # 4. 获取 ~6小时前的价格用于对标增量
-        query_all_recent = """
-            SELECT target_date, outcome_label, price, fetched_at
-            FROM market_sentiment_snapshots
-            WHERE fetched_at >= datetime('now', '-24 hours')
-            ORDER BY fetched_at ASC
-        """
-        all_rows = conn.execute(query_all_recent).fetchall()
-        conn.close()
-        
-        from datetime import datetime
-        import pandas as pd
-        
-        history_map = {}
-        for r in all_rows:
-            key = f"{r['target_date']}|{r['outcome_label']}"
-            fetched_dt = datetime.strptime(r['fetched_at'], '%Y-%m-%d %H:%M:%S')
-            if key not in history_map:
-                history_map[key] = []
-            history_map[key].append((fetched_dt, r['price']))
-            
-        results = []
-        for r in filtered_latest:
-            key = f"{r['target_date']}|{r['outcome_label']}"
-            curr_price = r['current_price']
-            
-            change_6h = 0.0
-            if key in history_map:
-                points = history_map[key]
-                latest_ts = points[-1][0]
-                target_ts = latest_ts - pd.Timedelta(hours=6)
-                
-                closest_price = None
-                min_diff_seconds = 999999
-                for (ts, p) in points:
-                    diff = abs((ts - target_ts).total_seconds())
-                    if diff < min_diff_seconds:
-                        min_diff_seconds = diff
-                        closest_price = p
-                
-                if closest_price is not None:
-                     change_6h = curr_price - closest_price
-                     
-            results.append({
-                'target_date': r['target_date'],
-                'market_slug': r['market_slug'],
-                'outcome': r['outcome_label'],
-                'price': curr_price,
-                'change_6h': round(change_6h, 3),
-                'fetched_at': r['fetched_at']
-            })
-            
-        grouped = {}
-        for item in results:
-            d = item['target_date']
-            if d not in grouped: grouped[d] = []
-            grouped[d].append(item)
-            
-        return jsonify(grouped)
-        
+        try:
+            # [NEW] 最新价格 + lookback 前的价格: 按 (target_date, outcome_label) 索引做 as-of 查找
+            # (src/services/market_sentiment.py -> src/db/snapshots.py::price_at)
+            return build_market_sentiment(conn, lookback)
+        finally:
+            conn.close()
     except Exception as e:
         print(f"Error in market_sentiment: {e}")
+        raise UncacheableResponse({'error': str(e)}, 500)
+
+# API: 分阶段计时 / 剖析指标
+# ?name=span 名称前缀 (如 train_xgb. / route.) &since=YYYY-MM-DD (默认最近 7 天) &limit=最近 N 条 (默认 200)
+@app.route('/api/metrics')
+def get_metrics():
+    flush_spans()
+    limit = max(1, min(request.args.get('limit', 200, type=int), 5000))
+    conn = get_read_connection()
+    try:
+        return jsonify(query_spans(conn, name=request.args.get('name'), since=request.args.get('since'), limit=limit))
+    except Exception as e:
+        print(f"Error in metrics: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
 
 @app.route('/api/sync_market_sentiment', methods=['POST'])
 def sync_market_sentiment():
@@ -0,0 +1,170 @@
+"""
+Benchmark: API query latency before / after schema migration (src/db/schema.py)
+
+在临时目录生成多年份的合成 prediction_history / market_sentiment_snapshots，
+先在无索引的旧表结构上计时 app.py 中的查询，再执行 ensure_schema() 后重新计时。
+Usage:
+    python benchmarks/bench_api_queries.py --years 3 --snapshots-per-day 24
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db.schema import TABLES, ensure_schema
+
+OUTCOMES = ['<2.0M', '2.0M-2.2M', '2.2M-2.4M', '2.4M-2.6M', '2.6M-2.8M', '2.8M-3.0M', '3.0M-3.2M', '>3.2M']
+
+# 与 app.py 中的查询保持一致
+API_QUERIES = {
+    'predictions.forecast': ("""
+        SELECT target_date, predicted_throughput, model_run_date,
+               weather_index, is_holiday, flight_volume, holiday_name
+        FROM prediction_history
+        WHERE target_date > ?
+    """, 'boundary'),
+    'predictions.history': ("""
+        SELECT target_date, predicted_throughput, model_run_date,
+               weather_index, is_holiday, flight_volume
+        FROM prediction_history
+        WHERE target_date <= ?
+    """, 'boundary'),
+    'secure_export': ("""
+        SELECT p.target_date, p.predicted_throughput
+        FROM prediction_history p
+        LEFT JOIN traffic t ON p.target_date = t.date
+        WHERE (t.throughput IS NULL OR t.throughput = 0)
+        AND p.id IN (SELECT MAX(id) FROM prediction_history GROUP BY target_date)
+        ORDER BY p.target_date ASC
+    """, None),
+    'update_data.latest_unresolved': ("""
+        SELECT target_date, predicted_throughput, holiday_name, model_run_date
+        FROM prediction_history
+        WHERE target_date > ?
+        ORDER BY target_date ASC, model_run_date DESC
+        LIMIT 1
+    """, 'boundary'),
+    'update_data.market_consensus': ("""
+        SELECT outcome_label, price
+        FROM market_sentiment_snapshots
+        WHERE target_date = ?
+        AND id IN (SELECT MAX(id) FROM market_sentiment_snapshots WHERE target_date = ? GROUP BY outcome_label)
+        ORDER BY price DESC LIMIT 1
+    """, 'target_pair'),
+    'market_sentiment.latest': ("""
+        SELECT target_date, outcome_label, price as current_price, fetched_at, market_slug
+        FROM market_sentiment_snapshots
+        WHERE id IN (
+            SELECT MAX(id)
+            FROM market_sentiment_snapshots
+            GROUP BY target_date, outcome_label
+        )
+        ORDER BY target_date ASC, outcome_label ASC
+    """, None),
+    'market_sentiment.recent_24h': ("""
+        SELECT target_date, outcome_label, price, fetched_at
+        FROM market_sentiment_snapshots
+        WHERE fetched_at >= datetime('now', '-24 hours')
+        ORDER BY fetched_at ASC
+    """, None),
+}
+
+def build_synthetic_db(path, years, snapshots_per_day, days_before):
+    """旧表结构 (无二级索引) + 多年份合成数据"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE traffic (date TEXT PRIMARY KEY, throughput INTEGER)")
+    conn.execute(TABLES['prediction_history'])
+    conn.execute(TABLES['market_sentiment_snapshots'])
+
+    rng = np.random.default_rng(7)
+    today = pd.Timestamp.now().normalize()
+    dates = pd.date_range(today - pd.Timedelta(days=365 * years), today + pd.Timedelta(days=7))
+    boundary = today - pd.Timedelta(days=1)
+
+    traffic = [(d.strftime('%Y-%m-%d'), int(rng.integers(1_800_000, 3_000_000))) for d in dates if d <= boundary]
+    conn.executemany("INSERT INTO traffic VALUES (?, ?)", traffic)
+
+    # 每日一次模型运行，预测未来 15 天
+    preds = []
+    for run_date in dates:
+        run_str = run_date.strftime('%Y-%m-%d')
+        for h in range(1, 16):
+            preds.append(((run_date + pd.Timedelta(days=h)).strftime('%Y-%m-%d'),
+                          int(rng.integers(1_800_000, 3_000_000)), run_str, 0, 0, 0, 0, ''))
+    conn.executemany("""
+        INSERT INTO prediction_history (target_date, predicted_throughput, model_run_date,
+                                        weather_index, is_holiday, flight_volume, is_weekend, holiday_name)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, preds)
+
+    # 按抓取时间顺序插入快照 (与真实写入顺序一致)
+    step = pd.Timedelta(hours=24 / snapshots_per_day)
+    fetch_times = pd.date_range(dates[0] - pd.Timedelta(days=days_before), pd.Timestamp.now(), freq=step)
+    snapshots = []
+    for ts in fetch_times:
+        ts_str = ts.strftime('%Y-%m-%d %H:%M:%S')
+        for offset in range(days_before + 1):
+            target = (ts.normalize() + pd.Timedelta(days=offset)).strftime('%Y-%m-%d')
+            slug = f"tsa-passengers-{target}"
+            for label in OUTCOMES:
+                snapshots.append((target, slug, label, float(rng.random()), ts_str))
+    conn.executemany("""
+        INSERT INTO market_sentiment_snapshots (target_date, market_slug, outcome_label, price, fetched_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, snapshots)
+    conn.commit()
+    conn.close()
+    return boundary.strftime('%Y-%m-%d'), len(preds), len(snapshots)
+
+def time_queries(conn, boundary, repeat):
+    params = {
+        None: (),
+        'boundary': (boundary,),
+        'target_pair': (boundary, boundary),
+    }
+    timings = {}
+    for name, (sql, param_key) in API_QUERIES.items():
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            conn.execute(sql, params[param_key]).fetchall()
+            samples.append(time.perf_counter() - t0)
+        timings[name] = float(np.median(samples)) * 1000
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API queries before/after schema migration")
+    parser.add_argument('--years', type=int, default=3, help='Years of synthetic history (default: 3)')
+    parser.add_argument('--snapshots-per-day', type=int, default=24, help='Polymarket fetches per day (default: 24)')
+    parser.add_argument('--days-before', type=int, default=3, help='Markets open N days before target date (default: 3)')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats per query, median reported')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        print("🧪 Generating synthetic DB...")
+        boundary, n_preds, n_snaps = build_synthetic_db(path, args.years, args.snapshots_per_day, args.days_before)
+        print(f"   prediction_history: {n_preds:,} rows | market_sentiment_snapshots: {n_snaps:,} rows")
+
+        conn = sqlite3.connect(path)
+        before = time_queries(conn, boundary, args.repeat)
+        ensure_schema(conn)
+        conn.execute("ANALYZE")
+        after = time_queries(conn, boundary, args.repeat)
+        conn.close()
+
+    print(f"\n{'Query':<32}{'Before (ms)':>14}{'After (ms)':>14}{'Speedup':>10}")
+    print("-" * 70)
+    for name in API_QUERIES:
+        speedup = before[name] / max(after[name], 1e-6)
+        print(f"{name:<32}{before[name]:>14.2f}{after[name]:>14.2f}{speedup:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
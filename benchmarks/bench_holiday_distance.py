@@ -0,0 +1,84 @@
+"""
+Micro-benchmark: days_to_nearest_holiday
+
+对比旧版逐行循环 (每行遍历全部节假日) 与新版 searchsorted 向量化实现。
+Usage:
+    python benchmarks/bench_holiday_distance.py --rows 20000
+"""
+import os
+import sys
+import time
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+from dateutil.easter import easter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.holiday_utils import TARGET_HOLIDAYS, get_us_holidays, days_to_nearest_holiday
+
+
+def legacy_days_to_nearest_holiday(ds_series):
+    """旧实现 (train_xgb / backtest 中的原始循环), 仅用于基准对比"""
+    us_hols = get_us_holidays(2019, 2030)
+    target_dates = []
+    for date, name in us_hols.items():
+        for target in TARGET_HOLIDAYS:
+            if target in name:
+                target_dates.append(pd.to_datetime(date))
+                break
+    for y in range(2019, 2030):
+        target_dates.append(pd.to_datetime(easter(y) - datetime.timedelta(days=2)))
+    target_dates = sorted(list(set(target_dates)))
+
+    out = []
+    for d in ds_series:
+        min_dist = 999
+        for h in target_dates:
+            dist = (d - h).days
+            if abs(dist) < abs(min_dist):
+                min_dist = dist
+        if min_dist > 14:
+            min_dist = 15
+        if min_dist < -14:
+            min_dist = -15
+        out.append(min_dist)
+    return np.array(out, dtype=np.int64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark days_to_nearest_holiday")
+    parser.add_argument('--rows', type=int, default=12000, help='Number of dates (default: 12000)')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats for the vectorized path')
+    args = parser.parse_args()
+
+    # 2019-01-01 ~ 2029-12-31 (旧版缺少 2030 年耶稣受难日, 比较范围内两者应完全一致)
+    rng = np.random.default_rng(42)
+    offsets = rng.integers(0, (pd.Timestamp('2029-12-31') - pd.Timestamp('2019-01-01')).days, args.rows)
+    ds = pd.Series(pd.Timestamp('2019-01-01') + pd.to_timedelta(offsets, unit='D'))
+
+    print(f"🧪 Rows: {len(ds)}")
+
+    t0 = time.perf_counter()
+    legacy = legacy_days_to_nearest_holiday(ds)
+    t_legacy = time.perf_counter() - t0
+    print(f"   Legacy loop:     {t_legacy * 1000:10.2f} ms")
+
+    days_to_nearest_holiday(ds)  # warm up the calendar cache
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        fast = days_to_nearest_holiday(ds)
+    t_fast = (time.perf_counter() - t0) / args.repeat
+    print(f"   Vectorized:      {t_fast * 1000:10.2f} ms")
+
+    mismatches = int((legacy != fast).sum())
+    if mismatches:
+        print(f"❌ {mismatches} mismatches between legacy and vectorized results")
+        sys.exit(1)
+    print(f"✅ Results identical. Speedup: {t_legacy / max(t_fast, 1e-9):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark: /api/market_sentiment 涨跌计算 (逐行扫描 vs 变化点存储 + as-of 索引查找)
+
+在临时数据库中生成 N 条最近 24 小时内的快照 (不规则抓取间隔，含相同时间戳，价格多数轮次不变)，
+分别用原接口的 strptime + 线性扫描结构与 src/services/market_sentiment.py 计算，校验结果一致并计时；
+随后按变化点规则压缩快照表 (src/db/snapshots.py)，再次计时。
+Usage:
+    python benchmarks/bench_market_sentiment.py --snapshots 100000
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db.schema import ensure_schema
+from src.db.snapshots import compact_snapshots
+from src.services.market_sentiment import build_market_sentiment, parse_lookback
+
+OUTCOMES = ['<2.0M', '2.0M-2.2M', '2.2M-2.4M', '2.4M-2.6M', '2.6M-2.8M', '2.8M-3.0M', '3.0M-3.2M', '>3.2M']
+
+def build_synthetic_db(path, n_snapshots, n_dates, p_move=0.2):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE traffic (date TEXT PRIMARY KEY, throughput INTEGER)")
+    ensure_schema(conn)
+
+    rng = np.random.default_rng(11)
+    today = pd.Timestamp.now().normalize()
+    dates = [(today + pd.Timedelta(days=i)).strftime('%Y-%m-%d') for i in range(n_dates)]
+    # 最早的一个日期已结盘
+    conn.execute("INSERT INTO traffic VALUES (?, ?)", (dates[0], 2_400_000))
+
+    n_keys = n_dates * len(OUTCOMES)
+    per_key = max(1, n_snapshots // n_keys)
+    # 不规则抓取时间 (秒级随机 + 约 10% 的重复时间戳)，均落在最近 23 小时内
+    now = pd.Timestamp.now().floor('s')
+    offsets = np.sort(rng.integers(60, 23 * 3600, size=per_key))[::-1]
+    dup = rng.random(per_key) < 0.1
+    offsets[1:][dup[1:]] = offsets[:-1][dup[1:]]
+    fetch_times = [(now - pd.Timedelta(seconds=int(s))).strftime('%Y-%m-%d %H:%M:%S') for s in offsets]
+
+    # 每轮抓取中约 p_move 的价格发生变化
+    prices = {(d, label): round(float(rng.random()), 3) for d in dates for label in OUTCOMES}
+    rows = []
+    for ts in fetch_times:
+        for d in dates:
+            slug = f"tsa-passengers-{d}"
+            for label in OUTCOMES:
+                if rng.random() < p_move:
+                    prices[(d, label)] = round(float(rng.random()), 3)
+                rows.append((d, slug, label, prices[(d, label)], ts))
+    conn.executemany("""
+        INSERT INTO market_sentiment_snapshots (target_date, market_slug, outcome_label, price, fetched_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+def loop_market_sentiment(conn, hours=6):
+    """
+    原 app.py 的实现结构 (读取 24 小时历史，逐行 strptime + 每个 key 线性扫描)，
+    参考价格按变化点存储的 as-of 语义选取，仅用于校验与计时对照。
+    """
+    conn.row_factory = sqlite3.Row
+    resolved_dates = [row['date'] for row in conn.execute("SELECT date FROM traffic WHERE throughput IS NOT NULL").fetchall()]
+    rows_latest = conn.execute("""
+        SELECT target_date, outcome_label, price as current_price, fetched_at, market_slug
+        FROM market_sentiment_snapshots
+        WHERE id IN (SELECT MAX(id) FROM market_sentiment_snapshots GROUP BY target_date, outcome_label)
+        ORDER BY target_date ASC, outcome_label ASC
+    """).fetchall()
+    filtered_latest = [r for r in rows_latest if r['target_date'] not in resolved_dates]
+    all_rows = conn.execute("""
+        SELECT target_date, outcome_label, price, fetched_at
+        FROM market_sentiment_snapshots
+        WHERE fetched_at >= datetime('now', '-24 hours')
+        ORDER BY fetched_at ASC, id ASC
+    """).fetchall()
+
+    history_map = {}
+    for r in all_rows:
+        key = f"{r['target_date']}|{r['outcome_label']}"
+        fetched_dt = datetime.strptime(r['fetched_at'], '%Y-%m-%d %H:%M:%S')
+        history_map.setdefault(key, []).append((fetched_dt, r['price']))
+
+    last_fetch = max((points[-1][0] for points in history_map.values()), default=None)
+    grouped = {}
+    for r in filtered_latest:
+        key = f"{r['target_date']}|{r['outcome_label']}"
+        curr_price = r['current_price']
+        change = 0.0
+        if key in history_map:
+            points = history_map[key]
+            target_ts = last_fetch - pd.Timedelta(hours=hours)
+            ref_price = points[0][1]
+            for (ts, p) in points:
+                if ts > target_ts:
+                    break
+                ref_price = p
+            change = curr_price - ref_price
+        grouped.setdefault(r['target_date'], []).append({
+            'target_date': r['target_date'], 'market_slug': r['market_slug'], 'outcome': r['outcome_label'],
+            'price': curr_price, f'change_{hours}h': round(change, 3), 'fetched_at': r['fetched_at']
+        })
+    conn.row_factory = None
+    return grouped
+
+def time_call(fn, repeat):
+    samples, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples)) * 1000, out
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark market sentiment delta computation")
+    parser.add_argument('--snapshots', type=int, default=100_000, help='Snapshots within the last 24h (default: 100k)')
+    parser.add_argument('--dates', type=int, default=10, help='Open markets (target dates)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeats per implementation, median reported')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        print("🧪 Generating synthetic snapshots...")
+        n = build_synthetic_db(path, args.snapshots, args.dates)
+        print(f"   market_sentiment_snapshots: {n:,} rows")
+
+        conn = sqlite3.connect(path)
+        baseline = {}
+        for stage in ('full', 'compacted'):
+            if stage == 'compacted':
+                compact_snapshots(conn)
+                conn.commit()
+                conn.execute("VACUUM")
+            rows = conn.execute("SELECT COUNT(*) FROM market_sentiment_snapshots").fetchone()[0]
+            size = os.path.getsize(path) / 1e6
+            print(f"\n[{stage}] {rows:,} rows, {size:.1f}MB")
+            print(f"{'Lookback':<10}{'Loop (ms)':>12}{'As-of (ms)':>14}{'Speedup':>10}  Match")
+            print("-" * 54)
+            for hours in (1, 6, 24):
+                label = f"{hours}h"
+                parse_lookback(label)
+                t_old, old = time_call(lambda: loop_market_sentiment(conn, hours), args.repeat)
+                t_new, new = time_call(lambda: build_market_sentiment(conn, label), args.repeat)
+                # 压缩前后结果必须一致 (变化点存储无损)
+                baseline.setdefault(label, new)
+                match = old == new and new == baseline[label]
+                print(f"{label:<10}{t_old:>12.1f}{t_new:>14.1f}{t_old / max(t_new, 1e-6):>9.1f}x  {'✅' if match else '❌'}")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark / offline check: Polymarket 抓取 (旧版逐个 requests.get vs 并发 + keep-alive + 条件请求)
+
+在本地启动一个模拟 Gamma API 的 stub server (固定延迟，支持 ETag / If-None-Match，可令指定市场返回 500)，
+对临时数据库依次运行:
+  1. legacy     - 原实现: 每个 slug 一次独立的 requests.get (无会话复用)，串行
+  2. cold       - fetch_polymarket.run(): 线程池 + 共享会话，http_cache 为空 -> 写入全部快照与 ETag
+  3. warm       - 再次运行，所有市场未变化 -> 全部 304，不写库
+  4. unchanged  - 部分市场响应变化 (新 ETag) 但价格不变 -> 不写快照，http_cache 更新为新 ETag
+  5. partial    - 部分市场价格变化、另一部分返回 500 -> 只写入变化的快照，失败市场计入 failed 且保留旧 ETag
+  6. recovered  - 失败恢复后再次运行 -> 全部 304 (失败市场用旧 ETag 请求)
+每一步都有断言，任一失败时退出码为 1。
+Usage:
+    python benchmarks/bench_polymarket_fetch.py --check
+    python benchmarks/bench_polymarket_fetch.py --latency 0.15 --changed 3 --failing 2
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db import get_connection
+from src.etl import fetch_polymarket
+from src.etl.http_client import load_validators
+from checks import Checks
+
+BUCKETS = [(2_000_000, 2_200_000), (2_200_000, 2_400_000), (2_400_000, 2_600_000),
+           (2_600_000, 2_800_000), (2_800_000, 3_000_000)]
+
+class StubState:
+    def __init__(self, latency):
+        self.latency = latency
+        self.version = {}      # slug -> 价格版本号
+        self.touched = {}      # slug -> 非价格字段版本号 (响应与 ETag 变化，价格不变)
+        self.failing = set()   # 返回 500 的 slug
+        self.etags = {}        # slug -> 最近一次 200 响应的 ETag
+        self.requests = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    def body(self, slug):
+        v = self.version.get(slug, 0)
+        markets = []
+        for i, (low, high) in enumerate(BUCKETS):
+            price = round(((sum(slug.encode()) + i * 7 + v * 13) % 100) / 100, 2)
+            markets.append({
+                'question': f"Will TSA passenger volume be between {low:,} and {high:,}?",
+                'outcomes': json.dumps(['Yes', 'No']),
+                'outcomePrices': json.dumps([str(price), str(round(1 - price, 2))]),
+            })
+        return json.dumps([{'slug': slug, 'updatedAt': self.touched.get(slug, 0), 'markets': markets}]).encode()
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'   # keep-alive
+
+        def do_GET(self):
+            slug = parse_qs(urlparse(self.path).query).get('slug', [''])[0]
+            time.sleep(state.latency)
+            body = state.body(slug)
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            with state.lock:
+                state.requests += 1
+                failing = slug in state.failing
+                hit = not failing and self.headers.get('If-None-Match') == etag
+                state.not_modified += hit
+                if not failing and not hit:
+                    state.etags[slug] = etag
+            if failing:
+                self.send_response(500)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if hit:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+def legacy_fetch(base_url, targets):
+    """原实现的请求模式: 串行、每次新建连接"""
+    snapshots = []
+    for target in targets:
+        slug = fetch_polymarket.market_slug(target)
+        res = requests.get(fetch_polymarket.market_url(slug, base_url),
+                           headers={"User-Agent": "MikonAI/1.0"}, timeout=10)
+        res.raise_for_status()
+        snapshots.extend(fetch_polymarket.parse_event(res.json(), target, slug))
+    return snapshots
+
+def stored_state(db_path, urls):
+    conn = get_connection(db_path)
+    try:
+        total = conn.execute("SELECT COUNT(*) FROM market_sentiment_snapshots").fetchone()[0]
+        return total, {url: v[0] for url, v in load_validators(conn, urls.values()).items()}
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline check + benchmark for the concurrent Polymarket fetcher")
+    parser.add_argument('--latency', type=float, default=0.15, help='Stub server latency per request (seconds)')
+    parser.add_argument('--changed', type=int, default=3, help='Markets whose prices change before the partial run')
+    parser.add_argument('--failing', type=int, default=2, help='Markets answering 500 in the partial run')
+    parser.add_argument('--touched', type=int, default=2, help='Markets with a new ETag but unchanged prices')
+    parser.add_argument('--workers', type=int, default=fetch_polymarket.MAX_CONCURRENCY)
+    parser.add_argument('--check', action='store_true', help='Checks only: no stub latency, skip the legacy run')
+    args = parser.parse_args()
+    if args.check:
+        args.latency = 0.0
+
+    state = StubState(args.latency)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/events"
+    targets = fetch_polymarket.target_dates(recent=True)
+    slugs = {t: fetch_polymarket.market_slug(t) for t in targets}
+    urls = {t: fetch_polymarket.market_url(slugs[t], base_url) for t in targets}
+    n = len(targets)
+    assert args.touched + args.changed + args.failing <= n, "--touched + --changed + --failing exceeds the market count"
+    touched = targets[:args.touched]
+    changed = targets[args.touched:args.touched + args.changed]
+    failing = targets[args.touched + args.changed:args.touched + args.changed + args.failing]
+
+    checks = Checks()
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+
+        if not args.check:
+            t0 = time.perf_counter()
+            legacy = legacy_fetch(base_url, targets)
+            timings['legacy'] = (time.perf_counter() - t0, len(legacy))
+
+        def run(name):
+            before = state.not_modified
+            summary = fetch_polymarket.run(recent=True, base_url=base_url,
+                                           max_workers=args.workers, db_path=db_path)
+            timings[name] = (summary['seconds'], summary['written'])
+            total, etags = stored_state(db_path, urls)
+            return summary, state.not_modified - before, total, etags
+
+        print("\n[cold]")
+        summary, _, total, etags = run('cold')
+        checks.expect(summary['failed'] == 0 and summary['not_modified'] == 0, "cold: no 304 / failures", summary)
+        checks.expect(summary['written'] == total == n * len(BUCKETS), f"cold: {n * len(BUCKETS)} snapshots written",
+                      summary['written'])
+        checks.expect(etags == {urls[t]: state.etags[slugs[t]] for t in targets},
+                      f"cold: http_cache holds the served ETag for all {n} markets")
+
+        print("\n[warm]")
+        cached = etags
+        summary, hits, total2, etags = run('warm')
+        checks.expect(summary['not_modified'] == hits == n, f"warm: all {n} markets 304",
+                      f"{summary['not_modified']} (stub {hits})")
+        checks.expect(summary['written'] == 0 and total2 == total, "warm: nothing written", summary['written'])
+        checks.expect(etags == cached, "warm: http_cache unchanged")
+
+        print("\n[unchanged]")
+        for t in touched:
+            state.touched[slugs[t]] = state.touched.get(slugs[t], 0) + 1
+        summary, hits, total2, etags = run('unchanged')
+        checks.expect(summary['not_modified'] == n - len(touched), f"unchanged: {len(touched)} markets re-downloaded",
+                      summary['not_modified'])
+        checks.expect(summary['written'] == 0 and total2 == total, "unchanged: same prices -> no snapshots written",
+                      summary['written'])
+        checks.expect(all(etags[urls[t]] == state.etags[slugs[t]] != cached[urls[t]] for t in touched),
+                      "unchanged: new ETags persisted although no snapshot was written")
+
+        print("\n[partial]")
+        cached = etags
+        for t in changed:
+            state.version[slugs[t]] = state.version.get(slugs[t], 0) + 1
+        state.failing = {slugs[t] for t in failing}
+        summary, hits, total2, etags = run('partial')
+        checks.expect(summary['failed'] == len(failing), f"partial: {len(failing)} failed markets counted",
+                      summary['failed'])
+        checks.expect(summary['not_modified'] == n - len(changed) - len(failing),
+                      f"partial: {n - len(changed) - len(failing)} markets 304", summary['not_modified'])
+        checks.expect(summary['written'] == total2 - total == len(changed) * len(BUCKETS),
+                      f"partial: only the {len(changed) * len(BUCKETS)} changed snapshots written", summary['written'])
+        checks.expect(all(etags[urls[t]] == state.etags[slugs[t]] != cached[urls[t]] for t in changed),
+                      "partial: changed markets store their new ETag")
+        checks.expect(all(etags[urls[t]] == cached[urls[t]] for t in failing),
+                      "partial: failed markets keep their previous ETag")
+
+        print("\n[recovered]")
+        state.failing = set()
+        summary, hits, _, _ = run('recovered')
+        checks.expect(summary['not_modified'] == n and summary['failed'] == 0 and summary['written'] == 0,
+                      f"recovered: all {n} markets 304 (failed ones revalidated with the old ETag)", summary)
+    server.shutdown()
+
+    print(f"\n{'Run':<10}{'Seconds':>10}{'Rows':>8}")
+    print("-" * 28)
+    for name, (seconds, rows) in timings.items():
+        print(f"{name:<10}{seconds:>10.3f}{rows:>8}")
+    print(f"\nmarkets: {n} | stub requests: {state.requests} | 304: {state.not_modified}")
+    checks.exit()
+
+if __name__ == "__main__":
+    main()
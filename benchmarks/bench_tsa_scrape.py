@@ -0,0 +1,278 @@
+"""
+Benchmark / offline check: TSA 全量抓取 (串行 + sleep(1) vs 并发 crawler + 条件请求 + 封存年份)
+
+用保存的 HTML 页面 (fixtures) 启动本地 stub server (固定延迟，支持 ETag / If-None-Match)，对临时数据库运行:
+  1. parser     - lxml 快速路径与 BeautifulSoup html.parser 的解析结果一致，且等于 expected.json
+  2. legacy     - 原全量模式: 逐页 requests.get + sleep(1)，INSERT OR REPLACE 全部行
+  3. cold       - build_tsa_db.crawl(): 并发抓取全部年份，包含 12-31 的往年页面封存
+  4. warm       - 再次运行: 封存年份跳过，当前年份 304，不写库
+  5. revised    - stub 修改当前年份 1 行后运行: 只写入该行
+每一步都有断言，任一失败时退出码为 1。
+Fixtures:
+  (默认)                  benchmarks/fixtures/tsa: index.html (当前年份) + YYYY.html + expected.json (每页应解析出的行)
+  --fixtures DIR         其他目录 (例如 --save-fixtures 从 tsa.gov 保存的页面)
+  --from-db              由本地数据库 traffic 表生成同结构的 HTML (全部年份，用于计时)
+Usage:
+    python benchmarks/bench_tsa_scrape.py --check                 # 只做离线检查 (无延迟，跳过 legacy)
+    python benchmarks/bench_tsa_scrape.py --from-db --latency 0.2
+    python benchmarks/bench_tsa_scrape.py --save-fixtures benchmarks/fixtures/tsa   # 需要网络
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import tempfile
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db import get_read_connection
+from src.etl import build_tsa_db as tsa
+from checks import Checks
+
+PAGE_PATH = '/travel/passenger-volumes'
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'tsa')
+EXPECTED_FILE = 'expected.json'
+REVISED_VALUE = 1_234_567
+
+def render_page(rows, years):
+    """与 tsa.gov 页面相同结构: 年份导航链接 + 数据表格 (M/D/YYYY, 千分位)"""
+    nav = ''.join(f'<li><a href="{PAGE_PATH}/{y}">{y}</a></li>' for y in years)
+    body = ''.join(
+        f'<tr><td class="views-field">{d.month}/{d.day}/{d.year}</td>'
+        f'<td class="views-field"> {int(v):,} </td></tr>'
+        for d, v in rows
+    )
+    return (f'<html><body><nav><ul>{nav}</ul></nav><table><thead><tr><th>Date</th><th>Numbers</th></tr></thead>'
+            f'<tbody>{body}</tbody></table></body></html>').encode()
+
+def fixtures_from_db():
+    conn = get_read_connection()
+    try:
+        df = pd.read_sql("SELECT date, throughput FROM traffic WHERE throughput IS NOT NULL ORDER BY date DESC", conn)
+    finally:
+        conn.close()
+    df['date'] = pd.to_datetime(df['date'])
+    current = datetime.date.today().year
+    years = sorted({d.year for d in df['date']} - {current}, reverse=True)
+    pages = {}
+    for year, g in df.groupby(df['date'].dt.year):
+        rows = list(zip(g['date'], g['throughput']))
+        pages['index' if year == current else str(year)] = render_page(rows, years)
+    return pages
+
+def load_fixtures(directory):
+    """-> (pages {name: html bytes}, expected {name: [(date, throughput), ...]} 或 None)"""
+    pages = {name[:-5]: open(os.path.join(directory, name), 'rb').read()
+             for name in os.listdir(directory) if name.endswith('.html')}
+    path = os.path.join(directory, EXPECTED_FILE)
+    expected = None
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            expected = {name: [tuple(r) for r in rows] for name, rows in json.load(f).items()}
+    return pages, expected
+
+def save_fixtures(directory):
+    session = requests.Session()
+    os.makedirs(directory, exist_ok=True)
+    index = session.get(tsa.START_URL, headers=tsa.HEADERS, timeout=20).content
+    open(os.path.join(directory, 'index.html'), 'wb').write(index)
+    links = tsa.get_year_links(tsa.BeautifulSoup(index, 'html.parser'))
+    expected = {'index': tsa.parse_page(index, fast=False)}
+    for link in links:
+        year = tsa.page_year(link)
+        if year:
+            content = session.get(link, headers=tsa.HEADERS, timeout=20).content
+            open(os.path.join(directory, f"{year}.html"), 'wb').write(content)
+            expected[str(year)] = tsa.parse_page(content, fast=False)
+    # 参考解析结果 (BeautifulSoup html.parser)，之后的检查要求两种解析器都与之一致
+    with open(os.path.join(directory, EXPECTED_FILE), 'w', encoding='utf-8') as f:
+        json.dump(expected, f, indent=1)
+    print(f"Saved {len(links)} pages -> {directory}")
+
+class StubState:
+    def __init__(self, pages, latency):
+        self.pages = pages
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            name = self.path.rstrip('/').rsplit('/', 1)[-1]
+            body = state.pages.get('index' if name == 'passenger-volumes' else name)
+            time.sleep(state.latency)
+            with state.lock:
+                state.requests += 1
+            if body is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                with state.lock:
+                    state.not_modified += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+def check_parsers(pages, checks, expected=None, repeat=3):
+    t_fast = t_slow = 0.0
+    for name, content in sorted(pages.items()):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            fast = tsa.parse_page(content, fast=True)
+        t_fast += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            slow = tsa.parse_page(content, fast=False)
+        t_slow += time.perf_counter() - t0
+        checks.expect(fast, f"{name}: table found with rows", fast)
+        checks.expect(fast == slow, f"{name}: lxml == html.parser ({len(fast or [])} rows)")
+        if expected is not None:
+            checks.expect(fast == expected.get(name), f"{name}: rows == {EXPECTED_FILE}")
+    return t_slow / repeat, t_fast / repeat
+
+def expected_frozen_years(parsed):
+    """往年页面中包含 12-31 的年份 (crawl 应封存的年份)"""
+    return {int(name) for name, rows in parsed.items()
+            if name != 'index' and tsa.is_year_complete(int(name), rows)}
+
+def revise_first_row(html, rows):
+    """把当前年份页面第一行的数值改为 REVISED_VALUE (与标记结构无关: 替换第一次出现的千分位数值)"""
+    old = f"{rows[0][1]:,}".encode()
+    assert old in html, "first row value not found in page"
+    return html.replace(old, f"{REVISED_VALUE:,}".encode(), 1), rows[0][0]
+
+def legacy_full_scrape(start_url, sleep):
+    """原全量模式的请求模式: 主页 + 每个年份页面串行 requests.get + sleep，全部行 INSERT OR REPLACE"""
+    resp = requests.get(start_url, headers=tsa.HEADERS)
+    base_url = start_url.split(PAGE_PATH)[0]
+    links = tsa.get_year_links(tsa.BeautifulSoup(resp.content, 'html.parser'), start_url, base_url)
+    rows = []
+    for link in links:
+        resp = requests.get(link, headers=tsa.HEADERS, timeout=10)
+        rows.extend(tsa.parse_page(resp.content, fast=False) or [])
+        time.sleep(sleep)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline check + benchmark for the TSA crawler")
+    parser.add_argument('--latency', type=float, default=0.2, help='Stub server latency per request (seconds)')
+    parser.add_argument('--legacy-sleep', type=float, default=1.0, help='Per-page sleep of the legacy scraper')
+    parser.add_argument('--workers', type=int, default=tsa.MAX_CONCURRENCY)
+    parser.add_argument('--fixtures', default=FIXTURE_DIR,
+                        help='Directory of saved TSA pages (index.html + YYYY.html [+ expected.json])')
+    parser.add_argument('--from-db', action='store_true', help='Generate pages from the local traffic table instead')
+    parser.add_argument('--check', action='store_true', help='Checks only: no stub latency, skip the legacy run')
+    parser.add_argument('--save-fixtures', metavar='DIR', help='Save live tsa.gov pages into DIR and exit')
+    args = parser.parse_args()
+
+    if args.save_fixtures:
+        save_fixtures(args.save_fixtures)
+        return
+    if args.check:
+        args.latency = 0.0
+
+    pages, expected = (fixtures_from_db(), None) if args.from_db else load_fixtures(args.fixtures)
+    parsed = {name: tsa.parse_page(content, fast=False) or [] for name, content in pages.items()}
+    checks = Checks()
+
+    print("[parser]")
+    t_bs4, t_lxml = check_parsers(pages, checks, expected)
+    print(f"  {len(pages)} pages | html.parser {t_bs4 * 1000:.1f}ms | lxml {t_lxml * 1000:.1f}ms "
+          f"| {t_bs4 / max(t_lxml, 1e-9):.1f}x")
+
+    state = StubState(dict(pages), args.latency)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    start_url = f"http://127.0.0.1:{server.server_address[1]}{PAGE_PATH}"
+
+    all_rows = dict(r for rows in parsed.values() for r in rows)
+    frozen_expected = expected_frozen_years(parsed)
+    timings, summaries = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tsa.DB_NAME = os.path.join(tmp, 'bench.db')
+        tsa.init_db()
+
+        legacy_rows = None
+        if not args.check:
+            t0 = time.perf_counter()
+            legacy_rows = legacy_full_scrape(start_url, args.legacy_sleep)
+            timings['legacy'] = (time.perf_counter() - t0, len(legacy_rows), state.requests)
+
+        revised_date = None
+        for name in ('cold', 'warm', 'revised'):
+            if name == 'revised':
+                # 当前年份页面修订一行 (TSA 偶尔会更正最近的数据)
+                state.pages['index'], revised_date = revise_first_row(state.pages['index'], parsed['index'])
+            before, before_304 = state.requests, state.not_modified
+            t0 = time.perf_counter()
+            summary = tsa.crawl(max_workers=args.workers, start_url=start_url)
+            timings[name] = (time.perf_counter() - t0, summary['rows_changed'], state.requests - before)
+            summaries[name] = (summary, state.requests - before, state.not_modified - before_304)
+
+        conn = sqlite3.connect(tsa.DB_NAME)
+        stored = dict(conn.execute("SELECT date, throughput FROM traffic").fetchall())
+        frozen = {row[0] for row in conn.execute("SELECT year FROM tsa_frozen_years").fetchall()}
+        conn.close()
+    server.shutdown()
+
+    print("\n[crawl]")
+    cold, cold_reqs, _ = summaries['cold']
+    checks.expect(cold['failed'] == 0 and cold['pages'] == len(pages),
+                  f"cold: all {len(pages)} pages fetched, none failed", cold)
+    checks.expect(cold['rows_changed'] == len(all_rows), f"cold: {len(all_rows)} rows written", cold['rows_changed'])
+    checks.expect(frozen == frozen_expected, f"cold: frozen years {sorted(frozen_expected)}", sorted(frozen))
+
+    warm, warm_reqs, warm_304 = summaries['warm']
+    checks.expect(warm['frozen_skipped'] == len(frozen_expected), "warm: frozen years skipped without a request",
+                  warm['frozen_skipped'])
+    unfrozen = len(pages) - len(frozen_expected)
+    checks.expect(warm_reqs == unfrozen and warm_304 == unfrozen,
+                  f"warm: {unfrozen} request(s), all 304", f"{warm_reqs} requests, {warm_304} x 304")
+    checks.expect(warm['rows_changed'] == 0 and warm['pages'] == 0, "warm: nothing written", warm)
+
+    revised, _, _ = summaries['revised']
+    checks.expect(revised['changed_dates'] == [revised_date], f"revised: only {revised_date} written",
+                  revised['changed_dates'])
+    expected_stored = {**all_rows, revised_date: REVISED_VALUE}
+    checks.expect(stored == expected_stored, "stored rows == fixture rows + revision",
+                  f"{sum(1 for d in expected_stored if stored.get(d) != expected_stored[d])} mismatching")
+    if legacy_rows is not None:
+        checks.expect(dict(legacy_rows) == all_rows, "legacy scraper parsed the same rows")
+
+    print(f"\n{'Run':<10}{'Seconds':>10}{'Rows':>8}{'Requests':>10}")
+    print("-" * 38)
+    for name, (seconds, rows, reqs) in timings.items():
+        print(f"{name:<10}{seconds:>10.2f}{rows:>8}{reqs:>10}")
+    print(f"\nfrozen years: {len(frozen)} | 304 responses: {state.not_modified}")
+    checks.exit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Benchmark / offline check: Open-Meteo 抓取 (逐机场串行 vs 多坐标批量 + 分块并发)
+
+使用回放 stub (ReplayClient) 代替网络: 录制的每日天气值按请求的端点 (archive / forecast)、坐标与日期区间
+组装成与 openmeteo_requests 相同接口的 response 对象，并按 "固定延迟 + 每坐标延迟" 模拟往返耗时。
+录制数据来源:
+  (默认)                  benchmarks/fixtures/weather/recording.csv
+                          (endpoint, date, airport, 4 个变量)。archive 最后 2 天为空 (API 尚无观测值)，
+                          forecast 从录制日前 5 天开始 —— 这 5 天作为 "上一次运行" 已写入的预报值。
+                          回放时日期整体平移，使录制日 (archive 最后一天 + 1) 对应今天。
+  --fixture CSV          其他录制文件 (例如 --record 从真实 API 录制)
+  --from-db              本地数据库 weather 表 (两个端点回放同一份值，仅用于 --full 计时)
+检查 (任一失败时退出码为 1):
+  1. frames     - 批量 + 分块并发的结果与逐机场串行完全一致，分块无重叠 / 缺口，请求数符合预期
+  2. run()      - run(client=stub) 写入临时库: archive + forecast 合并、观测值优先 (vintage) 规则、
+                  daily_weather_index 与 changeset；再次运行 changeset 为空
+Usage:
+    python benchmarks/bench_weather_fetch.py --check
+    python benchmarks/bench_weather_fetch.py --from-db --full --latency 0.3
+    python benchmarks/bench_weather_fetch.py --record benchmarks/fixtures/weather/recording.csv   # 需要网络
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db import get_read_connection, get_connection, ensure_schema, upsert_df
+from src.etl import get_weather_features as gw
+from src.utils.weather_utils import national_weather_index, severity_score
+from checks import Checks
+
+VALUE_COLS = ['snowfall_cm', 'precipitation_mm', 'windspeed_kmh', 'temperature_min_c']   # 与 DAILY_VARIABLES 顺序一致
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'weather', 'recording.csv')
+ENDPOINTS = {gw.ARCHIVE_URL: 'archive', gw.FORECAST_URL: 'forecast'}
+PREVIOUS_FORECAST_DAYS = 5   # 录制的 forecast 从录制日前 5 天开始
+CHECK_CHUNK_DAYS = 7         # 检查时用短分块，使 30 天区间也会切成多块
+
+class _Values:
+    def __init__(self, values):
+        self._values = values
+
+    def ValuesAsNumpy(self):
+        return self._values
+
+class _Daily:
+    def __init__(self, start, end, frame):
+        self._start, self._end, self._frame = start, end, frame
+
+    def Time(self):
+        return int(self._start.timestamp())
+
+    def TimeEnd(self):
+        return int((self._end + pd.Timedelta(days=1)).timestamp())
+
+    def Interval(self):
+        return 86400
+
+    def Variables(self, i):
+        return _Values(self._frame[VALUE_COLS[i]].to_numpy(dtype=np.float32))
+
+class _Response:
+    def __init__(self, daily):
+        self._daily = daily
+
+    def Daily(self):
+        return self._daily
+
+class ReplayClient:
+    """openmeteo_requests.Client 的回放替身 (线程安全，统计请求数)；录制中没有的日期返回空值 (与 API 一致)"""
+
+    def __init__(self, recording, latency=0.3, per_location=0.02):
+        self.latency = latency
+        self.per_location = per_location
+        self.coords = {(v['lat'], v['lon']): icao for icao, v in gw.AIRPORTS.items()}
+        self.data = {key: g.set_index('date')[VALUE_COLS] for key, g in recording.groupby(['endpoint', 'airport'])}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def weather_api(self, url, params):
+        lats, lons = params['latitude'], params['longitude']
+        if not isinstance(lats, list):
+            lats, lons = [lats], [lons]
+        time.sleep(self.latency + self.per_location * len(lats))
+        with self._lock:
+            self.requests += 1
+
+        start = pd.Timestamp(params['start_date'], tz='UTC')
+        end = pd.Timestamp(params['end_date'], tz='UTC')
+        dates = pd.date_range(start, end, freq='D').strftime('%Y-%m-%d')
+        responses = []
+        for lat, lon in zip(lats, lons):
+            frame = self.data[(ENDPOINTS[url], self.coords[(lat, lon)])].reindex(dates)
+            responses.append(_Response(_Daily(start, end, frame)))
+        return responses
+
+def load_recording(fixture=FIXTURE, from_db=False):
+    """-> DataFrame [endpoint, date, airport, VALUE_COLS]，日期已平移到以今天为录制日"""
+    if from_db:
+        conn = get_read_connection()
+        try:
+            df = pd.read_sql(f"SELECT date, airport, {', '.join(VALUE_COLS)} FROM weather", conn)
+        finally:
+            conn.close()
+        return pd.concat([df.assign(endpoint=name) for name in ENDPOINTS.values()], ignore_index=True)
+
+    df = pd.read_csv(fixture)
+    dates = pd.to_datetime(df['date'])
+    recorded_on = dates[df['endpoint'] == 'archive'].max() + pd.Timedelta(days=1)
+    df['date'] = (dates + (pd.Timestamp.today().normalize() - recorded_on)).dt.strftime('%Y-%m-%d')
+    return df
+
+def record(path, start_date, end_date):
+    """从真实 API 录制 archive [start_date, end_date] 与 forecast [录制日前 5 天, +15 天] (需要网络)，写入 CSV"""
+    today = pd.Timestamp.today().normalize()
+    plan = [('archive', gw.ARCHIVE_URL, s, e) for s, e in gw.date_chunks(start_date, end_date)]
+    plan.append(('forecast', gw.FORECAST_URL, (today - pd.Timedelta(days=PREVIOUS_FORECAST_DAYS)).strftime('%Y-%m-%d'),
+                 (today + pd.Timedelta(days=15)).strftime('%Y-%m-%d')))
+    frames, report = gw.fetch_all(plan, gw.AIRPORTS)
+    gw.print_latency_report(report, sum(r['latency'] or 0 for r in report))
+    df = pd.concat([frame.assign(endpoint=name) for name, frame in frames.items()], ignore_index=True)
+    df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    df[['endpoint', 'date', 'airport'] + VALUE_COLS].round(1).to_csv(path, index=False)
+    print(f"Recorded {len(df)} rows -> {path}")
+
+def legacy_fetch(client, plan):
+    """原实现: 每个端点 x 每个机场一次请求，串行，整段区间不分块"""
+    frames = []
+    for name, url, start_date, end_date in plan:
+        for icao in gw.AIRPORTS:
+            df, _ = gw.fetch_weather_batch(url, {icao: gw.AIRPORTS[icao]}, start_date, end_date, client)
+            frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+def _sorted(df):
+    return df.sort_values(['airport', 'date']).reset_index(drop=True)
+
+def _values_equal(a, b):
+    """按 (date, airport) 对齐后比较 VALUE_COLS (float32 回放 -> 保留 1 位小数)，NaN 视为相等"""
+    merged = a.merge(b, on=['date', 'airport'], how='outer', suffixes=('_a', '_b'), indicator=True)
+    if (merged['_merge'] != 'both').any():
+        return False
+    for col in VALUE_COLS:
+        x, y = merged[f"{col}_a"].astype(float).round(1), merged[f"{col}_b"].astype(float).round(1)
+        if not ((x == y) | (x.isna() & y.isna())).all():
+            return False
+    return True
+
+def check_frames(checks, stub, start, last, today, end_forecast, workers):
+    """批量 + 分块并发 vs 逐机场串行: 结果一致，分块连续无重叠"""
+    legacy_plan = [('archive', gw.ARCHIVE_URL, start, last), ('forecast', gw.FORECAST_URL, today, end_forecast)]
+    plan = [('archive', gw.ARCHIVE_URL, s, e) for s, e in gw.date_chunks(start, last, CHECK_CHUNK_DAYS)]
+    plan.append(legacy_plan[1])
+
+    stub.requests = 0
+    legacy = legacy_fetch(stub, legacy_plan)
+    checks.expect(stub.requests == 2 * len(gw.AIRPORTS), f"legacy: {2 * len(gw.AIRPORTS)} requests", stub.requests)
+
+    stub.requests = 0
+    frames, report = gw.fetch_all(plan, gw.AIRPORTS, stub, workers)
+    checks.expect(stub.requests == len(plan) and not any(r['error'] for r in report),
+                  f"batched: {len(plan)} requests ({len(plan) - 1} archive chunks + forecast), no errors", stub.requests)
+    batched = pd.concat(frames.values(), ignore_index=True)
+    checks.expect(_sorted(legacy).equals(_sorted(batched)), "batched + chunked frames == per-airport serial frames")
+
+    archive = frames['archive']
+    days = pd.date_range(start, last, tz='UTC')
+    complete = (not archive.duplicated(['date', 'airport']).any()
+                and all(list(g.sort_values()) == list(days) for _, g in archive.groupby('airport')['date']))
+    checks.expect(complete, f"archive chunks cover {start} ~ {last} once per airport")
+    checks.expect(np.array_equal(archive['severity_score'].to_numpy(), severity_score(archive)),
+                  "severity_score computed on the fetched frame")
+
+def _seed_previous_run(db_path, recording, today, observed_today):
+    """上一次运行写入的状态: 录制日前几天的预报值 (forecast vintage) + 今天某机场已有的观测值"""
+    previous = recording[(recording['endpoint'] == 'forecast') & (recording['date'] < today)]
+    observed = recording[(recording['endpoint'] == 'forecast') & (recording['date'] == today)
+                         & (recording['airport'] == observed_today)].copy()
+    observed['temperature_min_c'] -= 5.0   # 与预报值不同，便于判断是否被覆盖
+    seed = pd.concat([previous.assign(vintage=gw.VINTAGE_FORECAST),
+                      observed.assign(vintage=gw.VINTAGE_OBSERVED)], ignore_index=True)
+    seed['severity_score'] = severity_score(seed)
+    seed['updated_at'] = '2000-01-01 00:00:00'
+    cols = ['date', 'airport'] + VALUE_COLS + ['severity_score', 'updated_at', 'vintage']
+
+    conn = get_connection(db_path)
+    try:
+        ensure_schema(conn)
+        with conn:
+            upsert_df(conn, 'weather_vintages', seed[cols])
+            upsert_df(conn, 'weather', seed[cols])
+    finally:
+        conn.close()
+    return seed
+
+def check_run(checks, stub, recording, workers):
+    """run(client=stub) 写入临时库后的 weather / weather_vintages / daily_weather_index"""
+    today_ts = pd.Timestamp.today().normalize()
+    today = today_ts.strftime('%Y-%m-%d')
+    start = (today_ts - pd.Timedelta(days=30)).strftime('%Y-%m-%d')
+    end = (today_ts + pd.Timedelta(days=15)).strftime('%Y-%m-%d')
+    observed_today = next(iter(gw.AIRPORTS))
+
+    archive = recording[recording['endpoint'] == 'archive']
+    forecast = recording[recording['endpoint'] == 'forecast']
+    has_obs = archive[VALUE_COLS].notna().any(axis=1)
+    observed_dates = set(archive.loc[has_obs, 'date']) & set(pd.date_range(start, today_ts).strftime('%Y-%m-%d'))
+    lag_dates = set(archive.loc[~has_obs, 'date'])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'weather.db')
+        seed = _seed_previous_run(db_path, recording, today, observed_today)
+        stub.requests = 0
+        changed = gw.run(client=stub, max_workers=workers, db_path=db_path)
+        rerun = gw.run(client=stub, max_workers=workers, db_path=db_path)
+
+        conn = sqlite3.connect(db_path)
+        best = pd.read_sql("SELECT * FROM weather", conn)
+        vintages = pd.read_sql("SELECT * FROM weather_vintages", conn)
+        index = pd.read_sql("SELECT date, weather_index FROM daily_weather_index ORDER BY date", conn)
+        conn.close()
+
+    print("\n[run]")
+    checks.expect(changed is not None, "run(client=stub) succeeded")
+    window = set(pd.date_range(start, end).strftime('%Y-%m-%d'))
+    checks.expect(set(best['date']) == window | set(seed['date']), f"weather covers {start} ~ {end}")
+
+    rows = best.set_index(['date', 'airport'])
+    obs = rows[rows.index.get_level_values('date').isin(observed_dates)]
+    checks.expect((obs['vintage'] == gw.VINTAGE_OBSERVED).all(), f"{len(observed_dates)} archived days -> observed vintage")
+    checks.expect(_values_equal(obs.reset_index(), archive[archive['date'].isin(observed_dates)]),
+                  "observed values == archive recording (previous forecast replaced)")
+
+    lag = rows[rows.index.get_level_values('date').isin(lag_dates)]
+    checks.expect(len(lag) == len(lag_dates) * len(gw.AIRPORTS) and (lag['vintage'] == gw.VINTAGE_FORECAST).all()
+                  and _values_equal(lag.reset_index(), seed[seed['date'].isin(lag_dates)]),
+                  f"{len(lag_dates)} days without observations keep the previous forecast (empty archive rows skipped)")
+
+    future = best[best['date'] >= today]
+    kept = future[(future['date'] == today) & (future['airport'] == observed_today)]
+    checks.expect(len(kept) == 1 and kept['vintage'].iloc[0] == gw.VINTAGE_OBSERVED
+                  and _values_equal(kept, seed[seed['vintage'] == gw.VINTAGE_OBSERVED]),
+                  f"existing observed value for {observed_today} {today} not replaced by the forecast")
+    rest = future.drop(kept.index)
+    expected_rest = forecast[(forecast['date'] >= today)
+                             & ~((forecast['date'] == today) & (forecast['airport'] == observed_today))]
+    checks.expect((rest['vintage'] == gw.VINTAGE_FORECAST).all() and _values_equal(rest, expected_rest),
+                  "future days -> forecast vintage with forecast recording values")
+
+    both = vintages.groupby(['date', 'airport'])['vintage'].nunique()
+    expected_both = {(d, a) for d in (observed_dates & set(seed['date'])) for a in gw.AIRPORTS}
+    expected_both.add((today, observed_today))
+    checks.expect(set(both[both == 2].index) == expected_both,
+                  f"weather_vintages keeps both vintages for {len(expected_both)} overlapping (date, airport) rows")
+
+    expected_index = national_weather_index(best)
+    checks.expect(index.reset_index(drop=True).equals(expected_index.reset_index(drop=True)),
+                  "daily_weather_index == national index of the best values")
+
+    checks.expect(changed == sorted(window - lag_dates), f"changeset: every day except the {len(lag_dates)} unchanged lag days",
+                  changed if changed is None else f"{len(changed)} dates")
+    checks.expect(rerun == [], "second run: empty changeset", rerun)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline check + benchmark for the batched Open-Meteo fetch")
+    parser.add_argument('--full', action='store_true', help='Full history range (2019 onwards) instead of the last 30 days')
+    parser.add_argument('--latency', type=float, default=0.3, help='Stub round-trip latency per request (seconds)')
+    parser.add_argument('--per-location', type=float, default=0.02, help='Extra stub latency per location in a request')
+    parser.add_argument('--workers', type=int, default=gw.MAX_CONCURRENCY)
+    parser.add_argument('--fixture', default=FIXTURE, help='Recorded CSV to replay')
+    parser.add_argument('--from-db', action='store_true', help='Replay the local weather table instead (timing only)')
+    parser.add_argument('--check', action='store_true', help='Checks only: no stub latency, skip the timing run')
+    parser.add_argument('--record', metavar='CSV', help='Record the live API into CSV and exit')
+    args = parser.parse_args()
+
+    today = pd.Timestamp.today().normalize()
+    start = '2019-01-01' if args.full else (today - pd.Timedelta(days=30)).strftime('%Y-%m-%d')
+    yesterday = (today - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    if args.record:
+        record(args.record, start, yesterday)
+        return
+    if args.check:
+        args.latency = args.per_location = 0.0
+
+    recording = load_recording(args.fixture, args.from_db)
+    # 回放区间限制在录制数据覆盖范围内
+    first = max(recording.loc[recording['endpoint'] == 'archive', 'date'].min(), start)
+    last = min(recording['date'].max(), yesterday)
+    end_forecast = min(recording['date'].max(), (today + pd.Timedelta(days=15)).strftime('%Y-%m-%d'))
+    stub = ReplayClient(recording, args.latency, args.per_location)
+
+    checks = Checks()
+    if not args.from_db:
+        print("[frames]")
+        check_frames(checks, stub, first, last, today.strftime('%Y-%m-%d'), end_forecast, args.workers)
+        check_run(checks, stub, recording, args.workers)
+    if args.check:
+        checks.exit()
+        return
+
+    legacy_plan = [('archive', gw.ARCHIVE_URL, first, last),
+                   ('forecast', gw.FORECAST_URL, today.strftime('%Y-%m-%d'), end_forecast)]
+    plan = [('archive', gw.ARCHIVE_URL, s, e) for s, e in gw.date_chunks(first, last)]
+    plan.append(legacy_plan[1])
+
+    stub.requests = 0
+    t0 = time.perf_counter()
+    legacy = legacy_fetch(stub, legacy_plan)
+    t_legacy, n_legacy = time.perf_counter() - t0, stub.requests
+
+    stub.requests = 0
+    t0 = time.perf_counter()
+    frames, report = gw.fetch_all(plan, gw.AIRPORTS, stub, args.workers)
+    t_batched = time.perf_counter() - t0
+    gw.print_latency_report(report, t_batched)
+    batched = pd.concat(frames.values(), ignore_index=True)
+
+    checks.expect(_sorted(legacy).equals(_sorted(batched)), "timing run: batched frames == legacy frames")
+    print(f"\n{'Mode':<10}{'Requests':>10}{'Seconds':>10}")
+    print("-" * 30)
+    print(f"{'legacy':<10}{n_legacy:>10}{t_legacy:>10.2f}")
+    print(f"{'batched':<10}{stub.requests:>10}{t_batched:>10.2f}")
+    print(f"\nrows: {len(batched)} | speedup {t_legacy / max(t_batched, 1e-6):.1f}x")
+    checks.exit()
+
+if __name__ == "__main__":
+    main()
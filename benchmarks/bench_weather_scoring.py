@@ -0,0 +1,90 @@
+"""
+Micro-benchmark: weather severity_score + national weather_index
+
+对比旧版逐行 df.apply(calc_score) + groupby('date').apply(calculate_daily_index)
+与 src/utils/weather_utils.py 的 NumPy 阈值运算 + 单次分组聚合，并校验结果完全一致。
+Usage:
+    python benchmarks/bench_weather_scoring.py --days 3000 --hubs 5
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.weather_utils import national_weather_index, severity_score
+
+
+def legacy_calc_score(row):
+    """旧实现 (get_weather_features.fetch_weather 中的逐行评分), 仅用于基准对比"""
+    score = 0
+    if row['snowfall_cm'] > 1.0: score += 1
+    if row['snowfall_cm'] > 5.0: score += 2
+    if row['windspeed_kmh'] > 29.0: score += 1
+    if row['windspeed_kmh'] > 40.0: score += 2
+    if row['temperature_min_c'] < -5.0: score += 1
+    if row['temperature_min_c'] < -10.0: score += 1
+    if row['temperature_min_c'] < -15.0: score += 1
+    return score
+
+def legacy_daily_index(group):
+    """旧实现 (get_weather_features.run 中的 calculate_daily_index，去掉调试输出)"""
+    base_score = group['severity_score'].sum()
+    bad_hubs_count = (group['severity_score'] >= 3).sum()
+    penalty = 0
+    if bad_hubs_count >= 3:
+        penalty = 20
+    elif bad_hubs_count >= 2:
+        penalty = 10
+    return base_score + penalty
+
+def synthetic_weather(days, hubs, seed=7):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2019-01-01', periods=days, freq='D').strftime('%Y-%m-%d')
+    n = days * hubs
+    df = pd.DataFrame({
+        'date': np.repeat(dates, hubs),
+        'airport': np.tile([f"H{i:02d}" for i in range(hubs)], days),
+        'snowfall_cm': rng.gamma(0.3, 3.0, n),
+        'windspeed_kmh': rng.normal(22, 10, n),
+        'precipitation_mm': rng.gamma(0.5, 4.0, n),
+        'temperature_min_c': rng.normal(2, 9, n),
+    })
+    # 少量缺测值 (Open-Meteo 偶发空值)
+    df.loc[rng.random(n) < 0.01, 'temperature_min_c'] = np.nan
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark weather severity scoring / national index")
+    parser.add_argument('--days', type=int, default=3000)
+    parser.add_argument('--hubs', type=int, default=5)
+    args = parser.parse_args()
+
+    df = synthetic_weather(args.days, args.hubs)
+    print(f"Rows: {len(df):,} ({args.days} days x {args.hubs} hubs)")
+
+    t0 = time.perf_counter()
+    legacy_scores = df.apply(legacy_calc_score, axis=1)
+    legacy_index = df.assign(severity_score=legacy_scores).groupby('date').apply(legacy_daily_index)
+    t_legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    scores = severity_score(df)
+    index = national_weather_index(df.assign(severity_score=scores))
+    t_new = time.perf_counter() - t0
+
+    same_scores = np.array_equal(legacy_scores.to_numpy(), scores)
+    same_index = (np.array_equal(legacy_index.index.to_numpy(), index['date'].to_numpy())
+                  and np.array_equal(legacy_index.to_numpy(), index['weather_index'].to_numpy()))
+
+    print(f"Legacy     : {t_legacy * 1000:9.1f} ms")
+    print(f"Vectorized : {t_new * 1000:9.1f} ms")
+    print(f"Speedup    : {t_legacy / max(t_new, 1e-9):9.1f}x")
+    print(f"Identical  : scores {'✅' if same_scores else '❌'} | index {'✅' if same_index else '❌'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Offline check helper shared by the benchmark scripts (bench_tsa_scrape / bench_weather_fetch / bench_polymarket_fetch)
+
+    checks = Checks()
+    checks.expect(summary['failed'] == 0, "no failed pages", summary['failed'])
+    ...
+    checks.exit()     # 任一检查失败时以退出码 1 结束 (可用于 CI)
+"""
+import sys
+
+
+class Checks:
+    def __init__(self):
+        self.failures = []
+        self.count = 0
+
+    def expect(self, ok, label, detail=None):
+        """记录一项检查；失败时打印 detail (实际值) 便于定位"""
+        self.count += 1
+        ok = bool(ok)
+        suffix = '' if ok or detail is None else f"  (got: {detail})"
+        print(f"  {'✅' if ok else '❌'} {label}{suffix}")
+        if not ok:
+            self.failures.append(label)
+        return ok
+
+    def exit(self):
+        if self.failures:
+            print(f"\n❌ {len(self.failures)}/{self.count} checks failed: {'; '.join(self.failures)}")
+            sys.exit(1)
+        print(f"\n✅ All {self.count} checks passed")
@@ -0,0 +1,375 @@
+"""
+Benchmark suite: 热点路径计时 + 回归比较 (asv 风格，无额外依赖)
+
+run:
+  在合成数据库 (benchmarks/synthetic_db.py) 上依次计时下列基准。每个基准先预热 1 次再重复 --repeat 次，
+  min / median / mean / stdev (秒) 与环境信息写入 benchmarks/results/<时间>-<commit>.json
+    merge_db.full                 merge_db.run(full=True): 全量重建 traffic_full
+    merge_db.incremental          merge_db.run(): 输入未变化 (水位线命中)
+    holidays.cold                 get_holiday_features (清空 LRU 与磁盘日历缓存)
+    holidays.warm                 get_holiday_features (日历已缓存)
+    train_xgb.feature_phase       SourceContext.load + FeatureStore.load(rebuild=True) (train_xgb 的特征阶段)
+    train_xgb.feature_cached      同上，输入未变化 (Feature Store DB 缓存命中)
+    shadow.inference              天气全国聚合 + 影子模型 predict (SourceContext.cancel_rate)
+    api.predictions.cold / .warm  GET /api/predictions (清空 / 命中响应缓存)
+    api.market_sentiment.cold / .warm   GET /api/market_sentiment?lookback=6h
+compare:
+  比较两个结果文件的 median: 变慢超过 --threshold (默认 10%) 且绝对差超过 --min-delta 的基准标记为回归，
+  存在回归时退出码为 1 (可用于 CI)。省略 NEW 时取 benchmarks/results/ 中最新的文件。
+
+数据库:
+  默认在临时目录生成 (--years / --hubs / --snapshots)；--db PATH 复用该合成库 (不存在时生成)。
+  通过环境变量 TSA_DB_PATH 指向合成库: src.config 在导入时读取，因此所有 src 模块都在设置之后才导入。
+  merge_db.full 会重建 traffic_full，所以拒绝指向生产库 data/tsa_data.db。
+  TSA_METRICS 默认设为 0 (span 不写入 metric_spans，计时不含指标写库)。
+Usage:
+    python benchmarks/suite.py run --years 7 --hubs 5 --snapshots 20000 --repeat 5
+    python benchmarks/suite.py run -k api.            # 只运行名称包含 api. 的基准
+    python benchmarks/suite.py compare benchmarks/results/A.json benchmarks/results/B.json --threshold 0.1
+"""
+import gc
+import io
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import platform
+import datetime
+import tempfile
+import statistics
+import subprocess
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+PRODUCTION_DB = os.path.join(ROOT, 'data', 'tsa_data.db')
+
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_MIN_DELTA = 0.002   # 秒: 低于此差值视为噪声
+
+# ==========================================
+# Registry
+# ==========================================
+
+class Benchmark:
+    """setup() 只执行一次 (不计时)，返回值传给 func / reset；reset() 在每次计时前执行 (不计时)"""
+
+    def __init__(self, name, func, setup=None, reset=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.reset = reset
+
+BENCHMARKS = []
+
+def benchmark(name, setup=None, reset=None):
+    def register(func):
+        BENCHMARKS.append(Benchmark(name, func, setup, reset))
+        return func
+    return register
+
+# ==========================================
+# Benchmarks (src 模块在函数内导入，保证 TSA_DB_PATH 已生效)
+# ==========================================
+
+@benchmark('merge_db.full')
+def bench_merge_full(state):
+    from src.etl import merge_db
+    merge_db.run(full=True)
+
+@benchmark('merge_db.incremental')
+def bench_merge_incremental(state):
+    from src.etl import merge_db
+    merge_db.run()
+
+def _holiday_dates():
+    import pandas as pd
+    from src.etl.merge_db import HOLIDAY_RANGE
+    return pd.date_range(start=HOLIDAY_RANGE[0], end=HOLIDAY_RANGE[1])
+
+def _clear_holiday_cache(state):
+    from src.utils import holiday_utils
+    holiday_utils.get_holiday_calendar.cache_clear()
+    for path in glob.glob(os.path.join(holiday_utils.CACHE_DIR, 'holiday_calendar_*.npz')):
+        os.remove(path)
+
+@benchmark('holidays.cold', setup=_holiday_dates, reset=_clear_holiday_cache)
+def bench_holidays_cold(dates):
+    from src.utils.holiday_utils import get_holiday_features
+    get_holiday_features(dates)
+
+@benchmark('holidays.warm', setup=_holiday_dates)
+def bench_holidays_warm(dates):
+    from src.utils.holiday_utils import get_holiday_features
+    get_holiday_features(dates)
+
+def _clear_feature_memory_cache(state):
+    from src.models import feature_store
+    feature_store._MEMORY_CACHE.clear()
+
+@benchmark('train_xgb.feature_phase')
+def bench_feature_phase(state):
+    from src.models.feature_store import FeatureStore, SourceContext
+    FeatureStore().load(rebuild=True, context=SourceContext.load())
+
+@benchmark('train_xgb.feature_cached', reset=_clear_feature_memory_cache)
+def bench_feature_cached(state):
+    from src.models.feature_store import FeatureStore, SourceContext
+    FeatureStore().load(context=SourceContext.load())
+
+def _shadow_inputs():
+    from src.db import get_read_connection
+    from src.models.feature_store import load_shadow_model, load_sources
+    model = load_shadow_model()
+    if model is None:
+        raise RuntimeError("shadow_weather_model.pkl not found (run src/models/train_shadow_model.py)")
+    conn = get_read_connection()
+    try:
+        return load_sources(conn), model
+    finally:
+        conn.close()
+
+@benchmark('shadow.inference', setup=_shadow_inputs)
+def bench_shadow_inference(state):
+    from src.models.feature_store import SourceContext
+    sources, model = state
+    SourceContext(sources, model).cancel_rate
+
+def _client():
+    import app
+    return app.app.test_client()
+
+def _clear_response_cache(client):
+    from src.services.response_cache import response_cache
+    response_cache.clear()
+
+def _get(client, url):
+    resp = client.get(url)
+    if resp.status_code != 200:
+        raise RuntimeError(f"GET {url} -> {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+
+@benchmark('api.predictions.cold', setup=_client, reset=_clear_response_cache)
+def bench_api_predictions_cold(client):
+    _get(client, '/api/predictions')
+
+@benchmark('api.predictions.warm', setup=_client)
+def bench_api_predictions_warm(client):
+    _get(client, '/api/predictions')
+
+@benchmark('api.market_sentiment.cold', setup=_client, reset=_clear_response_cache)
+def bench_api_market_cold(client):
+    _get(client, '/api/market_sentiment?lookback=6h')
+
+@benchmark('api.market_sentiment.warm', setup=_client)
+def bench_api_market_warm(client):
+    _get(client, '/api/market_sentiment?lookback=6h')
+
+# ==========================================
+# Runner
+# ==========================================
+
+def _quiet(verbose):
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+def time_benchmark(bench, repeat, verbose=False):
+    with _quiet(verbose):
+        state = bench.setup() if bench.setup else None
+    samples = []
+    for i in range(repeat + 1):   # 第 0 次为预热，不计入
+        with _quiet(verbose):
+            if bench.reset:
+                bench.reset(state)
+            # 与 timeit 相同: 计时期间关闭 GC，避免偶发回收造成的抖动
+            gc.collect()
+            gc.disable()
+            try:
+                t0 = time.perf_counter()
+                bench.func(state)
+                elapsed = time.perf_counter() - t0
+            finally:
+                gc.enable()
+        if i:
+            samples.append(elapsed)
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'repeat': repeat,
+        'samples': [round(s, 6) for s in samples],
+    }
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+def environment_info():
+    import numpy, pandas, sklearn, xgboost
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'sklearn': sklearn.__version__,
+        'xgboost': xgboost.__version__,
+    }
+
+def run(args):
+    db_path = os.path.abspath(args.db) if args.db else None
+    if db_path and os.path.normcase(db_path) == os.path.normcase(PRODUCTION_DB):
+        sys.exit("❌ --db must point to a synthetic database (merge_db.full rebuilds traffic_full)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = db_path or os.path.join(tmp, 'tsa_data.db')
+        os.environ['TSA_DB_PATH'] = db_path
+        os.environ.setdefault('TSA_METRICS', '0')
+
+        import src.config
+        from src.utils import holiday_utils
+        from synthetic_db import build_synthetic_db
+        assert src.config.DB_PATH == db_path, "src.config was imported before TSA_DB_PATH was set"
+        # 节日日历磁盘缓存放到临时目录 (holidays.cold 会清空它)
+        holiday_utils.CACHE_DIR = os.path.join(tmp, 'cache')
+
+        params = {'years': args.years, 'hubs': args.hubs, 'snapshots': args.snapshots, 'seed': args.seed}
+        if os.path.exists(db_path):
+            print(f"📂 Reusing synthetic DB {db_path}")
+            counts = None
+        else:
+            t0 = time.perf_counter()
+            with _quiet(args.verbose):
+                counts = build_synthetic_db(db_path, **params)
+            print(f"🧪 Synthetic DB ({args.years}y, {args.hubs} hubs, {args.snapshots} snapshots) "
+                  f"built in {time.perf_counter() - t0:.1f}s -> {db_path}")
+
+        selected = [b for b in BENCHMARKS if not args.k or any(k in b.name for k in args.k)]
+        results = {}
+        print(f"\n{'Benchmark':<30}{'min':>10}{'median':>10}{'stdev':>10}")
+        print("-" * 60)
+        for bench in selected:
+            try:
+                r = time_benchmark(bench, args.repeat, args.verbose)
+            except Exception as e:
+                print(f"{bench.name:<30}  ❌ {type(e).__name__}: {e}")
+                results[bench.name] = {'error': f"{type(e).__name__}: {e}"}
+                continue
+            results[bench.name] = r
+            print(f"{bench.name:<30}{r['min'] * 1000:>8.1f}ms{r['median'] * 1000:>8.1f}ms{r['stdev'] * 1000:>8.1f}ms")
+
+    commit = _git('rev-parse', '--short', 'HEAD')
+    report = {
+        'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit,
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'environment': environment_info(),
+        'params': {**params, 'repeat': args.repeat, 'reused_db': counts is None},
+        'db_rows': counts,
+        'benchmarks': results,
+    }
+    out = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results -> {out}")
+    if any('error' in r for r in results.values()):
+        sys.exit(1)
+
+# ==========================================
+# Compare
+# ==========================================
+
+def latest_result(exclude=None):
+    files = sorted(glob.glob(os.path.join(RESULTS_DIR, '*.json')), key=os.path.getmtime)
+    files = [f for f in files if not exclude or os.path.abspath(f) != os.path.abspath(exclude)]
+    return files[-1] if files else None
+
+def compare_results(base, new, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    """返回 [(name, base_median, new_median, ratio, status)]，status: ok / faster / REGRESSED / missing / error"""
+    rows = []
+    for name in list(dict.fromkeys([*base['benchmarks'], *new['benchmarks']])):
+        b, n = base['benchmarks'].get(name), new['benchmarks'].get(name)
+        if b is None or n is None:
+            rows.append((name, b and b.get('median'), n and n.get('median'), None, 'missing'))
+            continue
+        if 'error' in b or 'error' in n:
+            rows.append((name, b.get('median'), n.get('median'), None, 'error'))
+            continue
+        ratio = n['median'] / b['median'] if b['median'] else float('inf')
+        delta = n['median'] - b['median']
+        if ratio > 1 + threshold and delta > min_delta:
+            status = 'REGRESSED'
+        elif ratio < 1 - threshold and -delta > min_delta:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, b['median'], n['median'], ratio, status))
+    return rows
+
+def compare(args):
+    new_path = args.new or latest_result(exclude=args.base)
+    if not new_path:
+        sys.exit(f"❌ No result files in {RESULTS_DIR}")
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    print(f"base: {args.base} ({base.get('commit')}{'+dirty' if base.get('dirty') else ''}, {base.get('created_at')})")
+    print(f"new:  {new_path} ({new.get('commit')}{'+dirty' if new.get('dirty') else ''}, {new.get('created_at')})")
+    data_keys = ('years', 'hubs', 'snapshots', 'seed')
+    if any(base['params'].get(k) != new['params'].get(k) for k in data_keys):
+        print("⚠️ Synthetic DB parameters differ, timings are not directly comparable")
+    if base.get('environment') != new.get('environment'):
+        print("⚠️ Environment differs (python / library versions / machine)")
+
+    fmt = lambda v: '-' if v is None else f"{v * 1000:.1f}ms"
+    print(f"\n{'Benchmark':<30}{'base':>10}{'new':>10}{'ratio':>8}  status")
+    print("-" * 68)
+    rows = compare_results(base, new, args.threshold, args.min_delta)
+    for name, b, n, ratio, status in rows:
+        print(f"{name:<30}{fmt(b):>10}{fmt(n):>10}{'-' if ratio is None else f'{ratio:.2f}x':>8}  {status}")
+
+    regressed = [r[0] for r in rows if r[4] == 'REGRESSED']
+    if regressed:
+        print(f"\n❌ {len(regressed)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressed)}")
+        sys.exit(1)
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hot-path benchmark suite with regression comparison")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_run = sub.add_parser('run', help='Run benchmarks on a synthetic database and save JSON results')
+    p_run.add_argument('--years', type=int, default=7, help='Years of synthetic traffic history')
+    p_run.add_argument('--hubs', type=int, default=5, help='Number of weather / flight hubs')
+    p_run.add_argument('--snapshots', type=int, default=20000, help='Market sentiment snapshots')
+    p_run.add_argument('--seed', type=int, default=7)
+    p_run.add_argument('--repeat', type=int, default=5, help='Timed repetitions per benchmark (after 1 warm-up)')
+    p_run.add_argument('--db', help='Synthetic DB path to reuse (generated when missing)')
+    p_run.add_argument('-k', action='append', help='Only run benchmarks whose name contains this (repeatable)')
+    p_run.add_argument('--output', help='Result file (default: benchmarks/results/<time>-<commit>.json)')
+    p_run.add_argument('--verbose', action='store_true', help='Show output of the benchmarked code')
+
+    p_cmp = sub.add_parser('compare', help='Compare two result files and flag regressions')
+    p_cmp.add_argument('base', help='Baseline result JSON')
+    p_cmp.add_argument('new', nargs='?', help='New result JSON (default: latest in benchmarks/results/)')
+    p_cmp.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                       help='Relative slowdown of the median that counts as a regression (0.1 = 10%%)')
+    p_cmp.add_argument('--min-delta', type=float, default=DEFAULT_MIN_DELTA,
+                       help='Ignore slowdowns smaller than this many seconds (noise floor)')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        if args.repeat < 1:
+            parser.error('--repeat must be >= 1')
+        run(args)
+    else:
+        compare(args)
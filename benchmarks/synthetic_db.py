@@ -0,0 +1,167 @@
+"""
+Synthetic tsa_data.db (benchmarks/suite.py 的数据源)
+
+生成与生产库同结构的合成数据库 (固定随机种子，可复现):
+    traffic                     - 最近 N 年的每日客流 (周内 / 季节 / 逐年增长 + 噪声)，截止 T-1
+    weather / daily_weather_index - M 个枢纽机场的观测天气 + 未来 14 天预报 vintage，全国天气指数
+    flight_stats                - 各枢纽最近一年的到港航班数
+    prediction_history / _latest - 最近一年的每日模型运行 (每次预测 7 天) + 今天的 14 天预测
+    market_sentiment_snapshots  - 未结盘日期 x 8 个区间的 K 条快照 (最近 48 小时，不规则抓取间隔)
+Usage:
+    python benchmarks/synthetic_db.py /tmp/bench.db --years 7 --hubs 5 --snapshots 20000
+"""
+import os
+import sys
+import sqlite3
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db.schema import ensure_schema
+from src.db.predictions import refresh_prediction_latest
+
+HUBS = ['ATL', 'ORD', 'DFW', 'DEN', 'JFK', 'LAX', 'SFO', 'SEA', 'LAS', 'MCO', 'CLT', 'PHX', 'MIA', 'IAH', 'BOS']
+OUTCOMES = ['<2.0M', '2.0M-2.2M', '2.2M-2.4M', '2.4M-2.6M', '2.6M-2.8M', '2.8M-3.0M', '3.0M-3.2M', '>3.2M']
+
+FORECAST_DAYS = 14
+PREDICTION_HORIZON = 7
+MARKET_DAYS = 7
+
+def hub_codes(n):
+    """前 15 个为真实枢纽代码，更多时补充 H016, H017 ..."""
+    return HUBS[:n] + [f"H{i:03d}" for i in range(len(HUBS) + 1, n + 1)]
+
+def synthetic_throughput(dates, rng):
+    dow = np.array([1.02, 0.93, 0.95, 1.04, 1.08, 0.97, 1.05])[dates.dayofweek]
+    season = 1 + 0.08 * np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 100) / 365.25)
+    trend = 1 + 0.02 * (dates.year.to_numpy() - dates.year.min())
+    return (2_350_000 * dow * season * trend * rng.normal(1, 0.02, len(dates))).astype(np.int64)
+
+def _weather_frame(dates, hubs, rng, vintage):
+    n = len(dates) * len(hubs)
+    winter = np.tile(np.isin(dates.month, [12, 1, 2]), len(hubs))
+    snow = np.where(winter & (rng.random(n) < 0.08), rng.gamma(1.5, 4.0, n), 0.0)
+    df = pd.DataFrame({
+        'date': np.tile(dates.strftime('%Y-%m-%d'), len(hubs)),
+        'airport': np.repeat(hubs, len(dates)),
+        'snowfall_cm': snow.round(2),
+        'windspeed_kmh': rng.gamma(4.0, 5.0, n).round(2),
+        'precipitation_mm': np.where(rng.random(n) < 0.3, rng.gamma(1.2, 5.0, n), 0.0).round(2),
+        'temperature_min_c': (np.tile(10 - 12 * np.cos(2 * np.pi * (dates.dayofyear.to_numpy() - 15) / 365.25), len(hubs))
+                              + rng.normal(0, 4, n)).round(2),
+    })
+    df['severity_score'] = ((df['snowfall_cm'] > 2).astype(int) * 3 + (df['snowfall_cm'] > 10).astype(int) * 2
+                            + (df['windspeed_kmh'] > 45).astype(int) * 2 + (df['precipitation_mm'] > 20).astype(int))
+    df['updated_at'] = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+    df['vintage'] = vintage
+    return df
+
+def _market_rows(dates, n_snapshots, rng):
+    n_keys = len(dates) * len(OUTCOMES)
+    per_key = max(1, n_snapshots // n_keys)
+    now = pd.Timestamp.now().floor('s')
+    offsets = np.sort(rng.integers(60, 48 * 3600, size=per_key))[::-1]
+    fetch_times = [(now - pd.Timedelta(seconds=int(s))).strftime('%Y-%m-%d %H:%M:%S') for s in offsets]
+    prices = {(d, label): round(float(rng.random()), 3) for d in dates for label in OUTCOMES}
+    rows = []
+    for ts in fetch_times:
+        for d in dates:
+            for label in OUTCOMES:
+                # 每轮抓取约 20% 的价格发生变化
+                if rng.random() < 0.2:
+                    prices[(d, label)] = round(float(rng.random()), 3)
+                rows.append((d, f"tsa-passengers-{d}", label, prices[(d, label)], ts))
+    return rows
+
+def build_synthetic_db(path, years=7, hubs=5, snapshots=20000, seed=7):
+    """在 path 生成合成数据库 (已存在时覆盖)，返回各表行数"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    rng = np.random.default_rng(seed)
+    hub_list = hub_codes(hubs)
+
+    today = pd.Timestamp.now().normalize()
+    last_actual = today - pd.Timedelta(days=1)
+    history = pd.date_range(pd.Timestamp(year=last_actual.year - years, month=1, day=1), last_actual)
+    future = pd.date_range(today, today + pd.Timedelta(days=FORECAST_DAYS))
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("CREATE TABLE traffic (date TEXT PRIMARY KEY, throughput INTEGER)")
+        conn.execute("""
+            CREATE TABLE flight_stats (
+                date TEXT,
+                airport TEXT,
+                arrival_count INTEGER,
+                PRIMARY KEY (date, airport)
+            )
+        """)
+        ensure_schema(conn)
+
+        throughput = synthetic_throughput(history, rng)
+        conn.executemany("INSERT INTO traffic VALUES (?, ?)",
+                         zip(history.strftime('%Y-%m-%d'), throughput.tolist()))
+
+        weather = pd.concat([_weather_frame(history, hub_list, rng, 'observed'),
+                             _weather_frame(future, hub_list, rng, 'forecast')], ignore_index=True)
+        weather.to_sql('weather', conn, if_exists='append', index=False)
+        index = weather.groupby('date', as_index=False)['severity_score'].sum()
+        index['updated_at'] = weather['updated_at'].iloc[0]
+        conn.executemany("INSERT INTO daily_weather_index (date, weather_index, updated_at) VALUES (?, ?, ?)",
+                         index.itertuples(index=False, name=None))
+
+        recent = history[-365:]
+        flights = pd.DataFrame({
+            'date': np.tile(recent.strftime('%Y-%m-%d'), len(hub_list)),
+            'airport': np.repeat(hub_list, len(recent)),
+            'arrival_count': rng.normal(1100, 80, len(recent) * len(hub_list)).astype(int),
+        })
+        flights.to_sql('flight_stats', conn, if_exists='append', index=False)
+
+        # 每天一次模型运行，预测其后 PREDICTION_HORIZON 天；今天的运行覆盖完整预测窗口
+        actual = dict(zip(history, throughput))
+        rows = []
+        for run_date in list(recent) + [today]:
+            horizon = FORECAST_DAYS if run_date == today else PREDICTION_HORIZON
+            for target in pd.date_range(run_date + pd.Timedelta(days=1), periods=horizon):
+                base = actual.get(target, throughput[-7:].mean())
+                rows.append((target.strftime('%Y-%m-%d'), int(base * rng.normal(1, 0.03)),
+                             run_date.strftime('%Y-%m-%d'), int(rng.integers(0, 10)), 0,
+                             int(rng.normal(5500, 300)), int(target.dayofweek >= 5), None))
+        conn.executemany("""
+            INSERT INTO prediction_history (target_date, predicted_throughput, model_run_date,
+                                            weather_index, is_holiday, flight_volume, is_weekend, holiday_name)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        refresh_prediction_latest(conn)
+
+        market_dates = [d.strftime('%Y-%m-%d') for d in pd.date_range(last_actual, periods=MARKET_DAYS)]
+        conn.executemany("""
+            INSERT INTO market_sentiment_snapshots (target_date, market_slug, outcome_label, price, fetched_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, _market_rows(market_dates, snapshots, rng))
+        conn.commit()
+
+        tables = ['traffic', 'weather', 'daily_weather_index', 'flight_stats',
+                  'prediction_history', 'prediction_latest', 'market_sentiment_snapshots']
+        return {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tables}
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic tsa_data.db for benchmarks")
+    parser.add_argument('path', help='Output database path (overwritten)')
+    parser.add_argument('--years', type=int, default=7, help='Years of traffic history')
+    parser.add_argument('--hubs', type=int, default=5, help='Number of weather / flight hubs')
+    parser.add_argument('--snapshots', type=int, default=20000, help='Market sentiment snapshots')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    counts = build_synthetic_db(args.path, args.years, args.hubs, args.snapshots, args.seed)
+    for table, n in counts.items():
+        print(f"{table:<28}{n:>10}")
+    print(f"-> {args.path}")
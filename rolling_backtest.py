@@ -2,7 +2,7 @@
 rolling_backtest.py - 滚动回测脚本 (完整版)
 模拟真实盲测场景，验证模型在历史数据上的整体误差率
 
-【重要】本脚本完整复刻 train_xgb.py 的流程:
+【重要】本脚本与 train_xgb.py 共用同一份特征矩阵 (src/models/feature_store.py):
 1. 加载 Shadow Model 计算 predicted_cancel_rate
 2. 注入天气特征
 3. 应用 Blind Protocol 熔断规则
@@ -10,145 +10,38 @@ rolling_backtest.py - 滚动回测脚本 (完整版)
 使用方式:
     python rolling_backtest.py --start 2026-01-20 --end 2026-01-27
     python rolling_backtest.py  # 默认测试最近 7 天
+    python rolling_backtest.py --start 2025-10-01 --end 2025-12-31 --workers 8 --threads-per-worker 2
+    python rolling_backtest.py --start 2025-10-01 --end 2025-12-31 --warm-start --refit-every 7
 """
 
 import pandas as pd
 import numpy as np
-import sqlite3
 import argparse
 import os
 import sys
-import pickle
+import time
 from datetime import datetime, timedelta
-from xgboost import XGBRegressor
 
 # 添加项目路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from src.config import DB_PATH
-from src.models.feature_mgr import FEAT_HYBRID, SHADOW_FEATURES
+from src.models.backtest_engine import (DEFAULT_REFIT_EVERY, DEFAULT_THREADS_PER_WORKER, DEFAULT_WARM_ROUNDS,
+                                        default_workers, iter_backtest)
+from src.models.feature_mgr import FEAT_HYBRID
+from src.models.feature_store import FeatureStore
 
 # ============================
 # 核心逻辑
 # ============================
 
 def load_and_prepare_data():
-    """加载并预处理全量数据 (完整复刻 train_xgb.py)"""
-    print("📊 正在加载数据...")
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql("SELECT * FROM traffic_full", conn)
-    conn.close()
+    """加载全量特征矩阵 (与 train_xgb.py 共用 FeatureStore，输入未变化时直接命中缓存)"""
+    print("📊 正在加载特征矩阵 (Feature Store)...")
+    df = FeatureStore().load()
     
-    df['ds'] = pd.to_datetime(df['date'])
-    df['y'] = df['throughput']
-    df = df.sort_values('ds').reset_index(drop=True)
-    
-    # ========================================
-    # [STEP 1] 加载天气指数
-    # ========================================
-    try:
-        print("   📡 加载天气指数...")
-        conn_weather = sqlite3.connect(DB_PATH)
-        df_weather = pd.read_sql("SELECT date, weather_index FROM daily_weather_index", conn_weather)
-        df_weather['date'] = pd.to_datetime(df_weather['date'])
-        conn_weather.close()
-        
-        if 'weather_index' not in df.columns:
-            df = df.merge(df_weather, left_on='ds', right_on='date', how='left')
-            df.drop(columns=['date_y'], inplace=True, errors='ignore')
-            df.rename(columns={'date_x': 'date'}, inplace=True, errors='ignore')
-        
-        if 'weather_index' in df.columns:
-            df['weather_index'] = df['weather_index'].fillna(0).astype(int)
-        else:
-            df['weather_index'] = 0
-        print(f"      ✅ 天气指数加载完成。范围: {df['weather_index'].min()} - {df['weather_index'].max()}")
-    except Exception as e:
-        print(f"      ⚠️ 天气加载失败: {e}")
-        df['weather_index'] = 0
-    
-    # ========================================
-    # [STEP 2] 加载影子模型 & 计算 predicted_cancel_rate
-    # ========================================
-    try:
-        print("   🔮 加载影子模型...")
-        from src.models.model_utils import get_aggregated_weather_features
-        
-        shadow_model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
-                                          'src', 'models', 'shadow_weather_model.pkl')
-        
-        if os.path.exists(shadow_model_path):
-            with open(shadow_model_path, 'rb') as f:
-                shadow_model = pickle.load(f)
-            
-            # 获取聚合天气特征
-            conn_shadow = sqlite3.connect(DB_PATH)
-            df_weather_agg = get_aggregated_weather_features(conn_shadow)
-            conn_shadow.close()
-            
-            # 使用影子模型预测取消率
-            print("      🎯 影子模型正在预测取消率...")
-            X_shadow = df_weather_agg[SHADOW_FEATURES].fillna(0)
-            df_weather_agg['predicted_cancel_rate'] = shadow_model.predict(X_shadow)
-            
-            # 合并到主 DataFrame
-            df = df.merge(df_weather_agg[['date', 'predicted_cancel_rate']], 
-                         left_on='ds', right_on='date', how='left')
-            df.drop(columns=['date'], inplace=True, errors='ignore')
-            df['predicted_cancel_rate'] = df['predicted_cancel_rate'].fillna(0)
-            
-            print(f"      ✅ 影子模型注入完成。平均取消率: {df['predicted_cancel_rate'].mean():.4f}")
-            print(f"         最大取消率: {df['predicted_cancel_rate'].max():.4f} (日期: {df.loc[df['predicted_cancel_rate'].idxmax(), 'ds'].strftime('%Y-%m-%d')})")
-        else:
-            print(f"      ⚠️ 影子模型文件不存在: {shadow_model_path}")
-            df['predicted_cancel_rate'] = 0
-            
-    except Exception as e:
-        print(f"      ⚠️ 影子模型加载失败: {e}")
-        import traceback
-        traceback.print_exc()
-        df['predicted_cancel_rate'] = 0
-    
-    # ========================================
-    # [STEP 3] 特征工程 (与 train_xgb.py 保持一致)
-    # ========================================
-    print("   🔧 生成特征...")
-    
-    # A. 时间特征
-    df['day_of_week'] = df['ds'].dt.dayofweek
-    df['month'] = df['ds'].dt.month
-    df['year'] = df['ds'].dt.year
-    df['day_of_year'] = df['ds'].dt.dayofyear
-    df['week_of_year'] = df['ds'].dt.isocalendar().week.astype(int)
-    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-    
-    # B. Lags
-    df['lag_7'] = df['y'].shift(7).fillna(method='bfill')
-    df['lag_364'] = df['y'].shift(364).fillna(method='bfill')
-    df['lag_365'] = df['y'].shift(365).fillna(method='bfill')
-    
-    # C. Business Logic
-    match_month = df['ds'].dt.month.isin([1, 2, 9, 10])
-    match_day = df['ds'].dt.dayofweek.isin([1, 2])
-    df['is_off_peak_workday'] = (match_month & match_day).astype(int)
-    
-    # D. 确保必要列存在
-    required_cols = ['is_holiday', 'days_to_nearest_holiday', 'is_long_weekend',
-                     'is_holiday_exact_day', 'is_holiday_travel_window', 
-                     'lag_7_clean', 'lag_holiday_yoy', 'holiday_intensity']
-    for c in required_cols:
-        if c not in df.columns:
-            df[c] = 0
-    
-    # E. 衍生特征 (基于影子模型输出)
-    df['w_lag_1'] = df['weather_index'].shift(1).fillna(0)
-    df['w_lag_2'] = df['weather_index'].shift(2).fillna(0)
-    df['w_lag_3'] = df['weather_index'].shift(3).fillna(0)
-    df['revenge_index'] = (df['w_lag_1'] * 0.5) + (df['w_lag_2'] * 0.3) + (df['w_lag_3'] * 0.2)
-    
-    # 调整后的滞后 (考虑取消率)
-    df['lag_7_adjusted'] = df['lag_7'] * (1 - df['predicted_cancel_rate'])
-    df['lag_364_adjusted'] = df['lag_364'] * (1 - df['predicted_cancel_rate'])
-    df['lead_1_shadow_cancel_rate'] = df['predicted_cancel_rate'].shift(-1).fillna(0)
+    if not df.empty:
+        print(f"      ✅ 天气指数范围: {df['weather_index'].min()} - {df['weather_index'].max()}")
+        print(f"      ✅ 影子模型平均取消率: {df['predicted_cancel_rate'].mean():.4f}")
+        print(f"         最大取消率: {df['predicted_cancel_rate'].max():.4f} (日期: {df.loc[df['predicted_cancel_rate'].idxmax(), 'ds'].strftime('%Y-%m-%d')})")
     
     print(f"   ✅ 数据准备完成，共 {len(df)} 条记录")
     return df
@@ -200,20 +93,9 @@ def apply_blind_protocol(base_pred, row, baseline_pred=None):
     return final_pred, triggered_rules, multiplier
 
 
-def run_single_day_backtest(df_full, target_date, features):
-    """
-    对单个日期进行盲测回测
-    """
-    cutoff_date = target_date - timedelta(days=1)
-    
-    # 分割数据
-    train_df = df_full[df_full['ds'] <= cutoff_date].copy()
-    test_df = df_full[df_full['ds'] == target_date].copy()
-    
-    if test_df.empty:
-        return None
-    
-    actual_val = test_df.iloc[0]['y']
+def resolve_actual(test_row, target_date):
+    """目标日的真实值；缺失 / 为 0 时返回 None (该日跳过)"""
+    actual_val = test_row['y']
     
     # [FALLBACK] Hardcoded Actual for Jan 27
     if target_date.strftime('%Y-%m-%d') == '2026-01-27' and (pd.isna(actual_val) or actual_val == 0):
@@ -221,30 +103,17 @@ def run_single_day_backtest(df_full, target_date, features):
         
     if pd.isna(actual_val) or actual_val == 0:
         return None
-    
-    # 确保所有特征存在
-    for f in features:
-        if f not in train_df.columns: train_df[f] = 0
-        if f not in test_df.columns: test_df[f] = 0
-    
-    X_train = train_df[features].fillna(0)
-    y_train = train_df['y'].fillna(0)
-    X_test = test_df[features].fillna(0)
-    
-    # 训练模型
-    model = XGBRegressor(
-        n_estimators=500, learning_rate=0.05, max_depth=5, 
-        subsample=0.8, colsample_bytree=0.8, n_jobs=-1, random_state=42,
-        verbosity=0
-    )
-    model.fit(X_train, y_train)
-    
-    # 预测
-    base_pred = model.predict(X_test)[0]
+    return actual_val
+
+
+def build_day_result(test_row, target_date, actual_val, base_pred):
+    """
+    单日盲测结果: base prediction -> 熔断规则 (Scheme B) -> 误差
+    """
     if pd.isna(base_pred): base_pred = 0
     
     # 应用熔断规则 (Scheme B)
-    row_data = test_df.iloc[0].fillna(0).to_dict()
+    row_data = test_row.fillna(0).to_dict()
     # 使用 lag_7 作为基准
     baseline = row_data.get('lag_7', 0)
     final_pred, triggered_rules, multiplier = apply_blind_protocol(base_pred, row_data, baseline_pred=baseline)
@@ -267,49 +136,124 @@ def run_single_day_backtest(df_full, target_date, features):
     }
 
 
-def run_rolling_backtest(start_date, end_date):
+def run_single_day_backtest(df_full, target_date, features):
+    """
+    对单个日期进行盲测回测 (串行，单次拟合)
+    """
+    df_full = df_full.sort_values('ds').reset_index(drop=True)
+    test_df = df_full[df_full['ds'] == target_date]
+    if test_df.empty:
+        return None
+    actual_val = resolve_actual(test_df.iloc[0], target_date)
+    if actual_val is None:
+        return None
+    
+    for res in iter_backtest(df_full, features, [target_date], workers=1):
+        return build_day_result(df_full.iloc[res['row']], target_date, actual_val, res['base_prediction'])
+    return None
+
+
+def print_day_result(result):
+    status = "✅" if result['error_pct'] <= 5.0 else "⚠️" if result['error_pct'] <= 10.0 else "❌"
+    
+    # 详细输出
+    rule_info = f"[{result['triggered_rules']}]" if result['triggered_rules'] != 'None' else ""
+    cancel_info = f"CR={result['cancel_rate']:.2%}" if result['cancel_rate'] > 0.01 else ""
+    
+    print(f"   {status} {result['date']}: "
+          f"Base {result['base_prediction']:,} -> Final {result['predicted']:,} "
+          f"vs Actual {result['actual']:,} | "
+          f"误差 {result['error_pct']:.2f}% "
+          f"{cancel_info} {rule_info}")
+
+
+def _run_pass(df_full, features, actuals, verbose=True, **engine_kwargs):
+    """一次完整的逐日回测 (engine 拟合 + 熔断后处理)，返回 (结果列表, 耗时秒)"""
+    results = []
+    t0 = time.perf_counter()
+    for res in iter_backtest(df_full, features, list(actuals), **engine_kwargs):
+        target_date = pd.Timestamp(res['date'])
+        result = build_day_result(df_full.iloc[res['row']], target_date, actuals[target_date], res['base_prediction'])
+        result['fit_mode'] = res['mode']
+        results.append(result)
+        if verbose:
+            print_day_result(result)
+    return results, time.perf_counter() - t0
+
+
+def print_warm_start_comparison(df_warm, df_full_refit, sec_warm, sec_full):
+    """Warm-start vs 每日完整重训: 精度差异与耗时"""
+    cmp = df_warm[['date', 'predicted', 'error_pct']].merge(
+        df_full_refit[['date', 'predicted', 'error_pct']], on='date', suffixes=('_warm', '_full'))
+    mape_warm = cmp['error_pct_warm'].mean()
+    mape_full = cmp['error_pct_full'].mean()
+    pred_gap = ((cmp['predicted_warm'] - cmp['predicted_full']).abs() / cmp['predicted_full'].abs().clip(lower=1)) * 100
+    
+    print("\n" + "=" * 70)
+    print("🔁 Warm-start vs 完整重训 (Full Refit)")
+    print("=" * 70)
+    print(f"   MAPE: warm {mape_warm:.2f}% vs full {mape_full:.2f}% (Δ {mape_warm - mape_full:+.2f} pp)")
+    print(f"   预测偏离: 平均 {pred_gap.mean():.2f}%, 最大 {pred_gap.max():.2f}% ({cmp.loc[pred_gap.idxmax(), 'date']})")
+    print(f"   变差天数: {int((cmp['error_pct_warm'] > cmp['error_pct_full']).sum())} / {len(cmp)}")
+    print(f"   耗时: warm {sec_warm:.1f}s vs full {sec_full:.1f}s (加速 {sec_full / max(sec_warm, 1e-6):.1f}x)")
+
+
+def run_rolling_backtest(start_date, end_date, workers=None, threads_per_worker=DEFAULT_THREADS_PER_WORKER,
+                         warm_start=False, refit_every=DEFAULT_REFIT_EVERY, warm_rounds=DEFAULT_WARM_ROUNDS):
     """
     运行滚动回测
+    每个目标日期的模型互相独立，由 backtest_engine 分片到进程池并行拟合，结果按完成顺序输出。
+    warm_start=True 时每 refit_every 天完整重训一次，其余日期在前一天的模型上追加 warm_rounds 棵树，
+    并额外跑一遍每日完整重训作为基准，报告两者的精度差异。
     """
     print(f"\n🚀 启动滚动回测 (完整流程)")
     print(f"   日期范围: {start_date} 至 {end_date}")
+    if warm_start:
+        print(f"   模式: Warm-start (每 {refit_every} 天完整重训, 其余 +{warm_rounds} 棵树)")
     print("=" * 70)
     
     # 加载数据 (包含影子模型注入)
     df_full = load_and_prepare_data()
     features = FEAT_HYBRID
+    df_full = df_full.sort_values('ds').reset_index(drop=True)
     
     # 生成日期列表
     start_dt = pd.to_datetime(start_date)
     end_dt = pd.to_datetime(end_date)
     date_range = pd.date_range(start=start_dt, end=end_dt, freq='D')
     
-    results = []
-    
-    print("\n📅 逐日回测:")
+    # 预先筛掉缺少真实值的日期，不为其拟合模型
+    rows_by_date = pd.Series(df_full.index, index=df_full['ds'])
+    actuals = {}
+    for target_date in date_range:
+        if target_date in rows_by_date.index:
+            actual_val = resolve_actual(df_full.iloc[rows_by_date[target_date]], target_date)
+            if actual_val is not None:
+                actuals[target_date] = actual_val
+                continue
+        print(f"   ⏭️ {target_date.strftime('%Y-%m-%d')}: 数据缺失，跳过")
+    
+    workers = workers or default_workers(threads_per_worker)
+    engine_kwargs = {'workers': workers, 'threads_per_worker': threads_per_worker}
+    print(f"\n📅 逐日回测 ({len(actuals)} 天, {min(workers, max(len(actuals), 1))} 个进程 x {threads_per_worker} 线程):")
     print("-" * 70)
     
-    for target_date in date_range:
-        result = run_single_day_backtest(df_full, target_date, features)
-        if result:
-            results.append(result)
-            status = "✅" if result['error_pct'] <= 5.0 else "⚠️" if result['error_pct'] <= 10.0 else "❌"
-            
-            # 详细输出
-            rule_info = f"[{result['triggered_rules']}]" if result['triggered_rules'] != 'None' else ""
-            cancel_info = f"CR={result['cancel_rate']:.2%}" if result['cancel_rate'] > 0.01 else ""
-            
-            print(f"   {status} {result['date']}: "
-                  f"Base {result['base_prediction']:,} -> Final {result['predicted']:,} "
-                  f"vs Actual {result['actual']:,} | "
-                  f"误差 {result['error_pct']:.2f}% "
-                  f"{cancel_info} {rule_info}")
-        else:
-            print(f"   ⏭️ {target_date.strftime('%Y-%m-%d')}: 数据缺失，跳过")
+    if warm_start:
+        results, elapsed = _run_pass(df_full, features, actuals, refit_every=refit_every,
+                                     warm_rounds=warm_rounds, **engine_kwargs)
+    else:
+        results, elapsed = _run_pass(df_full, features, actuals, **engine_kwargs)
+    print(f"   ⏱️ 回测耗时: {elapsed:.1f}s")
+    
+    baseline = None
+    if warm_start and results:
+        print("\n   🔁 运行每日完整重训基准...")
+        baseline, elapsed_full = _run_pass(df_full, features, actuals, verbose=False, **engine_kwargs)
+        print(f"   ⏱️ 基准耗时: {elapsed_full:.1f}s")
     
     # 汇总统计
     if results:
-        df_results = pd.DataFrame(results)
+        df_results = pd.DataFrame(results).sort_values('date').reset_index(drop=True)
         
         print("\n" + "=" * 70)
         print("📊 回测汇总统计")
@@ -333,6 +277,11 @@ def run_rolling_backtest(start_date, end_date):
             for _, row in disaster_days.iterrows():
                 print(f"         - {row['date']}: W={row['weather_index']}, CR={row['cancel_rate']:.2%}, 误差={row['error_pct']:.2f}%")
         
+        if baseline:
+            df_baseline = pd.DataFrame(baseline).sort_values('date').reset_index(drop=True)
+            print_warm_start_comparison(df_results, df_baseline, elapsed, elapsed_full)
+            df_results['predicted_full_refit'] = df_baseline.set_index('date')['predicted'].reindex(df_results['date']).values
+        
         # 保存结果
         output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backtest_results.csv')
         df_results.to_csv(output_path, index=False)
@@ -352,6 +301,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='滚动回测脚本 (完整版)')
     parser.add_argument('--start', type=str, default=None, help='开始日期 (YYYY-MM-DD)')
     parser.add_argument('--end', type=str, default=None, help='结束日期 (YYYY-MM-DD)')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数 (默认: CPU 核数 / 每进程线程数; 1 = 串行)')
+    parser.add_argument('--threads-per-worker', type=int, default=DEFAULT_THREADS_PER_WORKER,
+                        help=f'每个进程的 XGBoost 线程数 (默认: {DEFAULT_THREADS_PER_WORKER})')
+    parser.add_argument('--warm-start', action='store_true', help='在前一天的模型上继续 boosting，并与每日完整重训对比精度')
+    parser.add_argument('--refit-every', type=int, default=DEFAULT_REFIT_EVERY,
+                        help=f'warm-start 模式下每 N 天完整重训一次 (默认: {DEFAULT_REFIT_EVERY})')
+    parser.add_argument('--warm-rounds', type=int, default=DEFAULT_WARM_ROUNDS,
+                        help=f'warm-start 每天追加的树数量 (默认: {DEFAULT_WARM_ROUNDS})')
     
     args = parser.parse_args()
     
@@ -361,4 +318,5 @@ if __name__ == "__main__":
     if args.start is None:
         args.start = (datetime.strptime(args.end, '%Y-%m-%d') - timedelta(days=7)).strftime('%Y-%m-%d')
     
-    run_rolling_backtest(args.start, args.end)
+    run_rolling_backtest(args.start, args.end, workers=args.workers, threads_per_worker=args.threads_per_worker,
+                         warm_start=args.warm_start, refit_every=args.refit_every, warm_rounds=args.warm_rounds)
@@ -3,8 +3,11 @@ import os
 # Define project root (one level up from src/)
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-# Database Path
-DB_PATH = os.path.join(PROJECT_ROOT, 'data', 'tsa_data.db')
+# Database Path (TSA_DB_PATH 可用环境变量覆盖，便于基准测试指向合成数据库；须在导入 src 模块之前设置)
+DB_PATH = os.environ.get('TSA_DB_PATH', os.path.join(PROJECT_ROOT, 'data', 'tsa_data.db'))
+
+# Derived artefact cache (holiday calendars etc.) - safe to delete, rebuilt on demand
+CACHE_DIR = os.path.join(PROJECT_ROOT, 'data', 'cache')
 
 # Model Paths
 MODEL_DIR = os.path.join(PROJECT_ROOT) 
@@ -15,7 +18,7 @@ FORECAST_MODEL_PATH = os.path.join(PROJECT_ROOT, 'xgb_forecast_v1.json')
 # [ARCH] Sniper Model (T+0 Nowcast) - Trained/Used by predict_sniper.py
 SNIPER_MODEL_PATH = os.path.join(PROJECT_ROOT, 'sniper_jit_v1.json')
 
-# API Endpoints
-POLYMARKET_API_URL = "https://gamma-api.polymarket.com/events"
+# API Endpoints (POLYMARKET_API_URL 可用环境变量覆盖，便于指向本地 stub server)
+POLYMARKET_API_URL = os.environ.get('POLYMARKET_API_URL', "https://gamma-api.polymarket.com/events")
 OPENSKY_API_URL = "https://opensky-network.org/api/flights/arrival"
 TSA_URL = "https://www.tsa.gov/travel/passenger-volumes"
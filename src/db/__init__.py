@@ -0,0 +1,11 @@
+"""
+SQLite access layer: pooled WAL connections, schema / migrations and write helpers
+shared by ETL, models and the API.
+"""
+from src.db.connection import get_connection, get_read_connection, begin_immediate, close_all
+from src.db.schema import SCHEMA_VERSION, ensure_schema, upsert_df, diff_upsert
+from src.db.versions import bump_version, get_versions
+
+__all__ = ['get_connection', 'get_read_connection', 'begin_immediate', 'close_all',
+           'SCHEMA_VERSION', 'ensure_schema', 'upsert_df', 'diff_upsert',
+           'bump_version', 'get_versions']
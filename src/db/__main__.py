@@ -0,0 +1,22 @@
+import argparse
+
+from src.config import DB_PATH
+from src.db.connection import get_connection
+from src.db.schema import ensure_schema
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM after migrating (reclaim space from compacted tables)')
+    args = parser.parse_args()
+
+    conn = get_connection()
+    before = conn.execute("PRAGMA user_version").fetchone()[0]
+    ensure_schema(conn)
+    after = conn.execute("PRAGMA user_version").fetchone()[0]
+    print(f"Schema version: {before} -> {after} ({DB_PATH})")
+    if args.vacuum:
+        size_before = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+        conn.execute("VACUUM")
+        size_after = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+        print(f"VACUUM: {size_before / 1e6:.1f}MB -> {size_after / 1e6:.1f}MB")
+    conn.close()
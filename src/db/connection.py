@@ -0,0 +1,159 @@
+"""
+Connection Manager (单一 SQLite 入口)
+
+- WAL 模式: 后台 ETL 写入时，仪表盘读取不再被 "database is locked" 阻塞。
+- PRAGMA 调优: synchronous=NORMAL / cache_size / mmap_size / temp_store / busy_timeout。
+- 连接池: 每个线程同一时间持有同一个连接 (嵌套调用复用)，close() 归还到进程级空闲池而不是真正关闭。
+- 读写分离: get_read_connection() 以 mode=ro 打开，误写会直接报错；写入走 get_connection()。
+
+Usage:
+    from src.db import get_connection, get_read_connection
+    conn = get_read_connection()
+    df = pd.read_sql("SELECT ...", conn)
+    conn.close()   # 归还连接池
+"""
+import os
+import sys
+import sqlite3
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.config import DB_PATH
+
+BUSY_TIMEOUT_MS = 30000
+
+# 每个连接打开时执行 (journal_mode 仅写连接设置，WAL 为持久化属性)
+CONNECTION_PRAGMAS = {
+    'synchronous': 'NORMAL',          # WAL 下 NORMAL 已保证一致性，只在 checkpoint 时 fsync
+    'cache_size': -64000,             # 负数单位为 KiB (~64MB page cache)
+    'mmap_size': 256 * 1024 * 1024,   # 256MB 内存映射读取
+    'temp_store': 'MEMORY',
+    'busy_timeout': BUSY_TIMEOUT_MS,
+}
+
+# 每个 (进程, 数据库, 读/写) 最多保留的空闲连接数
+MAX_IDLE_CONNECTIONS = 8
+
+_UNSET = object()
+
+_pool_lock = threading.Lock()
+_idle = {}                   # key -> [PooledConnection, ...]
+_local = threading.local()   # .held: key -> conn (当前线程持有的连接)
+
+class PooledConnection(sqlite3.Connection):
+    """close() 把连接归还连接池; discard() 才真正关闭"""
+
+    def close(self):
+        _release(self)
+
+    def discard(self):
+        super().close()
+
+def _pool_key(db_path, readonly):
+    # 以 pid 区分进程: fork 出来的子进程不能复用父进程的连接
+    return (os.getpid(), os.path.abspath(db_path), readonly)
+
+def _open(db_path, readonly):
+    if readonly:
+        uri = f"file:{os.path.abspath(db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False, factory=PooledConnection)
+    else:
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False, factory=PooledConnection)
+        conn.execute("PRAGMA journal_mode=WAL")
+
+    for name, value in CONNECTION_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+def _held():
+    if not hasattr(_local, 'held'):
+        _local.held = {}
+    return _local.held
+
+def _checkout(db_path, readonly, row_factory):
+    path = db_path or DB_PATH
+    key = _pool_key(path, readonly)
+    held = _held()
+
+    conn = held.get(key)
+    if conn is not None:
+        # 同一线程的嵌套调用复用同一连接; 只在显式指定时升级 row_factory，避免影响外层调用方
+        conn._refs += 1
+        if row_factory is not _UNSET and row_factory is not None:
+            conn.row_factory = row_factory
+        return conn
+
+    with _pool_lock:
+        idle = _idle.get(key)
+        conn = idle.pop() if idle else None
+    if conn is None:
+        if readonly and not os.path.exists(path):
+            # 数据库尚未创建，只读打开会失败 -> 退化为写连接
+            return _checkout(db_path, False, row_factory)
+        conn = _open(path, readonly)
+        conn._pool_key = key
+
+    conn._refs = 1
+    conn.row_factory = None if row_factory is _UNSET else row_factory
+    held[key] = conn
+    return conn
+
+def _release(conn):
+    if getattr(conn, '_refs', 0) <= 0:
+        return  # 重复 close() 视为 no-op
+    conn._refs -= 1
+    if conn._refs > 0:
+        return
+
+    key = conn._pool_key
+    held = _held()
+    if held.get(key) is conn:
+        del held[key]
+
+    try:
+        if conn.in_transaction:
+            # 与 sqlite3 原生 close() 一致: 未提交的修改被丢弃
+            conn.rollback()
+    except sqlite3.Error:
+        conn.discard()
+        return
+
+    with _pool_lock:
+        idle = _idle.setdefault(key, [])
+        if key[0] == os.getpid() and len(idle) < MAX_IDLE_CONNECTIONS:
+            idle.append(conn)
+            return
+    conn.discard()
+
+def get_connection(db_path=None, row_factory=_UNSET):
+    """读写连接 (WAL)。用完调用 close() 归还。"""
+    return _checkout(db_path, False, row_factory)
+
+def get_read_connection(db_path=None, row_factory=_UNSET):
+    """只读连接 (mode=ro)。WAL 下读取不阻塞写入，也不会被写入阻塞。"""
+    return _checkout(db_path, True, row_factory)
+
+def begin_immediate(conn):
+    """
+    以 BEGIN IMMEDIATE 开启写事务 (调用方已开启事务时沿用)，之后仍由 with conn: 提交 / 回滚。
+    "先读后写" 的事务必须先取得写锁: DEFERRED 事务读取后再升级写锁时，若期间其他连接已提交，
+    WAL 下直接返回 "database is locked" (SQLITE_BUSY_SNAPSHOT)，不会等待 busy_timeout；
+    BEGIN IMMEDIATE 在拿锁阶段按 busy_timeout 等待，并发写入者 (流水线抓取步骤 / 任务队列 / span 写入) 依次排队。
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+def close_all():
+    """关闭所有空闲连接 (进程退出 / 测试清理时调用)"""
+    with _pool_lock:
+        conns = [c for idle in _idle.values() for c in idle]
+        _idle.clear()
+    for conn in conns:
+        try:
+            conn.discard()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,82 @@
+"""
+prediction_latest: 每个 target_date 最新一条预测的物化表
+
+prediction_history 是只追加的完整日志 (保留所有历史运行，供验证分析)；
+读取方 (API / 导出 / 挑战者模型) 只关心每个目标日期的最新预测，直接按主键读取 prediction_latest。
+"最新" = model_run_date 最大，同一运行日期取 id 最大 (与原 sort_values / MAX(id) 去重一致)。
+所有写入 prediction_history 的训练脚本都经 log_predictions()，保证 prediction_latest 与版本号同步。
+"""
+from src.db.versions import bump_version
+
+LATEST_COLUMNS = ['target_date', 'history_id', 'predicted_throughput', 'model_run_date',
+                  'weather_index', 'is_holiday', 'flight_volume', 'is_weekend', 'holiday_name']
+
+def refresh_prediction_latest(conn, target_dates=None):
+    """
+    从 prediction_history 重算指定目标日期 (None = 全部) 的最新预测并 upsert。
+    在写入 prediction_history 的同一事务内调用，不负责提交。
+    """
+    where = ""
+    params = ()
+    if target_dates is not None:
+        target_dates = list(target_dates)
+        if not target_dates:
+            return 0
+        where = f"AND p.target_date IN ({', '.join(['?'] * len(target_dates))})"
+        params = tuple(target_dates)
+
+    cols = ', '.join(LATEST_COLUMNS)
+    updates = ', '.join(f"{c} = excluded.{c}" for c in LATEST_COLUMNS if c != 'target_date')
+    cur = conn.execute(f"""
+        INSERT INTO prediction_latest ({cols}, updated_at)
+        SELECT p.target_date, p.id, p.predicted_throughput, p.model_run_date,
+               p.weather_index, p.is_holiday, p.flight_volume, p.is_weekend, p.holiday_name,
+               datetime('now', 'localtime')
+        FROM prediction_history p
+        WHERE p.id = (
+            SELECT q.id FROM prediction_history q
+            WHERE q.target_date = p.target_date
+            ORDER BY q.model_run_date DESC, q.id DESC
+            LIMIT 1
+        )
+        {where}
+        ON CONFLICT(target_date) DO UPDATE SET {updates}, updated_at = excluded.updated_at
+    """, params)
+    return cur.rowcount
+
+def log_predictions(conn, new_log):
+    """
+    写入一次模型运行的预测: 删除同一 (target_date, model_run_date) 的旧记录 (同日重跑覆盖) 后追加到
+    prediction_history，同一事务内刷新 prediction_latest 并递增 'predictions' 版本号。不负责提交，返回写入行数。
+    new_log: DataFrame [target_date (str), predicted_throughput, model_run_date,
+                        weather_index, is_holiday, flight_volume, is_weekend]
+    """
+    dt_list = new_log['target_date'].tolist()
+    conn.executemany("DELETE FROM prediction_history WHERE target_date = ? AND model_run_date = ?",
+                     list(zip(dt_list, new_log['model_run_date'])))
+
+    records = []
+    for _, row in new_log.iterrows():
+        records.append({
+            'target_date': str(row['target_date']),
+            'predicted_throughput': int(row['predicted_throughput']),
+            'model_run_date': str(row['model_run_date']),
+            'weather_index': int(row.get('weather_index', 0)),
+            'is_holiday': int(row.get('is_holiday', 0)),
+            'flight_volume': int(row.get('flight_volume', 0)),
+            'is_weekend': int(row.get('is_weekend', 0))
+        })
+
+    conn.executemany('''
+        INSERT INTO prediction_history (
+            target_date, predicted_throughput, model_run_date,
+            weather_index, is_holiday, flight_volume, is_weekend
+        )
+        VALUES (
+            :target_date, :predicted_throughput, :model_run_date,
+            :weather_index, :is_holiday, :flight_volume, :is_weekend
+        )
+    ''', records)
+    refresh_prediction_latest(conn, dt_list)
+    bump_version(conn, 'predictions')
+    return len(records)
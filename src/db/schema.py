@@ -0,0 +1,457 @@
+"""
+Schema Migrations (DB_SCHEMA.md as code)
+
+- 所有业务表的 DDL 在此集中定义 (真正的主键，而不是 pandas to_sql 生成的无键表)。
+- PRAGMA user_version 记录已应用的迁移版本；旧库首次连接时自动迁移。
+- 写入统一走 upsert_df (INSERT ... ON CONFLICT DO UPDATE)，不再 DROP + replace。
+
+Usage:
+    python -m src.db            # 迁移 DB_PATH 指向的数据库
+"""
+import os
+import sys
+import sqlite3
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.config import DB_PATH
+from src.db.connection import begin_immediate
+
+SCHEMA_VERSION = 6
+
+# ==========================================
+# 1. Table Definitions
+# ==========================================
+
+TABLES = {
+    'traffic_full': """
+        CREATE TABLE IF NOT EXISTS traffic_full (
+            date TEXT PRIMARY KEY,
+            throughput REAL,
+            weather_index INTEGER,
+            is_holiday INTEGER,
+            holiday_name TEXT,
+            is_holiday_exact_day INTEGER,
+            is_holiday_travel_window INTEGER,
+            is_spring_break INTEGER,
+            throughput_lag_7 REAL,
+            flight_volume INTEGER,
+            flight_ma_7 INTEGER,
+            flight_lag_1 INTEGER
+        )
+    """,
+    'weather': """
+        CREATE TABLE IF NOT EXISTS weather (
+            date TEXT,
+            airport TEXT,
+            snowfall_cm REAL,
+            windspeed_kmh REAL,
+            precipitation_mm REAL,
+            temperature_min_c REAL,
+            severity_score INTEGER,
+            updated_at TEXT,
+            vintage TEXT,
+            PRIMARY KEY (date, airport)
+        )
+    """,
+    'weather_vintages': """
+        CREATE TABLE IF NOT EXISTS weather_vintages (
+            date TEXT,
+            airport TEXT,
+            vintage TEXT,
+            snowfall_cm REAL,
+            windspeed_kmh REAL,
+            precipitation_mm REAL,
+            temperature_min_c REAL,
+            severity_score INTEGER,
+            updated_at TEXT,
+            PRIMARY KEY (date, airport, vintage)
+        )
+    """,
+    'daily_weather_index': """
+        CREATE TABLE IF NOT EXISTS daily_weather_index (
+            date TEXT PRIMARY KEY,
+            weather_index INTEGER,
+            updated_at TEXT
+        )
+    """,
+    'prediction_history': """
+        CREATE TABLE IF NOT EXISTS prediction_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            target_date TEXT,
+            predicted_throughput INTEGER,
+            model_run_date TEXT,
+            weather_index INTEGER,
+            is_holiday INTEGER,
+            flight_volume INTEGER,
+            is_weekend INTEGER,
+            holiday_name TEXT,
+            base_prediction INTEGER,
+            multiplier REAL,
+            triggered_rules TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    'prediction_latest': """
+        CREATE TABLE IF NOT EXISTS prediction_latest (
+            target_date TEXT PRIMARY KEY,
+            history_id INTEGER,
+            predicted_throughput INTEGER,
+            model_run_date TEXT,
+            weather_index INTEGER,
+            is_holiday INTEGER,
+            flight_volume INTEGER,
+            is_weekend INTEGER,
+            holiday_name TEXT,
+            updated_at TEXT
+        )
+    """,
+    'market_sentiment_snapshots': """
+        CREATE TABLE IF NOT EXISTS market_sentiment_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            target_date TEXT,
+            market_slug TEXT,
+            outcome_label TEXT,
+            price REAL,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    'data_versions': """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER,
+            updated_at TEXT
+        )
+    """,
+    'jobs': """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            job_type TEXT,
+            status TEXT,
+            progress REAL,
+            message TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            duration_sec REAL,
+            owner TEXT
+        )
+    """,
+    'tsa_frozen_years': """
+        CREATE TABLE IF NOT EXISTS tsa_frozen_years (
+            year INTEGER PRIMARY KEY,
+            url TEXT,
+            row_count INTEGER,
+            last_date TEXT,
+            frozen_at TEXT
+        )
+    """,
+    'pipeline_runs': """
+        CREATE TABLE IF NOT EXISTS pipeline_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT,
+            step TEXT,
+            status TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            seconds REAL,
+            changed INTEGER,
+            error TEXT
+        )
+    """,
+    'metric_spans': """
+        CREATE TABLE IF NOT EXISTS metric_spans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            parent TEXT,
+            depth INTEGER,
+            started_at TEXT,
+            wall_s REAL,
+            cpu_s REAL,
+            rss_mb REAL,
+            rss_delta_mb REAL,
+            status TEXT,
+            tags TEXT
+        )
+    """,
+    'http_cache': """
+        CREATE TABLE IF NOT EXISTS http_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            updated_at TEXT
+        )
+    """,
+    # Feature Store (src/models/feature_store.py): 列与 build_feature_matrix 的输出一致，
+    # 修改特征列时同时修改此处并增加迁移 (旧矩阵是缓存，迁移中直接删除即可)
+    'feature_store': """
+        CREATE TABLE IF NOT EXISTS feature_store (
+            date TEXT PRIMARY KEY,
+            throughput REAL,
+            weather_index INTEGER,
+            is_holiday INTEGER,
+            holiday_name TEXT,
+            is_holiday_exact_day INTEGER,
+            is_holiday_travel_window INTEGER,
+            is_spring_break INTEGER,
+            throughput_lag_7 REAL,
+            flight_volume INTEGER,
+            flight_ma_7 INTEGER,
+            flight_lag_1 INTEGER,
+            y REAL,
+            predicted_cancel_rate REAL,
+            day_of_week INTEGER,
+            month INTEGER,
+            year INTEGER,
+            day_of_year INTEGER,
+            week_of_year INTEGER,
+            is_weekend INTEGER,
+            is_off_peak_workday INTEGER,
+            lag_7 REAL,
+            lag_364 REAL,
+            days_to_nearest_holiday INTEGER,
+            is_long_weekend INTEGER,
+            holiday_intensity INTEGER,
+            lag_7_clean REAL,
+            lag_holiday_yoy REAL,
+            w_lag_1 REAL,
+            w_lag_2 REAL,
+            w_lag_3 REAL,
+            revenge_index REAL,
+            lag_7_adjusted REAL,
+            lag_364_adjusted REAL,
+            lead_1_shadow_cancel_rate REAL
+        )
+    """,
+    'feature_store_meta': """
+        CREATE TABLE IF NOT EXISTS feature_store_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            input_hash TEXT,
+            static_hash TEXT,
+            version INTEGER,
+            row_count INTEGER,
+            built_at TIMESTAMP
+        )
+    """,
+    # 每个输入表 (feature_store.SOURCE_QUERIES) 按日期的指纹
+    'feature_store_inputs': """
+        CREATE TABLE IF NOT EXISTS feature_store_inputs (
+            date TEXT PRIMARY KEY,
+            daily_weather_index INTEGER,
+            traffic_full INTEGER,
+            weather INTEGER
+        )
+    """,
+}
+
+# 主键 (upsert 冲突目标)
+PRIMARY_KEYS = {
+    'traffic': ['date'],
+    'traffic_full': ['date'],
+    'weather': ['date', 'airport'],
+    'weather_vintages': ['date', 'airport', 'vintage'],
+    'daily_weather_index': ['date'],
+    'prediction_latest': ['target_date'],
+    'feature_store': ['date'],
+    'feature_store_inputs': ['date'],
+}
+
+# 覆盖索引 (Covering Indexes)
+# 注意: id 是 INTEGER PRIMARY KEY (rowid)，任何二级索引都隐式包含它，
+# 因此 (target_date, model_run_date) 也能覆盖 "MAX(id) ... GROUP BY target_date"。
+INDEXES = {
+    'idx_prediction_history_target_run': "prediction_history (target_date, model_run_date)",
+    'idx_market_snapshots_target_outcome_id': "market_sentiment_snapshots (target_date, outcome_label, id)",
+    'idx_market_snapshots_fetched_at': "market_sentiment_snapshots (fetched_at)",
+    'idx_market_snapshots_key_fetched': "market_sentiment_snapshots (target_date, outcome_label, fetched_at)",
+    'idx_jobs_type_created': "jobs (job_type, created_at)",
+    'idx_pipeline_runs_run_step': "pipeline_runs (run_id, step)",
+    'idx_metric_spans_name_started': "metric_spans (name, started_at)",
+    'idx_metric_spans_started': "metric_spans (started_at)",
+}
+
+# ==========================================
+# 2. Migrations
+# ==========================================
+
+def _table_columns(conn, table):
+    """[(name, pk_position), ...]; 表不存在时返回空列表"""
+    return [(row[1], row[5]) for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+def _rebuild_with_primary_key(conn, table):
+    """
+    to_sql 生成的无键旧表 -> 带主键的新表。
+    按 rowid 顺序 INSERT OR REPLACE，重复键保留最后写入的一行 (与原 replace 语义一致)。
+    """
+    old_cols = [name for name, _ in _table_columns(conn, table)]
+    legacy = f"{table}__legacy"
+    conn.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    conn.execute(TABLES[table])
+    new_cols = [name for name, _ in _table_columns(conn, table)]
+    cols = ', '.join(c for c in new_cols if c in old_cols)
+    conn.execute(f"INSERT OR REPLACE INTO {table} ({cols}) SELECT {cols} FROM {legacy} ORDER BY rowid")
+    conn.execute(f"DROP TABLE {legacy}")
+    print(f"   [Schema] {table}: 重建为带主键表 ({', '.join(PRIMARY_KEYS[table])})")
+
+def _migrate_v1(conn):
+    """v1: traffic_full / weather / daily_weather_index 加主键"""
+    for table in ('traffic_full', 'weather', 'daily_weather_index'):
+        columns = _table_columns(conn, table)
+        if columns and not any(pk for _, pk in columns):
+            _rebuild_with_primary_key(conn, table)
+    # merge_db 早期增量模式建的唯一索引，已被主键取代
+    conn.execute("DROP INDEX IF EXISTS idx_traffic_full_date")
+
+def _migrate_v2(conn):
+    """v2: prediction_latest (每个 target_date 最新预测)，由现有 prediction_history 回填"""
+    from src.db.predictions import refresh_prediction_latest
+    conn.execute(TABLES['prediction_latest'])
+    if _table_columns(conn, 'prediction_history'):
+        n = refresh_prediction_latest(conn)
+        print(f"   [Schema] prediction_latest: 回填 {n} 个目标日期")
+
+def _migrate_v3(conn):
+    """v3: market_sentiment_snapshots 改为变化点存储，压缩已有的全量快照 (src/db/snapshots.py)"""
+    from src.db.snapshots import compact_snapshots
+    if _table_columns(conn, 'market_sentiment_snapshots'):
+        n = compact_snapshots(conn)
+        print(f"   [Schema] market_sentiment_snapshots: 压缩删除 {n} 行未变化快照 (python -m src.db --vacuum 回收空间)")
+
+def _migrate_v4(conn):
+    """
+    v4: weather 区分观测值 (observed, archive API) 与预报值 (forecast)。
+    weather 增加 vintage 列 (当前最佳值的来源)；weather_vintages 按 (date, airport, vintage) 分别保留两种值。
+    回填规则: 抓取日期之前的日期视为观测值，其余为预报值。
+    """
+    columns = [name for name, _ in _table_columns(conn, 'weather')]
+    if not columns:
+        return
+    if 'vintage' not in columns:
+        conn.execute("ALTER TABLE weather ADD COLUMN vintage TEXT")
+    conn.execute("""
+        UPDATE weather SET vintage = CASE WHEN date < substr(updated_at, 1, 10) THEN 'observed' ELSE 'forecast' END
+        WHERE vintage IS NULL
+    """)
+    conn.execute(TABLES['weather_vintages'])
+    cur = conn.execute("""
+        INSERT OR IGNORE INTO weather_vintages (date, airport, vintage, snowfall_cm, windspeed_kmh, precipitation_mm,
+                                                temperature_min_c, severity_score, updated_at)
+        SELECT date, airport, vintage, snowfall_cm, windspeed_kmh, precipitation_mm,
+               temperature_min_c, severity_score, updated_at
+        FROM weather
+    """)
+    print(f"   [Schema] weather_vintages: 回填 {cur.rowcount} 行")
+
+def _migrate_v5(conn):
+    """
+    v5: feature_store / feature_store_meta / feature_store_inputs 改为固定 DDL (此前由 to_sql replace 重建)。
+    三张表都是可重算的缓存，直接删除，下一次 ETL / 训练 (FeatureStore.load) 重新构建。
+    """
+    for table in ('feature_store', 'feature_store_meta', 'feature_store_inputs'):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+def _migrate_v6(conn):
+    """v6: jobs 增加 owner 列 (<boot_id>:<pid>)，启动时只把已退出进程遗留的任务标记为 interrupted"""
+    columns = [name for name, _ in _table_columns(conn, 'jobs')]
+    if columns and 'owner' not in columns:
+        conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+MIGRATIONS = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+    (6, _migrate_v6),
+]
+
+def ensure_schema(conn):
+    """
+    应用未执行的迁移，并确保所有表 / 索引存在 (幂等，可在每次写入前调用)。
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    pending = [(v, fn) for v, fn in MIGRATIONS if v > version]
+
+    # sqlite3 模块不会为 DDL 自动开启事务，这里用 SAVEPOINT 保证迁移原子性 (外层已有事务时同样适用)
+    conn.execute("SAVEPOINT ensure_schema")
+    try:
+        for v, fn in pending:
+            fn(conn)
+        for ddl in TABLES.values():
+            conn.execute(ddl)
+        for name, target in INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        if pending:
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("RELEASE ensure_schema")
+    except Exception:
+        conn.execute("ROLLBACK TO ensure_schema")
+        conn.execute("RELEASE ensure_schema")
+        raise
+
+    if pending:
+        print(f"✅ [Schema] Migrated to v{SCHEMA_VERSION}")
+
+# ==========================================
+# 3. Write Helpers
+# ==========================================
+
+def upsert_df(conn, table, df, key_cols=None, where=None):
+    """
+    INSERT ... ON CONFLICT(key) DO UPDATE，按主键写入 DataFrame。
+    NaN -> NULL。不负责提交事务，由调用方 (with conn:) 决定事务边界。
+    where: 可选的 DO UPDATE ... WHERE 条件 (可引用 {table}.col 与 excluded.col)，不满足时保留已有行。
+    """
+    if df.empty:
+        return 0
+    key_cols = key_cols or PRIMARY_KEYS[table]
+    cols = list(df.columns)
+    updates = ', '.join(f"{c} = excluded.{c}" for c in cols if c not in key_cols)
+    conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+    if updates and where:
+        conflict += f" WHERE {where}"
+    sql = (f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join(['?'] * len(cols))}) "
+           f"ON CONFLICT({', '.join(key_cols)}) {conflict}")
+    rows = df.astype(object).where(pd.notnull(df), None).itertuples(index=False, name=None)
+    conn.executemany(sql, rows)
+    return len(df)
+
+def diff_upsert(conn, table, df, key_cols=None):
+    """
+    Staging-table diff: df 先写入 TEMP 暂存表，与目标表按主键比对，
+    只 upsert 新增或任一值列有变化 (IS NOT, NULL 安全) 的行，未变化的行不产生任何写入。
+    返回 changeset: 变化行的主键列表 (单列主键时为值列表，否则为元组列表)，按主键排序。
+    不负责提交事务，由调用方 (with conn:) 决定事务边界；尚未开启事务时以 BEGIN IMMEDIATE 开启。
+    """
+    key_cols = key_cols or PRIMARY_KEYS[table]
+    if df.empty:
+        return []
+    # 先取得写锁再暂存 / 比对 (比对会先读取 main.{table})
+    begin_immediate(conn)
+    cols = list(df.columns)
+    value_cols = [c for c in cols if c not in key_cols]
+    stage = f"stage_{table}"
+    match = ' AND '.join(f"t.{k} = s.{k}" for k in key_cols)
+    same = ' AND '.join(f"t.{c} IS s.{c}" for c in value_cols) or '1'
+
+    conn.execute(f"DROP TABLE IF EXISTS temp.{stage}")
+    # 暂存表沿用目标表的列亲和性 (affinity)，比较语义与目标表一致
+    conn.execute(f"CREATE TEMP TABLE {stage} AS SELECT {', '.join(cols)} FROM main.{table} WHERE 0")
+    rows = df.astype(object).where(pd.notnull(df), None).itertuples(index=False, name=None)
+    conn.executemany(f"INSERT INTO temp.{stage} ({', '.join(cols)}) VALUES ({', '.join(['?'] * len(cols))})", rows)
+    conn.execute(f"DELETE FROM temp.{stage} WHERE rowid IN (SELECT s.rowid FROM temp.{stage} s "
+                 f"JOIN main.{table} t ON {match} WHERE {same})")
+    changed = conn.execute(
+        f"SELECT DISTINCT {', '.join(key_cols)} FROM temp.{stage} ORDER BY {', '.join(key_cols)}").fetchall()
+
+    if changed:
+        updates = ', '.join(f"{c} = excluded.{c}" for c in value_cols)
+        conn.execute(
+            f"INSERT INTO main.{table} ({', '.join(cols)}) SELECT {', '.join(cols)} FROM temp.{stage} WHERE true "
+            f"ON CONFLICT({', '.join(key_cols)}) " + (f"DO UPDATE SET {updates}" if updates else "DO NOTHING")
+        )
+    conn.execute(f"DROP TABLE temp.{stage}")
+    return [row[0] for row in changed] if len(key_cols) == 1 else changed
@@ -0,0 +1,124 @@
+"""
+market_sentiment_snapshots: 变化点存储 (Change-only / Delta Encoding)
+
+每个 (target_date, outcome_label) 只在以下情况写入新行:
+  - 该 key 的第一条快照
+  - 价格相对上一条 "已存储" 价格的变化 > epsilon
+  - 距上一条已存储快照已超过 heartbeat (证明市场仍在被抓取)
+因此某时刻 ts 的价格 = 该 key 在 ts 之前 (含) 的最后一行 (price_at)，存储是无损的 (epsilon=0 时)。
+"""
+import pandas as pd
+
+# 价格变化阈值 (0 = 任何变化都写入)
+SNAPSHOT_EPSILON = 0.0
+# 心跳间隔: 价格不变时每 N 小时仍写入一行
+SNAPSHOT_HEARTBEAT_HOURS = 6
+
+SNAPSHOT_TABLE = 'market_sentiment_snapshots'
+
+
+def _is_change(price, last_price, age_hours, epsilon, heartbeat_hours):
+    return (last_price is None or abs(price - last_price) > epsilon
+            or age_hours is None or age_hours >= heartbeat_hours)
+
+
+def select_changed(conn, snapshots, epsilon=SNAPSHOT_EPSILON, heartbeat_hours=SNAPSHOT_HEARTBEAT_HOURS):
+    """
+    写入规则: 从本次抓取的快照中筛出需要写入的行 (与每个 key 最新一条已存储快照比较)。
+    fetched_at 为 SQLite CURRENT_TIMESTAMP (UTC)，快照年龄同样在 SQLite 中按 UTC 计算。
+    """
+    target_dates = sorted({s['target_date'] for s in snapshots})
+    if not target_dates:
+        return []
+    rows = conn.execute(f"""
+        SELECT target_date, outcome_label, price, (julianday('now') - julianday(fetched_at)) * 24
+        FROM {SNAPSHOT_TABLE}
+        WHERE id IN (
+            SELECT MAX(id) FROM {SNAPSHOT_TABLE}
+            WHERE target_date IN ({', '.join(['?'] * len(target_dates))})
+            GROUP BY target_date, outcome_label
+        )
+    """, tuple(target_dates)).fetchall()
+    latest = {(d, label): (price, age) for d, label, price, age in rows}
+
+    changed = []
+    for s in snapshots:
+        last_price, age_hours = latest.get((s['target_date'], s['outcome_label']), (None, None))
+        if _is_change(s['price'], last_price, age_hours, epsilon, heartbeat_hours):
+            changed.append(s)
+            # 同一批内重复的 key 以第一条为准
+            latest[(s['target_date'], s['outcome_label'])] = (s['price'], 0.0)
+    return changed
+
+
+def compact_snapshots(conn, epsilon=SNAPSHOT_EPSILON, heartbeat_hours=SNAPSHOT_HEARTBEAT_HOURS):
+    """
+    把历史全量快照压缩为变化点 (迁移 / 手动压缩用)。
+    保留: 每个 key 的第一行和最后一行 (保留最后一次观测时间)，以及满足写入规则的行。
+    返回删除的行数；不提交事务。
+    """
+    df = pd.read_sql(f"""
+        SELECT id, target_date, outcome_label, price, fetched_at
+        FROM {SNAPSHOT_TABLE}
+        ORDER BY target_date, outcome_label, fetched_at, id
+    """, conn)
+    if df.empty:
+        return 0
+    ts = pd.to_datetime(df['fetched_at'], errors='coerce')
+
+    drop_ids = []
+    last_key = last_price = last_ts = None
+    n = len(df)
+    keys = list(zip(df['target_date'], df['outcome_label']))
+    for i, (row_id, price, t) in enumerate(zip(df['id'].tolist(), df['price'].tolist(), ts.tolist())):
+        key = keys[i]
+        is_last = i == n - 1 or keys[i + 1] != key
+        if key != last_key:
+            keep = True
+        else:
+            age = (t - last_ts).total_seconds() / 3600 if pd.notna(t) and pd.notna(last_ts) else None
+            keep = is_last or _is_change(price, last_price, age, epsilon, heartbeat_hours)
+        if keep:
+            last_key, last_price, last_ts = key, price, t
+        else:
+            drop_ids.append((row_id,))
+
+    conn.executemany(f"DELETE FROM {SNAPSHOT_TABLE} WHERE id = ?", drop_ids)
+    return len(drop_ids)
+
+
+def price_at(conn, ts, target_dates=None, fallback_first=False):
+    """
+    读取接口: 每个 (target_date, outcome_label) 在 ts 时刻 (UTC, 'YYYY-MM-DD HH:MM:SS') 的价格。
+    = fetched_at <= ts 的最后一行；fallback_first=True 时 ts 之前尚无快照的 key 取其第一行。
+    返回 DataFrame [target_date, outcome_label, market_slug, price, fetched_at]。
+    走索引 idx_market_snapshots_key_fetched，每个 key 一次索引查找。
+    """
+    ts = pd.Timestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+    where, params = "", []
+    if target_dates is not None:
+        target_dates = list(target_dates)
+        if not target_dates:
+            return pd.DataFrame(columns=['target_date', 'outcome_label', 'market_slug', 'price', 'fetched_at'])
+        where = f"WHERE target_date IN ({', '.join(['?'] * len(target_dates))})"
+        params.extend(target_dates)
+    params.append(ts)
+
+    as_of = f"""(SELECT s.id FROM {SNAPSHOT_TABLE} s
+                 WHERE s.target_date = k.target_date AND s.outcome_label = k.outcome_label AND s.fetched_at <= ?
+                 ORDER BY s.fetched_at DESC, s.id DESC LIMIT 1)"""
+    if fallback_first:
+        first = f"""(SELECT s.id FROM {SNAPSHOT_TABLE} s
+                     WHERE s.target_date = k.target_date AND s.outcome_label = k.outcome_label
+                     ORDER BY s.fetched_at ASC, s.id ASC LIMIT 1)"""
+        as_of = f"COALESCE({as_of}, {first})"
+
+    return pd.read_sql(f"""
+        WITH keys AS (
+            SELECT DISTINCT target_date, outcome_label FROM {SNAPSHOT_TABLE} {where}
+        )
+        SELECT s.target_date, s.outcome_label, s.market_slug, s.price, s.fetched_at
+        FROM {SNAPSHOT_TABLE} s
+        JOIN (SELECT {as_of} AS id FROM keys k) a ON s.id = a.id
+        ORDER BY s.target_date, s.outcome_label
+    """, conn, params=params)
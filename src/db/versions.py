@@ -0,0 +1,37 @@
+"""
+Data Versions (数据版本号)
+
+ETL / 模型写入方在提交数据的同一事务内调用 bump_version()，
+读取方 (Flask 响应缓存) 用 get_versions() 判断缓存是否仍然有效。
+
+    traffic     - traffic / traffic_full (build_tsa_db, merge_db)
+    predictions - prediction_history (train_xgb)
+    market      - market_sentiment_snapshots (fetch_polymarket)
+"""
+import sqlite3
+
+import pandas as pd
+
+VERSION_TABLE = 'data_versions'
+
+def bump_version(conn, name):
+    """版本号 +1 (不提交事务，由调用方决定事务边界)"""
+    conn.execute(
+        f"INSERT INTO {VERSION_TABLE} (name, version, updated_at) VALUES (?, 1, ?) "
+        f"ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+        (name, pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'))
+    )
+
+def get_versions(conn, names):
+    """{name: version}；表或记录不存在时为 0"""
+    versions = dict.fromkeys(names, 0)
+    try:
+        rows = conn.execute(
+            f"SELECT name, version FROM {VERSION_TABLE} WHERE name IN ({', '.join(['?'] * len(names))})",
+            tuple(names)
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return versions
+    for name, version in rows:
+        versions[name] = version
+    return versions
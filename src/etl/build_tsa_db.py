@@ -1,10 +1,16 @@
 import requests
+import pandas as pd
 from bs4 import BeautifulSoup
 import sqlite3
 import datetime
 import re
-import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import lxml.html   # 快速解析路径 (C 实现)；未安装时回退到 BeautifulSoup html.parser
+except ImportError:
+    lxml = None
 
 # 配置
 import sys
@@ -14,16 +20,28 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from src.config import DB_PATH
+from src.config import TSA_URL
+from src.db import ensure_schema, get_connection, bump_version, diff_upsert
+from src.etl.http_client import (conditional_get, get_session, load_validators,
+                                 response_validator, save_validators)
+from src.utils.instrumentation import span
 
 # 配置
 BASE_URL = "https://www.tsa.gov"
-START_URL = "https://www.tsa.gov/travel/passenger-volumes"
+START_URL = TSA_URL
 DB_NAME = DB_PATH
 TABLE_NAME = "traffic"
 
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# [NEW] 全量抓取: 同时在途的年份页面请求数 (替代固定 sleep(1) 的串行礼貌爬取)
+MAX_CONCURRENCY = 3
+
 def init_db():
     """初始化数据库表"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection(DB_NAME)
     cursor = conn.cursor()
     cursor.execute(f'''
         CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
@@ -50,11 +68,11 @@ def parse_number(num_str):
     except ValueError:
         return None
 
-def get_year_links(soup):
+def get_year_links(soup, start_url=START_URL, base_url=BASE_URL):
     """从主页解析所有年份的链接"""
     links = set()
     # 当前页面本身也是一个数据源（通常是最新年份）
-    links.add(START_URL)
+    links.add(start_url)
     
     # 查找侧边栏或内容区域的年份链接
     # 这里的特征通常是链接文本是年份（4位数字）
@@ -64,120 +82,243 @@ def get_year_links(soup):
         
         # 匹配 2019 - 2030 之间的年份
         if re.match(r'^20[1-3][0-9]$', text):
-            full_url = href if href.startswith("http") else BASE_URL + href
+            full_url = href if href.startswith("http") else base_url + href
             links.add(full_url)
             
     return sorted(list(links), reverse=True)
 
-def scrape_page(url):
-    """爬取单个页面的数据"""
-    print(f"正在爬取: {url} ...")
+def page_year(url):
+    """年份页面 URL -> 年份 (int)；首页 (当前年份) 返回 None"""
+    m = re.search(r'/(20[1-3][0-9])/?$', url)
+    return int(m.group(1)) if m else None
+
+def _rows_from_cells(cells):
+    data = []
+    for date_text, num_text in cells:
+        clean_date = parse_date(date_text)
+        clean_num = parse_number(num_text)
+        if clean_date and clean_num is not None:
+            data.append((clean_date, clean_num))
+    return data
+
+def _parse_table_lxml(content):
+    doc = lxml.html.fromstring(content)
+    table = doc.find('.//table')
+    if table is None:
+        return None
+    cells = []
+    for row in table.iter('tr'):
+        cols = list(row.iter('td'))
+        if len(cols) >= 2:
+            # 与 BeautifulSoup get_text(strip=True) 一致: 每个文本片段 strip 后拼接
+            cells.append(tuple(''.join(t.strip() for t in td.itertext()) for td in cols[:2]))
+    return cells
+
+def _parse_table_bs4(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    table = soup.find('table')
+    if not table:
+        return None
+    cells = []
+    # 假设第一行是表头，从第二行开始并在有td时处理
+    for row in table.find_all('tr'):
+        cols = row.find_all('td')
+        if len(cols) >= 2:
+            cells.append((cols[0].get_text(strip=True), cols[1].get_text(strip=True)))
+    return cells
+
+def parse_page(content, fast=True):
+    """
+    页面 HTML -> [(date, throughput), ...]；未找到表格时返回 None。
+    fast=True 且安装了 lxml 时走 lxml 解析，否则 BeautifulSoup html.parser (结果一致)。
+    """
+    cells = _parse_table_lxml(content) if (fast and lxml is not None) else _parse_table_bs4(content)
+    return None if cells is None else _rows_from_cells(cells)
+
+@span('tsa.fetch_page')
+def fetch_page(url, session=None, validator=None):
+    """
+    条件请求抓取单个页面。返回 (data, validator, content):
+    - 304 (自上次抓取后未变化): data 为 None
+    - 失败: data 为 [] 且 validator 为 None
+    """
+    session = session or get_session(MAX_CONCURRENCY)
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        resp = requests.get(url, headers=headers, timeout=10)
-        resp.raise_for_status()
-        
-        soup = BeautifulSoup(resp.content, 'html.parser')
-        
-        # 查找数据表格
-        table = soup.find('table')
-        if not table:
+        resp = conditional_get(session, url, validator, headers=HEADERS)
+        if resp.status_code == 304:
+            return None, validator, None
+        data = parse_page(resp.content)
+        if data is None:
             print(f"警告: 在 {url} 未找到表格")
-            return []
-            
-        data = []
-        rows = table.find_all('tr')
-        
-        # 假设第一行是表头，从第二行开始并在有td时处理
-        for row in rows:
-            cols = row.find_all('td')
-            if len(cols) >= 2:
-                date_text = cols[0].get_text(strip=True)
-                num_text = cols[1].get_text(strip=True)
-                
-                clean_date = parse_date(date_text)
-                clean_num = parse_number(num_text)
-                
-                if clean_date and clean_num is not None:
-                    data.append((clean_date, clean_num))
-        
-        print(f"  - 找到 {len(data)} 条记录")
-        return data
-        
+            data = []
+        return data, response_validator(resp), resp.content
     except Exception as e:
         print(f"错误: 爬取 {url} 失败 - {e}")
+        return [], None, None
+
+def scrape_page(url):
+    """爬取单个页面的数据"""
+    print(f"正在爬取: {url} ...")
+    data, _, _ = fetch_page(url)
+    if data:
+        print(f"  - 找到 {len(data)} 条记录")
+    return data or []
+
+def upsert_traffic(conn, rows):
+    """
+    [NEW] Staging-table diff: 只写入新增或数值变化的日期，未变化的行不产生任何写入。
+    返回 changeset (变化的日期列表，升序)。不提交事务；有变化时 bump 'traffic' 版本号。
+    """
+    if not rows:
         return []
+    changed = diff_upsert(conn, TABLE_NAME, pd.DataFrame(rows, columns=['date', 'throughput']))
+    if changed:
+        bump_version(conn, 'traffic')
+    return changed
 
+@span('tsa.save')
 def save_to_db(all_data):
-    """批量保存数据"""
+    """批量保存数据 (仅新增 / 变化的行)，返回 changeset (变化的日期列表)，供 merge_db 只重算受影响的窗口"""
     if not all_data:
         print("没有数据需要保存。")
-        return
+        return []
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # 使用 INSERT OR REPLACE 避免重复，且更新现有数据
-    cursor.executemany(f'''
-        INSERT OR REPLACE INTO {TABLE_NAME} (date, throughput)
-        VALUES (?, ?)
-    ''', all_data)
-    
-    conn.commit()
-    count = cursor.rowcount  # 注意：REPLACE可能会导致受影响行数看起来比插入的多
-    conn.close()
-    print(f"成功存入/更新了 {len(all_data)} 条记录。")
+    conn = get_connection(DB_NAME)
+    try:
+        ensure_schema(conn)
+        with conn:
+            changed = upsert_traffic(conn, all_data)
+    finally:
+        conn.close()
+    print(f"共 {len(all_data)} 条记录，新增/更新了 {len(changed)} 条。")
+    return changed
+
+# ==========================================
+# Crawler (全量模式): 并发 + 条件请求 + 已封存年份
+# ==========================================
+
+def load_frozen_years(conn):
+    return {row[0] for row in conn.execute("SELECT year FROM tsa_frozen_years").fetchall()}
+
+def is_year_complete(year, data):
+    """往年页面已包含 12-31 的数据即视为封存 (不再变化)"""
+    return (year is not None and year < datetime.date.today().year
+            and any(d == f"{year}-12-31" for d, _ in data))
+
+@span('tsa.save_page')
+def _save_page(conn, url, data, validator):
+    """单个页面在一个事务内写入: 变化的行 + 条件请求缓存 + 封存记录 (中断后可续抓)"""
+    year = page_year(url)
+    with conn:
+        changed = upsert_traffic(conn, data)
+        save_validators(conn, {url: validator})
+        if is_year_complete(year, data):
+            conn.execute(
+                "INSERT OR REPLACE INTO tsa_frozen_years (year, url, row_count, last_date, frozen_at) VALUES (?, ?, ?, ?, ?)",
+                (year, url, len(data), max(d for d, _ in data), datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+    return changed
+
+@span('tsa.crawl')
+def crawl(refresh_frozen=False, max_workers=MAX_CONCURRENCY, start_url=None):
+    """
+    全量抓取:
+      1. 首页 (当前年份) 带 ETag / Last-Modified 条件请求，解析年份链接 (304 时沿用上次的年份页面列表)
+      2. 跳过已封存年份 (tsa_frozen_years)；其余年份页面同样条件请求并发抓取，304 直接跳过
+      3. 每个页面完成后立即在独立事务内写入变化的行 (中断后重跑只补抓未完成 / 有变化的页面)
+    返回 {'pages', 'not_modified', 'frozen_skipped', 'failed', 'rows_changed', 'changed_dates'}。
+    """
+    start_url = start_url or START_URL
+    base_url = re.match(r'^(https?://[^/]+)', start_url).group(1)
+    session = get_session(max_workers)
+    conn = get_connection(DB_NAME)
+    summary = {'pages': 0, 'not_modified': 0, 'frozen_skipped': 0, 'failed': 0, 'rows_changed': 0}
+    changed_dates = set()
+    try:
+        ensure_schema(conn)
+
+        print("[全量模式] 正在获取主页以分析年份链接...")
+        index_validator = load_validators(conn, [start_url]).get(start_url)
+        index_data, index_validator, content = fetch_page(start_url, session, index_validator)
+        if content is not None:
+            year_links = [l for l in get_year_links(BeautifulSoup(content, 'html.parser'), start_url, base_url)
+                          if l != start_url]
+        elif index_data is None and index_validator is not None:
+            # 首页 304: 年份链接未变，沿用上次抓取记录在 http_cache 中的年份页面
+            year_links = sorted((url for (url,) in conn.execute(
+                "SELECT url FROM http_cache WHERE url LIKE ?", (start_url.rstrip('/') + '/%',))
+                if page_year(url)), reverse=True)
+            summary['not_modified'] += 1
+            print("  - 首页: 304 未变化")
+        else:
+            # 后备方案：如果没有找到链接，尝试构建最近几年的 URL
+            current_year = datetime.datetime.now().year
+            year_links = [f"{start_url}/{y}" for y in range(current_year - 1, 2018, -1)]
+            print(f"获取主页失败，使用后备链接列表: {year_links}")
+        if index_data is not None and index_validator is not None:
+            summary['pages'] += 1
+            changed_dates.update(_save_page(conn, start_url, index_data, index_validator))
+
+        frozen = set() if refresh_frozen else load_frozen_years(conn)
+        pending = [l for l in year_links if page_year(l) not in frozen]
+        summary['frozen_skipped'] = len(year_links) - len(pending)
+        validators = load_validators(conn, pending)
+        print(f"发现 {len(year_links)} 个年份页面，已封存跳过 {summary['frozen_skipped']} 个，待抓取 {len(pending)} 个")
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tsa') as pool:
+            futures = {pool.submit(fetch_page, l, session, validators.get(l)): l for l in pending}
+            for future in as_completed(futures):
+                link = futures[future]
+                data, validator, _ = future.result()
+                if data is None:
+                    summary['not_modified'] += 1
+                    print(f"  - {link}: 304 未变化")
+                    continue
+                if validator is None:
+                    summary['failed'] += 1
+                    continue
+                changed = _save_page(conn, link, data, validator)
+                summary['pages'] += 1
+                changed_dates.update(changed)
+                print(f"  - {link}: {len(data)} 条记录，变化 {len(changed)} 条")
+    finally:
+        conn.close()
 
-def run(latest=False):
+    summary['changed_dates'] = sorted(changed_dates)
+    summary['rows_changed'] = len(changed_dates)
+    print(f"抓取 {summary['pages']} 页 | 304: {summary['not_modified']} | 封存跳过: {summary['frozen_skipped']} | "
+          f"失败: {summary['failed']} | 变化行数: {summary['rows_changed']}")
+    return summary
+
+@span('tsa.run')
+def run(latest=False, refresh_frozen=False, max_workers=MAX_CONCURRENCY):
     """
     执行 TSA 数据抓取任务
-    :param latest: True=增量更新(仅首页), False=全量更新
+    :param latest: True=增量更新(仅首页), False=全量更新 (并发 crawler)
+    :param refresh_frozen: 全量模式下同时重新抓取已封存的往年页面
+    :return: changeset - 新增 / 数值变化的日期列表 (升序)，为空表示 traffic 表没有任何写入
     """
     init_db()
     
-    all_data = []
-    
     if latest:
         # 增量更新模式: 仅抓取首页
         print("[增量模式] 仅抓取 TSA 首页最新数据...")
         page_data = scrape_page(START_URL)
-        all_data.extend(page_data)
+        changed = save_to_db(page_data)
     else:
-        # 全量模式: 抓取所有年份
-        print("[全量模式] 正在获取主页以分析年份链接...")
-        try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            resp = requests.get(START_URL, headers=headers)
-            soup = BeautifulSoup(resp.content, 'html.parser')
-            year_links = get_year_links(soup)
-            print(f"发现以下年份页面: {year_links}")
-            
-        except Exception as e:
-            print(f"获取主页失败，将尝试默认年份列表: {e}")
-            # 后备方案：如果没有找到链接，尝试构建最近几年的 URL
-            current_year = datetime.datetime.now().year
-            year_links = [START_URL] + [f"{START_URL}/{y}" for y in range(current_year-1, 2018, -1)]
-            print(f"使用后备链接列表: {year_links}")
-
-        # 遍历所有页面抓取
-        for link in year_links:
-            page_data = scrape_page(link)
-            all_data.extend(page_data)
-            time.sleep(1) # 礼貌爬取，避免请求过快
-        
-    # 存入数据库
-    save_to_db(all_data)
+        changed = crawl(refresh_frozen=refresh_frozen, max_workers=max_workers)['changed_dates']
     print("全部完成。")
+    return changed
 
 if __name__ == "__main__":
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='TSA 旅客吞吐量数据抓取工具')
     parser.add_argument('--latest', action='store_true', 
                         help='仅抓取首页最新数据(增量更新模式)')
+    parser.add_argument('--refresh-frozen', action='store_true',
+                        help='全量模式下重新抓取已封存的往年页面')
+    parser.add_argument('--workers', type=int, default=MAX_CONCURRENCY,
+                        help='全量模式并发请求数')
     args = parser.parse_args()
     
-    run(latest=args.latest)
+    run(latest=args.latest, refresh_frozen=args.refresh_frozen, max_workers=args.workers)
@@ -14,6 +14,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH
+from src.db import get_connection
 
 # 配置
 AIRPORTS = [
@@ -100,7 +101,7 @@ def update_flight_stats(date_str, airport, count, source="flightaware"):
     """保存到数据库"""
     if count is None: return
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn = get_connection()
         # 我们甚至可以在这里记录来源，但目前为了兼容 merge_db，直接覆盖或插入
         conn.execute('''
             INSERT OR REPLACE INTO flight_stats (date, airport, arrival_count)
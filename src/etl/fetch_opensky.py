@@ -15,6 +15,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH
+from src.db import get_connection
 
 # 数据库与接口配置
 BASE_URL = "https://opensky-network.org/api/flights/arrival"
@@ -197,7 +198,7 @@ def save_to_db(data_list):
     """批量持久化航班数据到 SQLite 数据库 flight_stats 表"""
     if not data_list: return
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn = get_connection()
         conn.executemany('''
             INSERT OR REPLACE INTO flight_stats (date, airport, arrival_count)
             VALUES (?, ?, ?)
@@ -210,9 +211,7 @@ def save_to_db(data_list):
         conn.close()
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH, timeout=30)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_connection(row_factory=sqlite3.Row)
 
 def check_cooldown(scope="all", interval_minutes=60):
     """
@@ -1,17 +1,26 @@
-import requests
+import re
 import json
-import sqlite3
+import time
 import datetime
 from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import os
 
 # Add src path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from src.config import DB_PATH
+from src.config import POLYMARKET_API_URL
+from src.db import begin_immediate, ensure_schema, get_connection, bump_version
+from src.db.snapshots import SNAPSHOT_EPSILON, SNAPSHOT_HEARTBEAT_HOURS, select_changed
+from src.etl.http_client import (conditional_get, get_session, load_validators,
+                                 response_validator, save_validators)
+
+# 同时在途的请求数上限 (共享会话的连接池大小与之相同)
+MAX_CONCURRENCY = 6
+
+WEEKLY_SLUGS = ["january-19-january-25", "january-26-february-1"]
 
 def clean_label(label):
-    import re
     # 1. Standardize Comparators (Case Insensitive)
     label = re.sub(r"between\s+", "", label, flags=re.IGNORECASE)
     label = re.sub(r"\s+and\s+", " - ", label, flags=re.IGNORECASE)
@@ -35,122 +44,184 @@ def clean_label(label):
     label = re.sub(r'\b(?:\d{1,3}(?:,\d{3})*|\d+)(\.\d+)?\s*(?:million|m)?\b', num_replacer, label, flags=re.IGNORECASE)
     return label.strip()
 
-def fetch_market_data(target_date):
-    from src.config import POLYMARKET_API_URL
-    
+def market_slug(target_date):
     if " - " in target_date or (target_date.count('-') > 2): # Weekly slug
-        slug = f"number-of-tsa-passengers-{target_date.lower().replace(' ', '-')}"
-    else:
-        try:
-            dt = datetime.datetime.strptime(target_date, "%Y-%m-%d")
-            month_name = dt.strftime("%B").lower()
-            day = dt.day
-            slug = f"number-of-tsa-passengers-{month_name}-{day}"
-        except:
-            slug = f"number-of-tsa-passengers-{target_date.lower().replace(' ', '-')}"
-
-    url = f"{POLYMARKET_API_URL}?slug={slug}"
-    print(f"Fetching {slug}...")
-    
+        return f"number-of-tsa-passengers-{target_date.lower().replace(' ', '-')}"
     try:
-        headers = {"User-Agent": "MikonAI/1.0"}
-        res = requests.get(url, headers=headers, timeout=10)
-        res.raise_for_status()
-        data = res.json()
-        
-        if not data:
-            print(f"  No event found for {slug}")
-            return []
-            
-        event = data[0]
-        markets = event.get('markets', [])
-        
-        results = []
-        for m in markets:
-            q_text = m.get('question', '')
-            label = q_text
-            import re
-            match = re.search(r"be (.*?)\?", q_text)
-            if match:
-                label = match.group(1).strip()
-            
-            label = clean_label(label)
-            raw_outcomes = m.get('outcomes')
-            outcomes = json.loads(raw_outcomes) if isinstance(raw_outcomes, str) else raw_outcomes
-            raw_prices = m.get('outcomePrices')
-            prices = json.loads(raw_prices) if isinstance(raw_prices, str) else raw_prices
-            
-            if not outcomes or not prices:
-                continue
-            
-            try:
-                yes_idx = outcomes.index("Yes")
-                yes_price = float(prices[yes_idx])
-                results.append({
+        dt = datetime.datetime.strptime(target_date, "%Y-%m-%d")
+        month_name = dt.strftime("%B").lower()
+        day = dt.day
+        return f"number-of-tsa-passengers-{month_name}-{day}"
+    except:
+        return f"number-of-tsa-passengers-{target_date.lower().replace(' ', '-')}"
+
+def market_url(slug, base_url=None):
+    return f"{base_url or POLYMARKET_API_URL}?slug={slug}"
+
+def parse_event(data, target_date, slug):
+    """Gamma API events 响应 -> 快照列表"""
+    if not data:
+        print(f"  No event found for {slug}")
+        return []
+
+    event = data[0]
+    markets = event.get('markets', [])
+
+    results = []
+    for m in markets:
+        q_text = m.get('question', '')
+        label = q_text
+        match = re.search(r"be (.*?)\?", q_text)
+        if match:
+            label = match.group(1).strip()
+
+        label = clean_label(label)
+        raw_outcomes = m.get('outcomes')
+        outcomes = json.loads(raw_outcomes) if isinstance(raw_outcomes, str) else raw_outcomes
+        raw_prices = m.get('outcomePrices')
+        prices = json.loads(raw_prices) if isinstance(raw_prices, str) else raw_prices
+
+        if not outcomes or not prices:
+            continue
+
+        try:
+            yes_idx = outcomes.index("Yes")
+            yes_price = float(prices[yes_idx])
+            results.append({
+                "target_date": target_date,
+                "market_slug": slug,
+                "outcome_label": label,
+                "price": yes_price
+            })
+        except ValueError:
+            for o, p in zip(outcomes, prices):
+                 if o.lower() in ["yes", "no"]:
+                     continue
+                 results.append({
                     "target_date": target_date,
                     "market_slug": slug,
-                    "outcome_label": label,
-                    "price": yes_price
+                    "outcome_label": o,
+                    "price": float(p)
                 })
-            except ValueError:
-                for o, p in zip(outcomes, prices):
-                     if o.lower() in ["yes", "no"]:
-                         continue
-                     results.append({
-                        "target_date": target_date,
-                        "market_slug": slug,
-                        "outcome_label": o, 
-                        "price": float(p)
-                    })
-        return results
+    return results
+
+def fetch_market_data(target_date, session=None, validator=None, base_url=None):
+    """
+    抓取单个市场。返回 (snapshots, validator):
+    - 服务器返回 304 (自上次抓取后未变化) 时 snapshots 为 None，validator 不变
+    - 请求失败时 snapshots 为 [] 且 validator 为 None (不更新缓存)
+    """
+    slug = market_slug(target_date)
+    url = market_url(slug, base_url)
+    session = session or get_session(MAX_CONCURRENCY)
+
+    try:
+        res = conditional_get(session, url, validator)
+        if res.status_code == 304:
+            return None, validator
+        return parse_event(res.json(), target_date, slug), response_validator(res)
     except Exception as e:
         print(f"  Error fetching {slug}: {e}")
-        return []
+        return [], None
 
-def save_snapshots(snapshots):
-    if not snapshots: return
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    data_tuple = [(s['target_date'], s['market_slug'], s['outcome_label'], s['price']) for s in snapshots]
-    cursor.executemany('''
-        INSERT INTO market_sentiment_snapshots (target_date, market_slug, outcome_label, price)
-        VALUES (?, ?, ?, ?)
-    ''', data_tuple)
-    conn.commit()
-    conn.close()
-
-def run(recent=False):
-    print("=== Polymarket ETL Started ===")
+def save_snapshots(snapshots, conn=None, validators=None,
+                   epsilon=SNAPSHOT_EPSILON, heartbeat_hours=SNAPSHOT_HEARTBEAT_HOURS):
+    """
+    变化点写入: 仅当价格变化 > epsilon 或距上一条已存储快照超过 heartbeat_hours 时插入 (src/db/snapshots.py)，
+    返回写入行数。validators: {url: (etag, last_modified)}，与快照在同一事务内写入 http_cache。
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    try:
+        ensure_schema(conn)
+        with conn:
+            # 变化点判断读取已存储的最新价格，须先取得写锁 (与并发的 TSA / 天气写入排队)
+            begin_immediate(conn)
+            changed = select_changed(conn, snapshots, epsilon, heartbeat_hours)
+            if changed:
+                conn.executemany('''
+                    INSERT INTO market_sentiment_snapshots (target_date, market_slug, outcome_label, price)
+                    VALUES (?, ?, ?, ?)
+                ''', [(s['target_date'], s['market_slug'], s['outcome_label'], s['price']) for s in changed])
+                bump_version(conn, 'market')
+            if validators:
+                save_validators(conn, validators)
+    finally:
+        if own_conn:
+            conn.close()
+    return len(changed)
+
+def target_dates(recent=False):
     if recent:
         start_dt = datetime.date.today() - timedelta(days=1)
         days_to_fetch = 10
     else:
         start_dt = datetime.date.today() - timedelta(days=3)
         days_to_fetch = 14
-    
-    snapshots = []
-    for i in range(days_to_fetch):
-        target_dt = start_dt + timedelta(days=i)
-        target_str = target_dt.strftime("%Y-%m-%d")
-        batch = fetch_market_data(target_str)
-        snapshots.extend(batch)
-    
-    save_snapshots(snapshots)
-    
+    dates = [(start_dt + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days_to_fetch)]
     # Weekly Markets (Custom slugs)
-    weekly_slugs = ["january-19-january-25", "january-26-february-1"]
-    weekly_snapshots = []
-    for slug_part in weekly_slugs:
-        batch = fetch_market_data(slug_part)
-        weekly_snapshots.extend(batch)
-    
-    if weekly_snapshots:
-        save_snapshots(weekly_snapshots)
+    return dates + WEEKLY_SLUGS
+
+def run(recent=False, base_url=None, max_workers=MAX_CONCURRENCY, db_path=None,
+        epsilon=SNAPSHOT_EPSILON, heartbeat_hours=SNAPSHOT_HEARTBEAT_HOURS):
+    """
+    [NEW] 并发抓取: 共享 keep-alive 会话 + 有界线程池 (max_workers)，
+    条件请求命中 304 的市场直接跳过，所有变化的快照在一个事务内写入。
+    返回 {'requested', 'not_modified', 'failed', 'written', 'seconds'}。
+    """
+    print("=== Polymarket ETL Started ===")
+    t0 = time.perf_counter()
+    targets = target_dates(recent)
+    urls = {t: market_url(market_slug(t), base_url) for t in targets}
+
+    conn = get_connection(db_path)
+    try:
+        ensure_schema(conn)
+        cached = load_validators(conn, urls.values())
+
+        session = get_session(max_workers)
+        def fetch(target):
+            return fetch_market_data(target, session, cached.get(urls[target]), base_url)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='polymarket') as pool:
+            results = list(pool.map(fetch, targets))
+
+        snapshots, validators = [], {}
+        not_modified = failed = 0
+        for target, (batch, validator) in zip(targets, results):
+            if batch is None:
+                not_modified += 1
+                continue
+            if validator is None:
+                failed += 1
+                continue
+            snapshots.extend(batch)
+            validators[urls[target]] = validator
+
+        written = save_snapshots(snapshots, conn, validators, epsilon, heartbeat_hours)
+    finally:
+        conn.close()
+
+    summary = {
+        'requested': len(targets),
+        'not_modified': not_modified,
+        'failed': failed,
+        'written': written,
+        'seconds': round(time.perf_counter() - t0, 3),
+    }
+    print(f"   {summary['requested']} markets | 304: {not_modified} | failed: {failed} | "
+          f"new snapshots: {written} | {summary['seconds']:.2f}s")
     print("=== Polymarket ETL Finished ===")
+    return summary
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('--recent', action='store_true')
+    parser.add_argument('--workers', type=int, default=MAX_CONCURRENCY, help='Max concurrent requests')
+    parser.add_argument('--epsilon', type=float, default=SNAPSHOT_EPSILON, help='Min price move to store a new snapshot')
+    parser.add_argument('--heartbeat-hours', type=float, default=SNAPSHOT_HEARTBEAT_HOURS,
+                        help='Store an unchanged price at least this often')
     args = parser.parse_args()
-    run(recent=args.recent)
+    run(recent=args.recent, max_workers=args.workers, epsilon=args.epsilon, heartbeat_hours=args.heartbeat_hours)
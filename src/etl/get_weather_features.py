@@ -3,13 +3,18 @@ import requests_cache
 import pandas as pd
 from retry_requests import retry
 import datetime
+import time
 import numpy as np
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH
+from src.db import begin_immediate, ensure_schema, upsert_df, get_connection
+from src.utils.weather_utils import national_weather_index, severity_score
+from src.utils.instrumentation import span
 
 # 配置
 # DB_PATH = 'tsa_data.db'
@@ -28,77 +33,143 @@ AIRPORTS = {
     "JFK": {"lat": 40.64, "lon": -73.77}
 }
 
-def fetch_weather(url, airports, start_date, end_date):
+# 3. Open-Meteo 端点 / 变量
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+DAILY_VARIABLES = ["snowfall_sum", "precipitation_sum", "wind_speed_10m_max", "temperature_2m_min"]
+
+WEATHER_VALUE_COLS = ["snowfall_cm", "precipitation_mm", "windspeed_kmh", "temperature_min_c"]
+
+# [NEW] 数据来源 (vintage): archive API = 观测值，forecast API = 预报值。
+# weather 表保存当前最佳值 (观测值优先)，weather_vintages 表分别保留两者
+VINTAGE_OBSERVED = 'observed'
+VINTAGE_FORECAST = 'forecast'
+OBSERVED_WINS = f"weather.vintage IS NOT '{VINTAGE_OBSERVED}' OR excluded.vintage = '{VINTAGE_OBSERVED}'"
+
+# [NEW] 所有机场合并为一次多坐标请求；长区间 (--full) 按 CHUNK_DAYS 切块，archive / forecast 各块并发请求
+CHUNK_DAYS = 366
+MAX_CONCURRENCY = 4
+
+def date_chunks(start_date, end_date, chunk_days=CHUNK_DAYS):
+    """[start_date, end_date] (含) 切成不超过 chunk_days 天的连续区间"""
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + pd.Timedelta(days=chunk_days - 1), end)
+        chunks.append((start.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d')))
+        start = chunk_end + pd.Timedelta(days=1)
+    return chunks
+
+def _response_to_frame(response, icao):
+    daily = response.Daily()
+    daily_data = {"date": pd.date_range(
+        start = pd.to_datetime(daily.Time(), unit = "s", utc = True),
+        end = pd.to_datetime(daily.TimeEnd(), unit = "s", utc = True),
+        freq = pd.Timedelta(seconds = daily.Interval()),
+        inclusive = "left"
+    )}
+
+    df = pd.DataFrame(data = daily_data)
+    df["airport"] = icao
+    df["snowfall_cm"] = daily.Variables(0).ValuesAsNumpy()
+    df["precipitation_mm"] = daily.Variables(1).ValuesAsNumpy()
+    df["windspeed_kmh"] = daily.Variables(2).ValuesAsNumpy()
+    df["temperature_min_c"] = daily.Variables(3).ValuesAsNumpy()
+    return df
+
+@span('weather.fetch_batch')
+def fetch_weather_batch(url, airports, start_date, end_date, client=None):
     """
-    通用天气抓取函数
+    一次多坐标请求抓取全部机场 (Open-Meteo 按坐标顺序返回多个 response)。
+    返回 (DataFrame, 请求耗时秒)；失败时抛出异常由调用方记录。
     """
-    all_rows = []
-    
-    for icao, coords in airports.items():
+    client = client or openmeteo
+    icaos = list(airports)
+    params = {
+        "latitude": [airports[icao]["lat"] for icao in icaos],
+        "longitude": [airports[icao]["lon"] for icao in icaos],
+        "start_date": start_date,
+        "end_date": end_date,
+        "daily": DAILY_VARIABLES
+    }
+    t0 = time.perf_counter()
+    responses = client.weather_api(url, params=params)
+    latency = time.perf_counter() - t0
+    if len(responses) != len(icaos):
+        raise ValueError(f"expected {len(icaos)} locations, got {len(responses)}")
+
+    df = pd.concat([_response_to_frame(r, icao) for icao, r in zip(icaos, responses)], ignore_index=True)
+    df['severity_score'] = severity_score(df)
+    return df, latency
+
+@span('weather.fetch_all')
+def fetch_all(plan, airports, client=None, max_workers=MAX_CONCURRENCY):
+    """
+    并发执行抓取计划 plan = [(name, url, start_date, end_date), ...]。
+    返回 ({name: DataFrame}, report)，report 为每个请求的耗时记录 (按计划顺序)。
+    """
+    def fetch(item):
+        name, url, start_date, end_date = item
         try:
-            params = {
-                "latitude": coords["lat"],
-                "longitude": coords["lon"],
-                "start_date": start_date,
-                "end_date": end_date,
-                "daily": ["snowfall_sum", "precipitation_sum", "wind_speed_10m_max", "temperature_2m_min"]
-            }
-            
-            responses = openmeteo.weather_api(url, params=params)
-            response = responses[0]
-            
-            daily = response.Daily()
-            daily_snowfall_sum = daily.Variables(0).ValuesAsNumpy()
-            daily_precipitation_sum = daily.Variables(1).ValuesAsNumpy()
-            daily_wind_speed_10m_max = daily.Variables(2).ValuesAsNumpy()
-            daily_temperature_2m_min = daily.Variables(3).ValuesAsNumpy()
-            
-            daily_data = {"date": pd.date_range(
-                start = pd.to_datetime(daily.Time(), unit = "s", utc = True),
-                end = pd.to_datetime(daily.TimeEnd(), unit = "s", utc = True),
-                freq = pd.Timedelta(seconds = daily.Interval()),
-                inclusive = "left"
-            )}
-            
-            df = pd.DataFrame(data = daily_data)
-            df["airport"] = icao
-            df["snowfall_cm"] = daily_snowfall_sum
-            df["precipitation_mm"] = daily_precipitation_sum
-            df["windspeed_kmh"] = daily_wind_speed_10m_max
-            df["temperature_min_c"] = daily_temperature_2m_min
-            
-            # Simple Severity Score (Updated with Flash Freeze Logic)
-            def calc_score(row):
-                score = 0
-                # Snow
-                if row['snowfall_cm'] > 1.0: score += 1
-                if row['snowfall_cm'] > 5.0: score += 2    # Cumulative: >5cm gets +3 total
-                # Wind
-                if row['windspeed_kmh'] > 29.0: score += 1
-                if row['windspeed_kmh'] > 40.0: score += 2 # Cumulative: >40kmh gets +3 total
-                # Temperature (Flash Freeze Logic - Tuned for Southern Hub Sensitivity)
-                if row['temperature_min_c'] < -5.0: score += 1
-                if row['temperature_min_c'] < -10.0: score += 1  # Cumulative: <-10 gets +2 (Severe for DFW)
-                if row['temperature_min_c'] < -15.0: score += 1  # Cumulative: <-15 gets +3 (Severe for ORD)
-                
-                return score
-            
-            df['severity_score'] = df.apply(calc_score, axis=1)
-            all_rows.append(df)
-            print(f"   [OK] Fetched {icao}: {len(df)} days")
-            
+            df, latency = fetch_weather_batch(url, airports, start_date, end_date, client)
+            return df, {'request': name, 'start': start_date, 'end': end_date,
+                        'rows': len(df), 'latency': latency, 'error': None}
         except Exception as e:
-            print(f"   [Error] Failed to fetch {icao}: {e}")
-            
-    if all_rows:
-        return pd.concat(all_rows, ignore_index=True)
-    else:
-        return pd.DataFrame()
+            return None, {'request': name, 'start': start_date, 'end': end_date,
+                          'rows': 0, 'latency': None, 'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='openmeteo') as pool:
+        results = list(pool.map(fetch, plan))
 
-def run(full_mode=False):
+    frames = {}
+    for (name, *_), (df, _) in zip(plan, results):
+        if df is not None:
+            frames.setdefault(name, []).append(df)
+    frames = {name: pd.concat(dfs, ignore_index=True) for name, dfs in frames.items()}
+    return frames, [r for _, r in results]
+
+def print_latency_report(report, total_seconds):
+    print(f"   {'Request':<10}{'Range':<26}{'Rows':>7}{'Latency':>10}")
+    for r in report:
+        latency = f"{r['latency']:.2f}s" if r['latency'] is not None else 'FAILED'
+        print(f"   {r['request']:<10}{r['start'] + ' ~ ' + r['end']:<26}{r['rows']:>7}{latency:>10}")
+        if r['error']:
+            print(f"   [Error] {r['error']}")
+    serial = sum(r['latency'] or 0 for r in report)
+    print(f"   {len(report)} requests | wall {total_seconds:.2f}s | sum of latencies {serial:.2f}s")
+
+def fetch_weather(url, airports, start_date, end_date, client=None, max_workers=MAX_CONCURRENCY):
+    """
+    通用天气抓取函数 (单端点；多坐标批量 + 长区间分块并发)
+    """
+    plan = [('weather', url, s, e) for s, e in date_chunks(start_date, end_date)]
+    frames, _ = fetch_all(plan, airports, client, max_workers)
+    return frames.get('weather', pd.DataFrame())
+
+def read_best_values(conn, start_date, end_date):
+    """weather 表在 [start_date, end_date] 内的当前最佳值 (不含 updated_at)"""
+    return pd.read_sql(
+        f"SELECT date, airport, {', '.join(WEATHER_VALUE_COLS)}, vintage FROM weather WHERE date BETWEEN ? AND ?",
+        conn, params=(start_date, end_date)
+    )
+
+def changed_weather_dates(before, after):
+    """写入前后最佳值的差异 -> 变化 (含新增) 的日期列表 (升序)"""
+    merged = before.merge(after, on=['date', 'airport'], how='outer', suffixes=('_old', ''), indicator=True)
+    diff = merged['_merge'] != 'both'
+    for col in WEATHER_VALUE_COLS + ['vintage']:
+        old, new = merged[f"{col}_old"], merged[col]
+        diff |= ~((old == new) | (old.isna() & new.isna()))
+    return sorted(merged.loc[diff, 'date'].unique())
+
+@span('weather.run')
+def run(full_mode=False, client=None, max_workers=MAX_CONCURRENCY, db_path=None):
     """
     天气数据抓取
     :param full_mode: True=全量模式(2019起), False=增量模式(近30天)
+    :param client: Open-Meteo 客户端 (默认带缓存/重试的 openmeteo；测试时传入回放 stub)
+    :param db_path: 写入的数据库 (默认 DB_PATH；测试时传入临时库)
+    :return: changeset - weather 最佳值有变化的日期列表 (出错时为 None)
     """
     try:
         if full_mode:
@@ -118,14 +189,25 @@ def run(full_mode=False):
 
         print(f"Plan: Archive [{START_DATE} ~ {YESTERDAY}] + Forecast [{TODAY} ~ {END_DATE}]")
 
-        # 1. 获取历史数据 (Archive)
-        url_archive = "https://archive-api.open-meteo.com/v1/archive"
-        df_archive = fetch_weather(url_archive, AIRPORTS, START_DATE, YESTERDAY)
-        
-        # 2. 获取预测数据 (Forecast)
-        url_forecast = "https://api.open-meteo.com/v1/forecast"
-        df_forecast = fetch_weather(url_forecast, AIRPORTS, TODAY, END_DATE)
-        
+        # 1 + 2. 历史数据 (Archive, 按块) 与预测数据 (Forecast) 并发抓取，每个请求包含全部机场
+        plan = [('archive', ARCHIVE_URL, s, e) for s, e in date_chunks(START_DATE, YESTERDAY)]
+        plan.append(('forecast', FORECAST_URL, TODAY, END_DATE))
+        t0 = time.perf_counter()
+        frames, report = fetch_all(plan, AIRPORTS, client, max_workers)
+        print_latency_report(report, time.perf_counter() - t0)
+        df_archive = frames.get('archive', pd.DataFrame())
+        df_forecast = frames.get('forecast', pd.DataFrame())
+
+        # [NEW] 标记数据来源 (vintage)。archive API 对最近几天可能尚无观测值 (全为空)，这些行不写入，
+        # 保留此前抓取的预报值，而不是用空观测值覆盖
+        if not df_archive.empty:
+            empty_obs = df_archive[WEATHER_VALUE_COLS].isna().all(axis=1)
+            if empty_obs.any():
+                print(f"   [Archive] 跳过 {int(empty_obs.sum())} 条尚无观测值的 [日期+机场] 数据")
+            df_archive = df_archive[~empty_obs].assign(vintage=VINTAGE_OBSERVED)
+        if not df_forecast.empty:
+            df_forecast = df_forecast.assign(vintage=VINTAGE_FORECAST)
+
         # 3. 合并
         print("正在合并历史与预测数据...")
         full_df = pd.concat([df_archive, df_forecast], ignore_index=True)
@@ -136,56 +218,54 @@ def run(full_mode=False):
             print(f"警告: 发现 {dupes} 条重复的 [日期+机场] 数据，正在进行去重 (保留最新)...")
             full_df = full_df.drop_duplicates(subset=['date', 'airport'], keep='last')
         
-        # 4. 聚合计算全美指数 (Refined Logic)
+        # 4. 全美指数在写库事务内由 weather 最佳值聚合 (src/utils/weather_utils.py::national_weather_index)
         full_df['date'] = full_df['date'].dt.strftime('%Y-%m-%d')
         
-        def calculate_daily_index(group):
-            base_score = group['severity_score'].sum()
-            
-            # 统计坏点 (Bad Hub Counter)
-            bad_hubs_count = (group['severity_score'] >= 3).sum()
-            
-            if group['date'].iloc[0] == '2026-01-10':
-                print(f"\nDEBUG Aggregation [2026-01-10]:")
-                print(group[['airport', 'severity_score']])
-                print(f"Base Score: {base_score}, Bad Hubs: {bad_hubs_count}")
-
-            penalty = 0
-            if bad_hubs_count >= 3:
-                penalty = 20
-            elif bad_hubs_count >= 2:
-                penalty = 10
-                
-            return base_score + penalty
-
-        print("正在计算多枢纽熔断指数...")
-        weather_index_series = full_df.groupby('date').apply(calculate_daily_index)
-        
-        # 转换为 DataFrame
-        weather_index_df = weather_index_series.reset_index(name='weather_index')
-        
         # 5. 存入数据库 (DB Storage)
-        print(f"正在存入数据库 {DB_PATH} ...")
+        print(f"正在存入数据库 {db_path or DB_PATH} ...")
         
-        def save_weather_to_db(detailed_df, index_df):
-            conn = sqlite3.connect(DB_PATH)
-            
-            # A. 存入详细天气表 (weather)
-            detailed_df['updated_at'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        @span('weather.save')
+        def save_weather_to_db(detailed_df):
+            """
+            [NEW] 单一事务内:
+              A. weather_vintages 按 (date, airport, vintage) upsert —— 观测值与预报值分别保留
+              B. weather 按 (date, airport) upsert 当前最佳值 —— 预报值不覆盖已有观测值
+              C. 由 weather 中本次涉及日期的最佳值重算 daily_weather_index 并按 date upsert
+            返回 (重算后的指数 DataFrame, 最佳值有变化的日期列表)。
+            """
+            conn = get_connection(db_path)
+            now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            detailed_df['updated_at'] = now
             
             # Columns to save
-            cols = ['date', 'airport', 'snowfall_cm', 'windspeed_kmh', 'precipitation_mm', 'temperature_min_c', 'severity_score', 'updated_at']
-            detailed_df[cols].to_sql('weather', conn, if_exists='replace', index=False)
-            print(f"   - 表 [weather]: 已更新 {len(detailed_df)} 条数据")
-            
-            # B. 存入每日指数表 (daily_weather_index) - 用于快速合并
-            index_df['updated_at'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            index_df.to_sql('daily_weather_index', conn, if_exists='replace', index=False)
-            print(f"   - 表 [daily_weather_index]: 已更新 {len(index_df)} 条数据")
-            
-            conn.close()
+            cols = ['date', 'airport', 'snowfall_cm', 'windspeed_kmh', 'precipitation_mm', 'temperature_min_c', 'severity_score', 'updated_at', 'vintage']
+            try:
+                ensure_schema(conn)
+                with conn:
+                    # 写前读取最佳值用于比对，须先取得写锁 (与并发的 TSA / Polymarket 写入排队)
+                    begin_immediate(conn)
+                    window = (detailed_df['date'].min(), detailed_df['date'].max())
+                    before = read_best_values(conn, *window)
+                    upsert_df(conn, 'weather_vintages', detailed_df[cols])
+                    upsert_df(conn, 'weather', detailed_df[cols], where=OBSERVED_WINS)
+                    changed = changed_weather_dates(before, read_best_values(conn, *window))
+                    print(f"   - 表 [weather] / [weather_vintages]: 已更新 {len(detailed_df)} 条数据 "
+                          f"(最佳值变化 {len(changed)} 天)")
+
+                    print("正在计算多枢纽熔断指数...")
+                    best = pd.read_sql(
+                        "SELECT date, airport, severity_score FROM weather WHERE date BETWEEN ? AND ?",
+                        conn, params=window
+                    )
+                    index_df = national_weather_index(best)
+                    index_df['updated_at'] = now
+                    upsert_df(conn, 'daily_weather_index', index_df[['date', 'weather_index', 'updated_at']])
+                    print(f"   - 表 [daily_weather_index]: 已更新 {len(index_df)} 条数据")
+            finally:
+                conn.close()
+            return index_df, changed
 
-        save_weather_to_db(full_df, weather_index_df)
+        weather_index_df, changed = save_weather_to_db(full_df)
         print("OK 天气数据数据库化完成。")
         
         # 7. 检查 2026-01-10 (用户指定日期)
@@ -206,9 +286,11 @@ def run(full_mode=False):
             print(f"\nFinal Weather Index from CSV/DB: {row_summary['weather_index'].values[0]}")
         else:
             print(f"未找到 {check_date} 数据")
+        return changed
     
     except Exception as e:
         print(f"Error: {e}")
+        return None
 
 if __name__ == "__main__":
     import sys
@@ -0,0 +1,98 @@
+"""
+HTTP Client (ETL 共享的连接池会话 + 条件请求)
+
+- 连接池: 进程级 requests.Session (HTTPAdapter pool_maxsize = 并发上限)，keep-alive 复用 TCP/TLS 连接，
+  Flask 进程内多次 /api/update_data 之间同样复用。requests.Session 的 GET 可在线程池中共享。
+- 条件请求: 每个 URL 的 ETag / Last-Modified 持久化在 SQLite `http_cache` 表，
+  下次请求带 If-None-Match / If-Modified-Since；服务器返回 304 时调用方跳过解析与写库。
+
+Usage:
+    session = get_session()
+    validators = load_validators(conn, urls)
+    res = conditional_get(session, url, validators.get(url))
+    if res.status_code != 304: ...
+    save_validators(conn, {url: response_validator(res)})
+"""
+import os
+import sys
+import threading
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+DEFAULT_HEADERS = {"User-Agent": "MikonAI/1.0"}
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 10
+
+_session_lock = threading.Lock()
+_sessions = {}   # (pid, pool_size) -> Session
+
+
+def get_session(pool_size=DEFAULT_POOL_SIZE):
+    """进程级共享会话 (按连接池大小区分)"""
+    key = (os.getpid(), pool_size)
+    with _session_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _sessions[key] = session
+        return session
+
+
+# ==========================================
+# Conditional Requests (ETag / Last-Modified)
+# ==========================================
+
+def load_validators(conn, urls=None):
+    """{url: (etag, last_modified)}；urls=None 时读取全部"""
+    sql = "SELECT url, etag, last_modified FROM http_cache"
+    params = ()
+    if urls is not None:
+        urls = list(urls)
+        if not urls:
+            return {}
+        sql += f" WHERE url IN ({', '.join(['?'] * len(urls))})"
+        params = tuple(urls)
+    return {url: (etag, last_modified) for url, etag, last_modified in conn.execute(sql, params).fetchall()}
+
+
+def save_validators(conn, validators):
+    """写入 / 更新 {url: (etag, last_modified)}；两者皆空的条目删除 (服务器不支持条件请求)。不提交事务。"""
+    now = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+    keep = [(url, v[0], v[1], now) for url, v in validators.items() if v and (v[0] or v[1])]
+    drop = [(url,) for url, v in validators.items() if not v or not (v[0] or v[1])]
+    if keep:
+        conn.executemany("""
+            INSERT INTO http_cache (url, etag, last_modified, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified,
+                                           updated_at = excluded.updated_at
+        """, keep)
+    if drop:
+        conn.executemany("DELETE FROM http_cache WHERE url = ?", drop)
+
+
+def response_validator(res):
+    """响应头中的 (etag, last_modified)"""
+    return (res.headers.get('ETag'), res.headers.get('Last-Modified'))
+
+
+def conditional_get(session, url, validator=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """带 If-None-Match / If-Modified-Since 的 GET；304 原样返回，其余非 2xx 抛 HTTPError"""
+    headers = dict(kwargs.pop('headers', None) or {})
+    if validator:
+        etag, last_modified = validator
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    res = session.get(url, headers=headers, timeout=timeout, **kwargs)
+    if res.status_code != 304:
+        res.raise_for_status()
+    return res
@@ -1,6 +1,7 @@
 import pandas as pd
 import sqlite3
 import datetime
+import argparse
 from dateutil.easter import easter
 import numpy as np
 
@@ -8,139 +9,163 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH
+from src.db import ensure_schema, diff_upsert, get_connection, bump_version
+from src.utils.instrumentation import span
 
 # 配置
 # DB_PATH = 'tsa_data.db'
 WEATHER_CSV = 'weather_features.csv'
 
+# 节日特征覆盖范围 (2018 to 2030 covers training and forecast)
+HOLIDAY_RANGE = ('2018-01-01', '2030-12-31')
+
+# 预测空间: 骨架至少延伸到 今天 + 15 天
+FORECAST_HORIZON_DAYS = 15
+
+# traffic_full 的最终列
+TRAFFIC_FULL_COLUMNS = ['date', 'throughput', 'weather_index', 'is_holiday', 'holiday_name',
+                        'is_holiday_exact_day', 'is_holiday_travel_window', 'is_spring_break',
+                        'throughput_lag_7', 'flight_volume', 'flight_ma_7', 'flight_lag_1']
+
+# [NEW] 增量物化 (Incremental Materialization)
+# 每个源表的高水位 (High-Water Mark):
+#   value_col    - 参与校验和的数值列
+#   lookback     - 高水位之前仍可能被修订的天数 (天气增量模式回刷 30 天)
+# 早于 (high_water_mark - lookback) 的区间视为"封存区"，记录 COUNT/TOTAL 校验和；
+# 封存区一旦变化 (历史修订 / 全量回刷)，自动退化为全区间 upsert。
+WATERMARK_TABLE = 'etl_watermarks'
+WATERMARK_SOURCES = {
+    'traffic': {'value_col': 'throughput', 'lookback': 7},
+    'daily_weather_index': {'value_col': 'weather_index', 'lookback': 30},
+    'flight_stats': {'value_col': 'arrival_count', 'lookback': 7},
+}
+
+# 下游滞后特征的影响范围: 源数据在 d 日变化 -> d+7 (throughput_lag_7 / flight_ma_7), d+364 (lag_364) 也受影响。
+# 重算窗口总是 [dirty_start, 骨架末尾]，因此 d+7 / d+364 必然落在窗口内;
+# 计算时向前多读 LAG_LOOKBACK_DAYS 天源数据以得到窗口首行的 throughput_lag_7。
+LAG_HORIZONS = (7, 364)
+LAG_LOOKBACK_DAYS = 7
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH, timeout=30)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_connection(row_factory=sqlite3.Row)
 
-def run():
-    print("=== 开始数据库合并工程 (Timeline Strategy) ===")
-    
-    conn = get_db_connection()
-    
-    # ... (rest of the code is inside run now) ...
-    # Be careful not to delete the content, just the def line change and indentation if needed.
-    # Actually, REPLACE renaming main to run is easier if I just match the def main(): line.
-    
-    # Wait, replace_file_content requires exact match.
-    # I should just replace `def main():` with `def run():` and the `if __name__` block.
-    
-    # But wait, python indentation...
-    # If the original code was inside `main()`, it is already indented.
-    # So renaming `def main():` to `def run():` works perfectly.
-    pass
-
-# Actually I will just do the replace.
-
-    df_traffic = pd.read_sql("SELECT date, throughput FROM traffic", conn)
-    # 1. 读取原始数据...
-    print("1. 读取原始数据...")
-    df_traffic = pd.read_sql("SELECT date, throughput FROM traffic", conn)
-    
-    # [NEW] 使用统一的 Holiday Utils (Single Source of Truth)
-    print("1.5 生成基础节日特征 (Holiday Utils)...")
+@span('merge.holidays')
+def load_holiday_frame():
+    """节日特征 (Holiday Utils - Single Source of Truth), 覆盖 HOLIDAY_RANGE 全区间"""
     from src.utils.holiday_utils import get_holiday_features
-    
-    # Generate for a wide range to cover all potential data
-    # (2018 to 2030 covers training and forecast)
-    holiday_dates = pd.date_range(start='2018-01-01', end='2030-12-31')
-    df_feat = get_holiday_features(holiday_dates)
-    df_holiday = df_feat.copy()
+
+    holiday_dates = pd.date_range(start=HOLIDAY_RANGE[0], end=HOLIDAY_RANGE[1])
+    df_holiday = get_holiday_features(holiday_dates)
     df_holiday['date'] = holiday_dates
-    
-    # Columns to merge: date, is_holiday, ...
-    # Note: get_holiday_features returns the feature cols. We added 'date'.
-    
-    # (Old Aggregation logic is handled inside get_holiday_features implicitly by row-based generation)
-    
- 
-    # 1.5 Load Weather from DB (Replacing CSV)
-
-    # 1.5 Load Weather from DB (Replacing CSV)
-    print("1. Loading Weather Data from DB...")
+    return df_holiday
+
+@span('merge.load_sources')
+def load_sources(conn, since=None):
+    """
+    读取 traffic / daily_weather_index / flight_stats。
+    since: 仅读取 date >= since 的 traffic / weather 行 (增量模式)。
+    flight_stats 始终读取全部按日聚合结果 (flight_ma_7 按行滚动，需要完整前序)。
+    """
+    where, params = ("WHERE date >= ?", (since,)) if since else ("", ())
+
+    df_traffic = pd.read_sql(f"SELECT date, throughput FROM traffic {where}", conn, params=params)
+
     try:
         # [NEW] Read from daily_weather_index table
-        df_weather = pd.read_sql("SELECT date, weather_index FROM daily_weather_index", conn)
+        df_weather = pd.read_sql(f"SELECT date, weather_index FROM daily_weather_index {where}", conn, params=params)
     except Exception as e:
         print(f"Error reading weather table: {e}")
         # Fallback empty df if table doesn't exist yet
         df_weather = pd.DataFrame(columns=['date', 'weather_index'])
 
-    # 规范化日期格式
-    for df in [df_traffic, df_holiday, df_weather]:
-        df['date'] = pd.to_datetime(df['date'])
-
-    # 2. 构建全量时间骨架 (Skeleton - Robust Union)
-    print("2. 构建时间骨架 (Robust Union Mode)...")
-    
-    # 获取各数据源的日期范围
-    dates_traffic = set(df_traffic['date'].dt.date) if 'date' in df_traffic else set()
-    dates_weather = set(df_weather['date'].dt.date) if 'date' in df_weather else set()
-    
-    # 临时读取 flight_stats 以获取其日期范围 (前面没读)
     try:
-         df_flights_tmp = pd.read_sql("SELECT date FROM flight_stats GROUP BY date", conn)
-         df_flights_tmp['date'] = pd.to_datetime(df_flights_tmp['date'])
-         dates_flights = set(df_flights_tmp['date'].dt.date)
-    except:
-         dates_flights = set()
-
-    # 计算并集
-    all_dates = dates_traffic.union(dates_weather).union(dates_flights)
-    
-    if not all_dates:
+        # Load flight stats (summing over airports per date)
+        df_flights = pd.read_sql("SELECT date, SUM(arrival_count) as flight_volume FROM flight_stats GROUP BY date", conn)
+    except Exception as e:
+        print(f"Warning: Could not read flight data: {e}")
+        df_flights = None
+
+    # 规范化日期格式
+    for df in [df_traffic, df_weather, df_flights]:
+        if df is not None:
+            df['date'] = pd.to_datetime(df['date'])
+
+    return df_traffic, df_weather, df_flights
+
+def get_skeleton_bounds(conn):
+    """
+    时间骨架 (Robust Union Mode): 各数据源日期并集的 [min, max]，且至少延伸到 今天 + 15 天。
+    只用 MIN/MAX 聚合，无需把源表整表读入内存。
+    """
+    mins, maxs = [], []
+    for table in WATERMARK_SOURCES:
+        try:
+            lo, hi = conn.execute(f"SELECT MIN(date), MAX(date) FROM {table}").fetchone()
+        except sqlite3.Error:
+            continue
+        if lo is not None:
+            mins.append(pd.Timestamp(lo))
+            maxs.append(pd.Timestamp(hi))
+
+    target_end = pd.Timestamp(pd.Timestamp.now().date() + pd.Timedelta(days=FORECAST_HORIZON_DAYS))
+    if not mins:
         # Fallback
-        start_date = pd.Timestamp('2019-01-01')
-        end_date = pd.Timestamp.now() + pd.Timedelta(days=15)
-        full_range = pd.date_range(start=start_date, end=end_date)
-    else:
-        min_date = min(all_dates)
-        max_date = max(all_dates)
-        # 扩展到未来 15 天 (确保有预测空间)
-        target_end = pd.Timestamp.now().date() + pd.Timedelta(days=15)
-        if max_date < target_end:
-            max_date = target_end
-            
-        full_range = pd.date_range(start=min_date, end=max_date)
-
-    print(f"   时间范围: {full_range.min().date()} 到 {full_range.max().date()}")
+        return pd.Timestamp('2019-01-01'), target_end
+    return min(mins), max(max(maxs), target_end)
+
+def get_super_bowl_dates(years):
+    """超级碗补丁 (Super Bowl Sunday & Monday): 2月的第2个周日 + 次日"""
+    sb_dates = []
+    for year in years:
+        try:
+            # 1. 找到2月1日
+            feb_first = pd.Timestamp(year=year, month=2, day=1)
+            # 2. 找到第一个周日 (dayofweek: Mon=0, Sun=6)
+            days_to_first_sunday = (6 - feb_first.dayofweek) % 7
+            first_sunday = feb_first + pd.Timedelta(days=days_to_first_sunday)
+            # 3. 第二个周日 = 第一个周日 + 7天
+            sb_sunday = first_sunday + pd.Timedelta(days=7)
+            sb_monday = sb_sunday + pd.Timedelta(days=1)
+
+            sb_dates.extend([sb_sunday, sb_monday])
+        except Exception:
+            continue
+    return sb_dates
+
+@span('merge.build_traffic_full')
+def build_traffic_full(full_range, df_traffic, df_weather, df_flights, df_holiday):
+    """
+    在给定的连续日期骨架上合并所有数据源，返回 traffic_full 的行 (date 为字符串)。
+    注意: throughput_lag_7 通过骨架 shift(7) 计算，骨架前 7 天的滞后值为空。
+    """
     df_skeleton = pd.DataFrame({'date': full_range})
-    
+
     # 3. 合并 (Left Join onto Skeleton)
-    print("3. 执行合并 (Left Join)...")
     df_full = df_skeleton.merge(df_traffic, on='date', how='left')
     df_full = df_full.merge(df_holiday, on='date', how='left')
     # Merge weather (inner join logic effectively, but left to keep skeleton)
     df_full = df_full.merge(df_weather, on='date', how='left')
 
     # [NEW] Merge Flight Data (OpenSky)
-    print("3.5 合并航班数据 (OpenSky)...")
     try:
-        # Load flight stats (summing over airports per date)
-        df_flights = pd.read_sql("SELECT date, SUM(arrival_count) as flight_volume FROM flight_stats GROUP BY date", conn)
-        df_flights['date'] = pd.to_datetime(df_flights['date'])
-        
+        if df_flights is None:
+            raise ValueError("flight_stats unavailable")
         # Calculate 7-day Moving Average for flights (Baseload)
         df_flights = df_flights.sort_values('date')
         df_flights['flight_ma_7'] = df_flights['flight_volume'].rolling(window=7, min_periods=1).mean()
         df_flights['flight_lag_1'] = df_flights['flight_volume'].shift(1)
-        
+
         df_full = df_full.merge(df_flights, on='date', how='left')
         df_full['flight_volume'] = df_full['flight_volume'].fillna(0).astype(int)
         df_full['flight_ma_7'] = df_full['flight_ma_7'].fillna(0).astype(int)
         df_full['flight_lag_1'] = df_full['flight_lag_1'].fillna(0).astype(int)
-        
+
     except Exception as e:
         print(f"Warning: Could not merge flight data: {e}")
         df_full['flight_volume'] = 0
         df_full['flight_ma_7'] = 0
         df_full['flight_lag_1'] = 0
-    
+
     # 4. 基础清洗
     # 填充 weather_index (NaN -> 0)
     df_full['weather_index'] = df_full['weather_index'].fillna(0).astype(int)
@@ -150,89 +175,230 @@ def run():
     # [NEW] Fill Advanced Holiday Features
     df_full['is_holiday_exact_day'] = df_full['is_holiday_exact_day'].fillna(0).astype(int)
     df_full['is_holiday_travel_window'] = df_full['is_holiday_travel_window'].fillna(0).astype(int)
-    df_full['holiday_name'] = df_full['holiday_name'].fillna('')
-    
+
     # 4. 注入超级碗补丁 (Super Bowl Patch)
-    print("4. 注入超级碗 (Super Bowl Sunday & Monday)...")
-    years = df_full['date'].dt.year.unique()
-    sb_dates = []
-    
-    for year in years:
-        try:
-            # 规则: 2月的第2个周日
-            # 1. 找到2月1日
-            feb_first = pd.Timestamp(year=year, month=2, day=1)
-            # 2. 找到第一个周日 (dayofweek: Mon=0, Sun=6)
-            days_to_first_sunday = (6 - feb_first.dayofweek) % 7
-            first_sunday = feb_first + pd.Timedelta(days=days_to_first_sunday)
-            # 3. 第二个周日 = 第一个周日 + 7天
-            sb_sunday = first_sunday + pd.Timedelta(days=7)
-            sb_monday = sb_sunday + pd.Timedelta(days=1)
-            
-            sb_dates.extend([sb_sunday, sb_monday])
-        except Exception:
-            continue
-        
-    mask_sb = df_full['date'].isin(sb_dates)
+    mask_sb = df_full['date'].isin(get_super_bowl_dates(df_full['date'].dt.year.unique()))
     # 标记为节日
     df_full.loc[mask_sb, 'is_holiday'] = 1
     # 覆盖名称 (Super Bowl 优先级很高，值得覆盖)
     df_full.loc[mask_sb, 'holiday_name'] = 'Super Bowl Group'
-    
+
     # 7. Lag Features (滞后特征)
-    # 对于 Prophet 来说，Lag 特征需要 shift
     # 注意: throughput 在未来是 NaN，Shift 之后未来几天会有值(来自过去)，但再远就没有了
-    # 这里先加上 lag_7, 仅供参考
-    print("6. 生成滞后特征 (Lag-7)...")
     df_full['throughput_lag_7'] = df_full['throughput'].shift(7)
-    
-    # 8. 存入数据库
-    print("7. 存入数据库表 traffic_full ...")
-    # 清理临时列
-    # 清理临时列
-    cols_to_keep = ['date', 'throughput', 'weather_index', 'is_holiday', 'holiday_name', 
-                    'is_holiday_exact_day', 'is_holiday_travel_window', 'is_spring_break', 
-                    'throughput_lag_7', 'flight_volume', 'flight_ma_7', 'flight_lag_1']
-    final_df = df_full[cols_to_keep].copy()
-    
+
+    final_df = df_full[TRAFFIC_FULL_COLUMNS].copy()
     # 转换 date 为 string 存入 sqlite
     final_df['date'] = final_df['date'].dt.strftime('%Y-%m-%d')
-    
-    final_df.to_sql('traffic_full', conn, if_exists='replace', index=False)
-    
-    # NEW: 停止导出 CSV (Removed export_table.py logic)
-    print("7.5 [Migration] CSV Export Disabled. Data saved to traffic_full table.")
-    # final_df.to_csv('TSA_Final_Analysis.csv', index=False, encoding='utf-8-sig')
-    
+    return final_df
+
+# ==========================================
+# High-Water Marks
+# ==========================================
+
+def _ensure_watermark_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+            source TEXT PRIMARY KEY,
+            high_water_mark TEXT,
+            sealed_before TEXT,
+            sealed_count INTEGER,
+            sealed_total REAL,
+            updated_at TEXT
+        )
+    """)
+
+def _source_watermark(conn, source):
+    """当前源表的 (high_water_mark, sealed_before, sealed_count, sealed_total)"""
+    cfg = WATERMARK_SOURCES[source]
+    try:
+        hwm = conn.execute(f"SELECT MAX(date) FROM {source}").fetchone()[0]
+    except sqlite3.Error:
+        return None
+    if hwm is None:
+        return None
+    sealed_before = (pd.Timestamp(hwm) - pd.Timedelta(days=cfg['lookback'])).strftime('%Y-%m-%d')
+    count, total = conn.execute(
+        f"SELECT COUNT(*), TOTAL({cfg['value_col']}) FROM {source} WHERE date < ?", (sealed_before,)
+    ).fetchone()
+    return hwm, sealed_before, count, total
+
+def _find_dirty_start(conn, changes=None):
+    """
+    对比上次记录的高水位，返回需要重算的最早日期 (str)。
+    返回 None 表示所有源都未变化; 返回 '' 表示封存区被修改，需要全区间重算。
+    changes: {source: [date, ...]} 写入方报告的 changeset (build_tsa_db.run 的返回值)。
+             该源封存区的修订若由 changeset 说明，只从最早的变化日期起重算，而不是全区间。
+    """
+    changes = changes or {}
+    _ensure_watermark_table(conn)
+    stored = {row[0]: row[1:] for row in conn.execute(
+        f"SELECT source, high_water_mark, sealed_before, sealed_count, sealed_total FROM {WATERMARK_TABLE}")}
+
+    dirty_start = None
+    for source, cfg in WATERMARK_SOURCES.items():
+        prev = stored.get(source)
+        current = _source_watermark(conn, source)
+        if prev is None or prev[0] is None:
+            if current is None:
+                continue
+            print(f"   [{source}] 无历史高水位 -> 全区间重算")
+            return ''
+        if current is None:
+            print(f"   [{source}] 源表已清空 -> 全区间重算")
+            return ''
+
+        prev_hwm, prev_sealed, prev_count, prev_total = prev
+        count, total = conn.execute(
+            f"SELECT COUNT(*), TOTAL({cfg['value_col']}) FROM {source} WHERE date < ?", (prev_sealed,)
+        ).fetchone()
+        if count != prev_count or total != prev_total:
+            revised = [d for d in changes.get(source) or [] if d < prev_sealed]
+            if not revised:
+                print(f"   [{source}] 封存区 (< {prev_sealed}) 被修订 -> 全区间重算")
+                return ''
+            print(f"   [{source}] 封存区修订 {len(revised)} 天 (changeset) -> 重算起点 {revised[0]}")
+            prev_sealed = min(revised)
+
+        print(f"   [{source}] 高水位 {prev_hwm} -> {current[0]} (重算起点 {prev_sealed})")
+        dirty_start = prev_sealed if dirty_start is None else min(dirty_start, prev_sealed)
+
+    return dirty_start
+
+def _save_watermarks(conn):
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for source in WATERMARK_SOURCES:
+        current = _source_watermark(conn, source)
+        if current is None:
+            conn.execute(f"DELETE FROM {WATERMARK_TABLE} WHERE source = ?", (source,))
+            continue
+        conn.execute(f"""
+            INSERT INTO {WATERMARK_TABLE} (source, high_water_mark, sealed_before, sealed_count, sealed_total, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(source) DO UPDATE SET
+                high_water_mark = excluded.high_water_mark,
+                sealed_before = excluded.sealed_before,
+                sealed_count = excluded.sealed_count,
+                sealed_total = excluded.sealed_total,
+                updated_at = excluded.updated_at
+        """, (source, *current, now))
+
+# ==========================================
+# Writers
+# ==========================================
+
+def drop_traffic_full(conn):
+    """DROP traffic_full (表结构变化时使用)，随后由 ensure_schema 按最新 DDL 重建"""
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS traffic_full")
+        conn.execute(f"DELETE FROM {WATERMARK_TABLE}")
+    ensure_schema(conn)
+
+@span('merge.incremental_update')
+def incremental_update(conn, changed_dates=None):
+    """
+    增量物化: 只重算高水位变化影响的日期窗口 (含 lag 7 / 364 天的下游影响)，
+    在单个事务内经暂存表比对 (diff_upsert) 只写入值有变化的行，并删除骨架之外的旧行。
+    空表 / 无高水位记录时窗口即为整个骨架 (等价于全量重建，但不 DROP 表)。
+    changed_dates: traffic 表的 changeset (build_tsa_db.run 的返回值)，可省略。
+    返回 traffic_full 的 changeset: 新增 / 变化 / 删除的日期列表 (升序)。
+    """
+    print("1. 比对数据源高水位 (High-Water Marks)...")
+    skel_start, skel_end = get_skeleton_bounds(conn)
+    dirty_start = _find_dirty_start(conn, {'traffic': changed_dates})
+
+    cur_min, cur_max = conn.execute("SELECT MIN(date), MAX(date) FROM traffic_full").fetchone()
+    if cur_min is None or pd.Timestamp(cur_min) != skel_start:
+        # 骨架起点变化 (更早的历史数据 / 首次运行)
+        dirty_start = ''
+
+    if dirty_start == '':
+        window_start = skel_start
+    else:
+        window_start = pd.Timestamp(dirty_start) if dirty_start else pd.Timestamp(cur_max) + pd.Timedelta(days=1)
+        # 骨架向未来延伸的新日期 (今天 + 15)
+        window_start = min(window_start, pd.Timestamp(cur_max) + pd.Timedelta(days=1))
+    window_start = max(window_start, skel_start)
+
+    if window_start > skel_end:
+        print("   所有数据源均无变化，跳过。")
+        return []
+
+    # 计算窗口需向前多读 7 天以得到 throughput_lag_7
+    calc_start = max(window_start - pd.Timedelta(days=LAG_LOOKBACK_DAYS), skel_start)
+    print(f"2. 重算窗口: {window_start.date()} 到 {skel_end.date()} ({(skel_end - window_start).days + 1} 天)")
+    df_traffic, df_weather, df_flights = load_sources(conn, since=calc_start.strftime('%Y-%m-%d'))
+    df_holiday = load_holiday_frame()
+
+    calc_df = build_traffic_full(pd.date_range(calc_start, skel_end), df_traffic, df_weather, df_flights, df_holiday)
+    final_df = calc_df[calc_df['date'] >= window_start.strftime('%Y-%m-%d')]
+
+    print(f"3. 比对 {len(final_df)} 行并写入 traffic_full (单事务)...")
+    bounds = (skel_start.strftime('%Y-%m-%d'), skel_end.strftime('%Y-%m-%d'))
+    with span('merge.write', rows=len(final_df)), conn:
+        changed = diff_upsert(conn, 'traffic_full', final_df)
+        removed = [row[0] for row in conn.execute(
+            "SELECT date FROM traffic_full WHERE date < ? OR date > ?", bounds).fetchall()]
+        conn.execute("DELETE FROM traffic_full WHERE date < ? OR date > ?", bounds)
+        _save_watermarks(conn)
+        if changed or removed:
+            bump_version(conn, 'traffic')
+    print(f"   变化 {len(changed)} 行，删除骨架外 {len(removed)} 行")
+    return sorted(set(changed) | set(removed))
+
+def print_validation(conn):
     # 9. 验证
     print("\n=== 验证阶段 ===")
-    print(f"Total Rows: {len(final_df)}")
-    
+    total = conn.execute("SELECT COUNT(*) FROM traffic_full").fetchone()[0]
+    print(f"Total Rows: {total}")
+
+    def show(label, date, cols='*'):
+        row = pd.read_sql(f"SELECT {cols} FROM traffic_full WHERE date = ?", conn, params=(date,))
+        print(f"\n[{label}]:")
+        print(row.to_string(index=False))
+
     # 验证 2026-01-16 (未来)
-    future_row = final_df[final_df['date'] == '2026-01-16']
-    print("\n[Check Future 2026-01-16]:")
-    print(future_row.to_string(index=False))
-    
+    show("Check Future 2026-01-16", '2026-01-16')
     # 验证 2022-12-22 (核弹)
-    # [Validation Update] Show new cols
-    cols_val = ['date', 'throughput', 'is_holiday', 'is_holiday_exact_day', 'is_holiday_travel_window', 'holiday_name']
-    bomb_row = final_df[final_df['date'] == '2022-12-22']
-    print("\n[Check Bomb Cyclone 2022-12-22]:")
-    print(bomb_row[cols_val].to_string(index=False))
-    
+    show("Check Bomb Cyclone 2022-12-22", '2022-12-22',
+         'date, throughput, is_holiday, is_holiday_exact_day, is_holiday_travel_window, holiday_name')
     # 验证 复活节优先级 (2024-03-31 Easter Sunday)
-    easter_row = final_df[final_df['date'] == '2024-03-31']
-    print("\n[Check Easter Priority 2024-03-31]:")
-    print(easter_row.to_string(index=False))
-
+    # 应该显示 holiday_name='Easter Sunday', is_spring_break=0 (尽管是3月周末)
+    show("Check Easter Priority 2024-03-31", '2024-03-31')
     # 验证 超级碗 (2024-02-11 Super Bowl Sunday)
-    sb_row = final_df[final_df['date'] == '2024-02-11']
-    print("\n[Check Super Bowl 2024-02-11]:")
-    print(sb_row.to_string(index=False))
-    # 应该显示 holiday_name='Easter Group', is_spring_break=0 (尽管是3月周末)
-    
-    conn.close()
+    show("Check Super Bowl 2024-02-11", '2024-02-11')
+
+@span('merge.run')
+def run(full=False, changed_dates=None):
+    """
+    合并 traffic / 天气 / 航班 / 节日 -> traffic_full
+    :param full: True=DROP 并按最新表结构全量重建 (表结构变化时使用), False=增量物化 (默认)
+    :param changed_dates: build_tsa_db.run 返回的 traffic changeset，封存区修订时只重算受影响的窗口
+    :return: traffic_full 的 changeset (变化的日期列表)
+    """
+    print("=== 开始数据库合并工程 (Timeline Strategy) ===")
+
+    conn = get_db_connection()
+    try:
+        _ensure_watermark_table(conn)
+        if full:
+            print("[模式] 全量重建 (Full Rebuild)")
+            drop_traffic_full(conn)
+        else:
+            print("[模式] 增量物化 (Incremental)")
+            ensure_schema(conn)
+        changed = incremental_update(conn, changed_dates)
+
+        # NEW: 停止导出 CSV (Removed export_table.py logic)
+        print(f"7.5 [Migration] CSV Export Disabled. {len(changed)} rows changed in traffic_full table.")
+        print_validation(conn)
+    finally:
+        conn.close()
     print("\nDone.")
+    return changed
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Merge source tables into traffic_full")
+    parser.add_argument('--full', action='store_true', help='Drop and fully rebuild traffic_full (schema changes)')
+    args = parser.parse_args()
+    run(full=args.full)
@@ -0,0 +1,212 @@
+# backtest_engine.py - 并行滚动回测引擎 (Rolling-Origin Backtest Engine)
+# 每个目标日期 T 用 ds <= T-1 的全部历史训练一个独立模型 (盲测)，日期之间互不依赖，
+# 因此按目标日期分片到 ProcessPoolExecutor 并行拟合:
+#   - 特征矩阵只准备一次，写成 .npy 后由各 worker 以 mmap_mode='r' 映射 (零拷贝共享，spawn 安全)
+#   - 每个 worker 限制线程数 (BLAS/OpenMP 环境变量 + XGBoost n_jobs)，避免 N 个进程 x 全核线程的过度订阅
+#   - 结果按完成顺序流式返回 (generator)，调用方可边算边打印
+#   - 可选 warm-start: 目标日期按 refit_every 切成连续段，段首完整拟合，
+#     段内后续日期在前一天的 booster 上继续 boosting warm_rounds 轮 (xgb_model= continuation)
+# 熔断协议等后处理由调用方 (rolling_backtest.py) 负责，本模块只产出 base prediction。
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# 与 rolling_backtest.py 原单日回测保持一致
+DEFAULT_XGB_PARAMS = {
+    'n_estimators': 500,
+    'learning_rate': 0.05,
+    'max_depth': 5,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'random_state': 42,
+    'verbosity': 0,
+}
+
+DEFAULT_THREADS_PER_WORKER = 2
+
+# warm-start 默认值: 每 7 天完整重训一次，其余日期追加 50 棵树
+DEFAULT_REFIT_EVERY = 7
+DEFAULT_WARM_ROUNDS = 50
+
+# 限制每个 worker 的原生线程池。BLAS / OpenMP 在进程首次 import numpy / xgboost 时读取这些变量，
+# 而 spawn 出的 worker 在 initializer 运行之前就已导入 numpy (反序列化本模块时)，
+# 所以必须由父进程在创建 worker 之前设置 (子进程继承环境变量)，见 _worker_thread_env()
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+
+# worker 进程内的共享数据 (由 _init_worker 填充)
+_SHARED = {}
+
+
+def default_workers(threads_per_worker=DEFAULT_THREADS_PER_WORKER):
+    """CPU 核数 / 每 worker 线程数 (至少 1)"""
+    return max(1, (os.cpu_count() or 1) // max(1, threads_per_worker))
+
+
+# ==========================================
+# 1. Shared Matrix (memory-mapped .npy)
+# ==========================================
+
+def prepare_arrays(df, features):
+    """
+    特征矩阵 -> 连续 float64 数组。
+    X/y 中的缺失值按原单日回测的方式填 0；day 为按日期排序的天序号 (用于切分训练集)。
+    """
+    df = df.sort_values('ds').reset_index(drop=True)
+    X = df.reindex(columns=features).astype(float).fillna(0).to_numpy(dtype=np.float64)
+    y = df['y'].astype(float).fillna(0).to_numpy(dtype=np.float64)
+    day = df['ds'].values.astype('datetime64[D]').astype(np.int64)
+    return {'X': np.ascontiguousarray(X), 'y': y, 'day': day}
+
+
+def _dump_arrays(arrays, directory):
+    for name, arr in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), arr)
+
+
+def _map_arrays(directory):
+    return {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+        for name in ('X', 'y', 'day')
+    }
+
+
+@contextmanager
+def _worker_thread_env(threads):
+    """在父进程临时设置 THREAD_ENV_VARS (期间创建的子进程继承)，退出时恢复原值"""
+    saved = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    os.environ.update({var: str(threads) for var in THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _init_worker(directory, threads):
+    _SHARED.clear()
+    _SHARED.update(_map_arrays(directory))
+    _SHARED['threads'] = threads
+
+
+# ==========================================
+# 2. Segment Fit (full refit + optional warm-start chain)
+# ==========================================
+
+def _fit_segment(arrays, target_days, params, threads, warm_rounds):
+    """
+    训练集 = day < target_day 的全部行，预测 target_day 当天。
+    段内第一天完整拟合；warm_rounds 不为 None 时，后续日期在前一个 booster 上继续 boosting。
+    """
+    from xgboost import XGBRegressor
+
+    day = arrays['day']
+    results = []
+    prev = None
+    for target_day in target_days:
+        n_train = int(np.searchsorted(day, target_day, side='left'))
+        pos = n_train
+        if pos >= len(day) or day[pos] != target_day or n_train == 0:
+            continue
+
+        t0 = time.perf_counter()
+        X_train, y_train = arrays['X'][:n_train], arrays['y'][:n_train]
+        if prev is not None and warm_rounds is not None:
+            mode = 'warm'
+            model = XGBRegressor(n_jobs=threads, **{**params, 'n_estimators': warm_rounds})
+            model.fit(X_train, y_train, xgb_model=prev.get_booster())
+        else:
+            mode = 'full'
+            model = XGBRegressor(n_jobs=threads, **params)
+            model.fit(X_train, y_train)
+        prev = model
+
+        base_pred = float(model.predict(arrays['X'][pos:pos + 1])[0])
+        if np.isnan(base_pred):
+            base_pred = 0.0
+        results.append({
+            'date': pd.Timestamp(np.datetime64(int(target_day), 'D')).strftime('%Y-%m-%d'),
+            'row': pos,
+            'base_prediction': base_pred,
+            'train_rows': n_train,
+            'mode': mode,
+            'fit_seconds': round(time.perf_counter() - t0, 3),
+        })
+    return results
+
+
+def _worker_task(target_days, params, warm_rounds):
+    return _fit_segment(_SHARED, target_days, params, _SHARED['threads'], warm_rounds)
+
+
+def _segments(target_days, refit_every):
+    """refit_every=None: 每天一段 (全部完整拟合)；否则按日期顺序每 refit_every 天一段"""
+    target_days = sorted(target_days)
+    size = refit_every if refit_every and refit_every > 1 else 1
+    return [target_days[i:i + size] for i in range(0, len(target_days), size)]
+
+
+# ==========================================
+# 3. Engine
+# ==========================================
+
+def iter_backtest(df, features, target_dates, params=None, workers=None,
+                  threads_per_worker=DEFAULT_THREADS_PER_WORKER,
+                  refit_every=None, warm_rounds=DEFAULT_WARM_ROUNDS):
+    """
+    并行滚动回测，按完成顺序 yield 每个目标日期的结果 dict:
+        {'date', 'row', 'base_prediction', 'train_rows', 'mode', 'fit_seconds'}
+    row 为按 ds 排序后的行号 (df.sort_values('ds').reset_index(drop=True))；mode 为 'full' / 'warm'。
+    矩阵中不存在的目标日期直接跳过。workers=1 时在当前进程串行执行 (便于调试)。
+    refit_every: None = 每天完整重训 (默认)；N = 每 N 天完整重训一次，中间日期 warm-start。
+    """
+    params = {**DEFAULT_XGB_PARAMS, **(params or {})}
+    workers = workers or default_workers(threads_per_worker)
+    target_days = [np.datetime64(pd.Timestamp(d).date(), 'D').astype(np.int64) for d in target_dates]
+    segments = _segments(target_days, refit_every)
+    if not refit_every or refit_every <= 1:
+        warm_rounds = None
+    arrays = prepare_arrays(df, features)
+
+    if workers <= 1 or len(segments) <= 1:
+        # 串行: 同一时间只有一个拟合，XGBoost 使用全部核心
+        for segment in segments:
+            yield from _fit_segment(arrays, segment, params, -1, warm_rounds)
+        return
+
+    workers = min(workers, len(segments))
+    tmp_dir = tempfile.mkdtemp(prefix='tsa_backtest_')
+    try:
+        _dump_arrays(arrays, tmp_dir)
+        del arrays
+        # 统一使用 spawn (Windows 默认行为)；fork 一个已初始化 OpenMP 的父进程可能死锁
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(tmp_dir, threads_per_worker)) as pool:
+            # worker 进程在 submit 时创建 (任务数 >= workers，全部 worker 都在此创建)
+            with _worker_thread_env(threads_per_worker):
+                futures = [pool.submit(_worker_task, seg, params, warm_rounds) for seg in segments]
+            for future in as_completed(futures):
+                yield from future.result()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run_backtest(df, features, target_dates, **kwargs):
+    """iter_backtest 的收集版本，返回按日期排序的 DataFrame"""
+    results = list(iter_backtest(df, features, target_dates, **kwargs))
+    if not results:
+        return pd.DataFrame(columns=['date', 'row', 'base_prediction', 'train_rows', 'mode', 'fit_seconds'])
+    return pd.DataFrame(results).sort_values('date').reset_index(drop=True)
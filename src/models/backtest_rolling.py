@@ -1,116 +1,23 @@
 import pandas as pd
 import numpy as np
-import sqlite3
 import sys
 import os
 from xgboost import XGBRegressor
 
 # Add src to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from src.config import DB_PATH
-from src.models.model_utils import get_aggregated_weather_features
+from src.models.feature_store import FeatureStore
 
 def run_backtest():
     print("🚀 Starting Rolling Backtest (2023, 2024, 2025, 2026)...")
     
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql("SELECT * FROM traffic_full ORDER BY date", conn)
-    
-    # Load Weather for Shadow Model
-    df_weather = pd.read_sql("SELECT date, weather_index FROM daily_weather_index", conn)
-    conn.close()
-    
-    df['ds'] = pd.to_datetime(df['date'])
-    df['y'] = df['throughput']
-    df_weather['date'] = pd.to_datetime(df_weather['date'])
-    
-    # Merge Weather if needed (though traffic_full usually has it)
-    if 'weather_index' not in df.columns:
-        df = df.merge(df_weather, left_on='ds', right_on='date', how='left')
-        df['weather_index'] = df['weather_index'].fillna(0)
-    
     # ---------------------------------------------------------
-    # 1. Feature Engineering (Same as train_xgb.py)
+    # 1. Feature Engineering (Shared Feature Store, same matrix as train_xgb.py)
     # ---------------------------------------------------------
-    
-    # Shadow Model Injection
-    print("   [Shadow Model] Injecting Cancellation Rates...")
-    try:
-        import pickle
-        shadow_model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shadow_weather_model.pkl')
-        if os.path.exists(shadow_model_path):
-            with open(shadow_model_path, 'rb') as f:
-                shadow_model = pickle.load(f)
-            
-            conn_shad = sqlite3.connect(DB_PATH)
-            df_w_agg = get_aggregated_weather_features(conn_shad)
-            conn_shad.close()
-            
-            shadow_features = [
-                'max_snow', 'mean_snow', 
-                'max_snow_sq', 'mean_snow_sq', # <--- [NEW]
-                'max_wind', 'mean_wind', 
-                'max_precip', 'mean_precip', 'min_temp', 'mean_temp', 
-                'national_severity', 'month', 'day_of_year'
-            ]
-            
-            X_shad = df_w_agg[shadow_features].fillna(0)
-            df_w_agg['predicted_cancel_rate'] = shadow_model.predict(X_shad)
-            
-            df = df.merge(df_w_agg[['date', 'predicted_cancel_rate']], left_on='ds', right_on='date', how='left')
-            df['predicted_cancel_rate'] = df['predicted_cancel_rate'].fillna(0)
-        else:
-             df['predicted_cancel_rate'] = 0
-    except Exception as e:
-        print(f"Shadow model error: {e}")
-        df['predicted_cancel_rate'] = 0
-
-    # Basic Features
-    df['day_of_week'] = df['ds'].dt.dayofweek
-    df['month'] = df['ds'].dt.month
-    df['year'] = df['ds'].dt.year
-    df['day_of_year'] = df['ds'].dt.dayofyear
-    df['week_of_year'] = df['ds'].dt.isocalendar().week.astype(int)
-    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-    
-    # Lags
-    df['y_lag_7'] = df['y'].shift(7).fillna(method='bfill')
-    df['lag_7'] = df['y_lag_7']
-    
-    # Lag 364/365
-    df['lag_365'] = df['y'].shift(365).fillna(method='bfill')
-    df['lag_364'] = df['y'].shift(364).fillna(method='bfill')
-    
-    fixed_date_holidays = ["New Year's Day", "Independence Day", "Veterans Day", "Christmas Day"]
-    df['is_fixed_holiday'] = 0
-    mask_fixed = df['ds'].apply(lambda d: (d.month==1 and d.day==1) or (d.month==7 and d.day==4) or (d.month==11 and d.day==11) or (d.month==12 and d.day==25))
-    df.loc[mask_fixed, 'is_fixed_holiday'] = 1
-    df['lag_364'] = np.where(df['is_fixed_holiday'] == 1, df['lag_365'], df['lag_364'])
-    
-    # Revenge Index
-    df['w_lag_1'] = df['weather_index'].shift(1).fillna(0)
-    df['w_lag_2'] = df['weather_index'].shift(2).fillna(0)
-    df['w_lag_3'] = df['weather_index'].shift(3).fillna(0)
-    df['revenge_index'] = (df['w_lag_1'] * 0.5) + (df['w_lag_2'] * 0.3) + (df['w_lag_3'] * 0.2)
-    
-    # Long Weekend
-    if 'is_holiday' not in df.columns: df['is_holiday'] = 0
-    df['is_long_weekend'] = 0
-    mask_long = (df['is_holiday'] == 1) & (df['day_of_week'].isin([0, 4]))
-    df.loc[mask_long, 'is_long_weekend'] = 1
-    
-    # Business Logic
-    match_month = df['ds'].dt.month.isin([1, 2, 9, 10])
-    match_day = df['ds'].dt.dayofweek.isin([1, 2])
-    df['is_off_peak_workday'] = (match_month & match_day).astype(int)
-
-    # [NEW] Multiplicative Interaction Features
-    df['lag_7_adjusted'] = df['lag_7'] * (1 - df['predicted_cancel_rate'])
-    df['lag_364_adjusted'] = df['lag_364'] * (1 - df['predicted_cancel_rate'])
-    
-    # [NEW] Fear Feature (Look-Ahead - Anticipation)
-    # If tomorrow is a meltdown, airlines pre-cancel today.
-    df['lead_1_shadow_cancel_rate'] = df['predicted_cancel_rate'].shift(-1).fillna(0)
+    df = FeatureStore().load()
+    if df.empty:
+        print("   Feature matrix is empty. Aborting backtest.")
+        return
 
     # Clean
     features = [
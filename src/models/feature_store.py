@@ -0,0 +1,544 @@
+# feature_store.py - 特征仓库 (Feature Store)
+# 全量 FEAT_HYBRID 特征矩阵只计算一次，按输入表的哈希持久化到 SQLite，
+# 训练 (train_xgb)、回测 (rolling_backtest 等) 与 Flask 接口统一从这里按日期切片读取。
+# 只有 ETL / 训练 (load) 会重算并写入；Flask 接口 (get_slice) 只读已持久化的矩阵。
+
+import copy
+import hashlib
+import os
+import pickle
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.config import DB_PATH
+from src.db import begin_immediate, ensure_schema, get_connection, get_read_connection, upsert_df
+from src.models.feature_mgr import FEAT_HYBRID, SHADOW_FEATURES
+from src.models.model_utils import aggregate_weather_features
+
+# 特征逻辑版本号：修改 build_feature_matrix 的计算方式时 +1，旧缓存自动失效
+FEATURE_STORE_VERSION = 3
+
+# 预测窗口：最后一个真实数据日之后的天数 (矩阵至少覆盖到该日期)
+FORECAST_HORIZON_DAYS = 14
+
+STORE_TABLE = 'feature_store'
+META_TABLE = 'feature_store_meta'
+# 每个输入表按日期的指纹 (增量刷新时与当前输入比对，得到变化日期的 changeset)
+FINGERPRINT_TABLE = 'feature_store_inputs'
+# 增量刷新时向前多读的完整年份数 (lag_364 / lag_365 / 上一年同名节日，以及序列开头的 bfill 区)
+REFRESH_LOOKBACK_YEARS = 2
+
+# 参与哈希的输入表 (任何一张表内容变化都会触发重算)
+SOURCE_QUERIES = {
+    'traffic_full': "SELECT * FROM traffic_full",
+    'daily_weather_index': "SELECT date, weather_index FROM daily_weather_index",
+    'weather': "SELECT * FROM weather",
+}
+
+SHADOW_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shadow_weather_model.pkl')
+
+# 进程内缓存 {input_hash: DataFrame}，Flask 多次请求之间直接复用
+_MEMORY_CACHE = {}
+
+
+def load_shadow_model(path=SHADOW_MODEL_PATH):
+    """加载影子模型 (不存在时返回 None)"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def load_sources(conn):
+    """一次性读取特征工程所需的全部输入表，缺失的表以空 DataFrame 代替"""
+    sources = {}
+    for name, query in SOURCE_QUERIES.items():
+        try:
+            sources[name] = pd.read_sql(query, conn)
+        except Exception as e:
+            print(f"   [Feature Store] WARNING: Could not read {name}: {e}")
+            sources[name] = pd.DataFrame()
+    return sources
+
+
+class SourceContext:
+    """
+    一次运行内的源表内存快照：每张输入表只从数据库读取一次，
+    历史特征 (build_feature_matrix) 与未来特征 (train_xgb 预测阶段) 共同消费。
+    派生数据 (天气聚合 / 影子模型取消率) 首次访问时计算并缓存。
+    """
+
+    def __init__(self, sources, shadow_model=None):
+        self.sources = sources
+        self.shadow_model = shadow_model
+        self._weather_index = None
+        self._weather_agg = None
+        self._cancel_rate = None
+
+    @classmethod
+    def load(cls, db_path=DB_PATH, shadow_model_path=SHADOW_MODEL_PATH):
+        conn = get_connection(db_path)
+        try:
+            sources = load_sources(conn)
+        finally:
+            conn.close()
+        return cls(sources, load_shadow_model(shadow_model_path))
+
+    @property
+    def weather_index(self):
+        """daily_weather_index -> Series (index: datetime)"""
+        if self._weather_index is None:
+            df = self.sources['daily_weather_index']
+            if df.empty:
+                self._weather_index = pd.Series(dtype=float)
+            else:
+                self._weather_index = pd.Series(df['weather_index'].values,
+                                                index=pd.to_datetime(df['date'])).sort_index()
+        return self._weather_index
+
+    @property
+    def weather_agg(self):
+        """weather 表的全国日聚合 (影子模型输入)"""
+        if self._weather_agg is None:
+            if self.sources['weather'].empty:
+                self._weather_agg = pd.DataFrame(columns=['date'])
+            else:
+                self._weather_agg = aggregate_weather_features(self.sources['weather'])
+        return self._weather_agg
+
+    @property
+    def cancel_rate(self):
+        """影子模型预测的取消率 -> Series (index: datetime)；无模型 / 无天气时为空"""
+        if self._cancel_rate is None:
+            agg = self.weather_agg
+            if self.shadow_model is None or agg.empty:
+                self._cancel_rate = pd.Series(dtype=float)
+            else:
+                X_shadow = agg[SHADOW_FEATURES].fillna(0)
+                self._cancel_rate = pd.Series(self.shadow_model.predict(X_shadow), index=agg['date'])
+        return self._cancel_rate
+
+
+def compute_input_hash(sources, shadow_model_path=SHADOW_MODEL_PATH):
+    """输入表内容 + 影子模型文件 + 特征版本号 -> sha1"""
+    h = hashlib.sha1(f"v{FEATURE_STORE_VERSION}".encode())
+    for name in sorted(sources):
+        df = sources[name]
+        h.update(name.encode())
+        h.update(','.join(map(str, df.columns)).encode())
+        if not df.empty:
+            h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    if os.path.exists(shadow_model_path):
+        with open(shadow_model_path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def compute_static_hash(sources, shadow_model_path=SHADOW_MODEL_PATH):
+    """与日期无关的输入: 特征版本号 + 各输入表列名 + 影子模型文件。变化时只能全量重算。"""
+    h = hashlib.sha1(f"v{FEATURE_STORE_VERSION}".encode())
+    for name in sorted(sources):
+        h.update(name.encode())
+        h.update(','.join(map(str, sources[name].columns)).encode())
+    if os.path.exists(shadow_model_path):
+        with open(shadow_model_path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def compute_date_fingerprints(sources):
+    """
+    每个输入表按 date 聚合的行哈希 (uint64 按位回绕求和，与行顺序无关)。
+    返回 DataFrame [date, <source>...]，值为 int64 (SQLite INTEGER)，某表无该日期时为 0。
+    """
+    fp = {}
+    for name in sorted(sources):
+        df = sources[name]
+        if df.empty or 'date' not in df.columns:
+            continue
+        codes, dates = pd.factorize(df['date'].astype(str))
+        sums = np.zeros(len(dates), dtype=np.uint64)
+        np.add.at(sums, codes, pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64))
+        fp[name] = pd.Series(sums.view(np.int64), index=dates)
+    out = pd.DataFrame(fp).fillna(0).astype(np.int64).sort_index()
+    out.index.name = 'date'
+    return out.reset_index()
+
+
+def changed_dates(stored_fp, current_fp):
+    """两份日期指纹的差异 -> 变化 (含新增 / 删除) 的日期列表 (升序)"""
+    cols = sorted((set(stored_fp.columns) | set(current_fp.columns)) - {'date'})
+    old = stored_fp.set_index('date').reindex(columns=cols, fill_value=0)
+    new = current_fp.set_index('date').reindex(columns=cols, fill_value=0)
+    dates = old.index.union(new.index)
+    old = old.reindex(dates, fill_value=0)
+    new = new.reindex(dates, fill_value=0)
+    return sorted(dates[(old != new).any(axis=1).to_numpy()])
+
+
+def _extend_future_skeleton(df, weather_index, horizon=FORECAST_HORIZON_DAYS):
+    """
+    确保骨架覆盖到 最后真实数据日 + horizon。
+    merge_db 通常已写入 today+15 的未来行；若 traffic_full 过旧 (ETL 未跑)，
+    这里补齐缺失日期：y 为空，天气取 daily_weather_index，节日标记现场计算。
+    """
+    from src.utils.holiday_utils import get_holiday_features
+
+    actual = df.loc[df['y'].notnull(), 'ds']
+    if actual.empty:
+        return df
+    target_end = actual.max() + pd.Timedelta(days=horizon)
+    if df['ds'].max() >= target_end:
+        return df
+
+    new_ds = pd.date_range(df['ds'].max() + pd.Timedelta(days=1), target_end)
+    ext = pd.DataFrame({'ds': new_ds})
+    ext['date'] = ext['ds'].dt.strftime('%Y-%m-%d')
+    ext['y'] = np.nan
+    ext['throughput'] = np.nan
+    ext['weather_index'] = ext['ds'].map(weather_index) if not weather_index.empty else 0
+    h_feats = get_holiday_features(ext['ds'])
+    for col in ['is_holiday', 'is_holiday_exact_day', 'is_holiday_travel_window', 'holiday_name']:
+        ext[col] = h_feats[col].values
+    print(f"   [Feature Store] Extended skeleton with {len(ext)} future days (to {target_end.date()}).")
+    return pd.concat([df, ext], ignore_index=True)
+
+
+def build_feature_matrix(ctx):
+    """
+    由 SourceContext 计算完整的 FEAT_HYBRID 特征矩阵 (纯函数，不访问数据库)。
+    历史与未来 (y 为空的预测窗口) 在同一个矩阵中用同一套向量化逻辑计算，
+    推理只需对矩阵切片 (get_forecast_slice)，不存在第二条特征路径。
+    返回按日期排序的 DataFrame，包含 'date', 'ds', 'y'、全部 FEAT_HYBRID 特征
+    以及熔断协议需要的辅助列 (lag_7, w_lag_1, holiday_name ...)。
+    """
+    from src.utils.holiday_utils import get_holiday_intensity, get_clean_lag_date, days_to_nearest_holiday
+
+    sources = ctx.sources
+    df = sources['traffic_full'].copy()
+    if df.empty:
+        return df
+
+    df['ds'] = pd.to_datetime(df['date'])
+    df['y'] = df['throughput']
+    df = df.sort_values('ds').reset_index(drop=True)
+
+    # 1. 天气指数 (traffic_full 通常已包含，缺失时回退到 daily_weather_index)
+    df_weather = sources['daily_weather_index']
+    if 'weather_index' not in df.columns and not df_weather.empty:
+        df_weather = df_weather[['date', 'weather_index']].copy()
+        df_weather['date'] = pd.to_datetime(df_weather['date'])
+        df = df.merge(df_weather.rename(columns={'date': 'ds'}), on='ds', how='left')
+    if 'weather_index' not in df.columns:
+        df['weather_index'] = 0
+
+    # 1b. 未来骨架 (预测窗口与历史走同一套特征逻辑)
+    df = _extend_future_skeleton(df, ctx.weather_index)
+    df['weather_index'] = df['weather_index'].fillna(0).astype(int)
+
+    # 2. 影子模型注入 (predicted_cancel_rate)
+    df['predicted_cancel_rate'] = 0.0
+    if not ctx.cancel_rate.empty:
+        df['predicted_cancel_rate'] = df['ds'].map(ctx.cancel_rate).fillna(0)
+
+    # 3. 时间特征
+    df['day_of_week'] = df['ds'].dt.dayofweek
+    df['month'] = df['ds'].dt.month
+    df['year'] = df['ds'].dt.year
+    df['day_of_year'] = df['ds'].dt.dayofyear
+    df['week_of_year'] = df['ds'].dt.isocalendar().week.astype(int)
+    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+
+    match_month = df['month'].isin([1, 2, 9, 10])
+    match_day = df['day_of_week'].isin([1, 2])  # Tue, Wed
+    df['is_off_peak_workday'] = (match_month & match_day).astype(int)
+
+    # 4. 滞后特征 (固定日期节日的 lag_364 换成 lag_365，对齐同一天)
+    df['lag_7'] = df['y'].shift(7).bfill()
+    df['throughput_lag_7'] = df['lag_7']
+    lag_364 = df['y'].shift(364).bfill()
+    lag_365 = df['y'].shift(365).bfill()
+    month_day = df['month'] * 100 + df['ds'].dt.day
+    is_fixed_holiday = month_day.isin([101, 704, 1111, 1225])
+    df['lag_364'] = np.where(is_fixed_holiday, lag_365, lag_364)
+
+    # 5. 节日特征 (基础标记来自 merge_db 写入的 traffic_full)
+    for col in ['is_holiday', 'is_holiday_exact_day', 'is_holiday_travel_window']:
+        if col not in df.columns:
+            df[col] = 0
+        df[col] = df[col].fillna(0).astype(int)
+    if 'holiday_name' not in df.columns:
+        df['holiday_name'] = ''
+    df['holiday_name'] = df['holiday_name'].fillna('')
+
+    df['days_to_nearest_holiday'] = days_to_nearest_holiday(df['ds'])
+
+    mask_sb = df['month'].isin([3, 4]) & df['day_of_week'].isin([5, 6]) & (df['is_holiday'] == 0)
+    df['is_spring_break'] = mask_sb.astype(int)
+
+    mask_long = (df['is_holiday'] == 1) & df['day_of_week'].isin([0, 4])
+    df['is_long_weekend'] = mask_long.astype(int)
+
+    df['holiday_intensity'] = df['holiday_name'].apply(get_holiday_intensity)
+
+    # 6. Classic v2 优化滞后: lag_7_clean (跳过节日) / lag_holiday_yoy (同名节日去年值)
+    holiday_dates_set = set(df.loc[df['is_holiday'] == 1, 'ds'].dt.date)
+    clean_dates = df['ds'].apply(lambda x: get_clean_lag_date(x, holiday_dates_set, 7))
+    val_map = df.set_index('ds')['y']
+    df['lag_7_clean'] = clean_dates.map(val_map).fillna(df['lag_7'])
+
+    exact = df[df['is_holiday_exact_day'] == 1]
+    h_map = dict(zip(zip(exact['year'], exact['holiday_name']), exact['y']))
+    prev_vals = [h_map.get((y - 1, n)) for y, n in zip(df['year'], df['holiday_name'])]
+    prev_vals = pd.Series(prev_vals, index=df.index, dtype=float)
+    df['lag_holiday_yoy'] = np.where(
+        (df['is_holiday_exact_day'] == 1) & prev_vals.notna(), prev_vals, df['lag_364']
+    )
+
+    # 7. 报复性反弹指数 (Revenge Index)
+    df['w_lag_1'] = df['weather_index'].shift(1).fillna(0)
+    df['w_lag_2'] = df['weather_index'].shift(2).fillna(0)
+    df['w_lag_3'] = df['weather_index'].shift(3).fillna(0)
+    df['revenge_index'] = (df['w_lag_1'] * 0.5) + (df['w_lag_2'] * 0.3) + (df['w_lag_3'] * 0.2)
+
+    # 8. 影子模型交互特征
+    df['lag_7_adjusted'] = df['lag_7'] * (1 - df['predicted_cancel_rate'])
+    df['lag_364_adjusted'] = df['lag_364'] * (1 - df['predicted_cancel_rate'])
+    df['lead_1_shadow_cancel_rate'] = df['predicted_cancel_rate'].shift(-1).fillna(0)
+
+    for col in FEAT_HYBRID:
+        if col not in df.columns:
+            df[col] = 0
+
+    return df
+
+
+def get_forecast_slice(df, horizon=FORECAST_HORIZON_DAYS):
+    """特征矩阵中最后一个真实数据日之后 horizon 天的行 (推理输入)"""
+    actual = df.loc[df['y'].notnull(), 'ds']
+    if actual.empty:
+        return df.iloc[0:0].copy()
+    last_actual = actual.max()
+    mask = (df['ds'] > last_actual) & (df['ds'] <= last_actual + pd.Timedelta(days=horizon))
+    return df[mask].copy().reset_index(drop=True)
+
+
+class FeatureStore:
+    """
+    特征仓库：FEAT_HYBRID 矩阵按输入哈希缓存 (进程内存 + SQLite 表 feature_store)，
+    输入变化时按日期指纹 (feature_store_inputs) 只重算变化日期之后的窗口。
+
+    用法:
+        store = FeatureStore()
+        df = store.load()                                  # 全量矩阵
+        df_jan = store.get_slice('2026-01-01', '2026-01-31')
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+
+    def _connect(self):
+        return get_connection(self.db_path)
+
+    def _read_meta(self, conn):
+        try:
+            return conn.execute(f"SELECT input_hash, static_hash FROM {META_TABLE} WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            return None
+
+    @staticmethod
+    def _store_columns(conn):
+        """feature_store 表的列 (由 ensure_schema 创建，见 src/db/schema.py)"""
+        return [r[1] for r in conn.execute(f"PRAGMA table_info({STORE_TABLE})").fetchall()]
+
+    def _read_matrix(self, conn):
+        df = pd.read_sql(f"SELECT * FROM {STORE_TABLE} ORDER BY date", conn)
+        df['ds'] = pd.to_datetime(df['date'])
+        return df
+
+    def _read_cached(self, conn, input_hash):
+        row = self._read_meta(conn)
+        if not row or row[0] != input_hash:
+            return None
+        return self._read_matrix(conn)
+
+    def _write_meta(self, conn, input_hash, static_hash, fingerprints):
+        """指纹 + meta 写入调用方已开启的事务 (与矩阵同一事务，读取方不会看到不一致的组合)"""
+        conn.execute(f"DELETE FROM {FINGERPRINT_TABLE}")
+        upsert_df(conn, FINGERPRINT_TABLE, fingerprints.reindex(columns=['date'] + sorted(SOURCE_QUERIES), fill_value=0))
+        row_count = conn.execute(f"SELECT COUNT(*) FROM {STORE_TABLE}").fetchone()[0]
+        conn.execute(
+            f"INSERT OR REPLACE INTO {META_TABLE} (id, input_hash, static_hash, version, row_count, built_at) "
+            f"VALUES (1, ?, ?, ?, ?, ?)",
+            (input_hash, static_hash, FEATURE_STORE_VERSION, row_count,
+             pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+
+    def _persist(self, conn, df, input_hash, static_hash, fingerprints, since=None):
+        """
+        since 为空时整表替换；否则只替换 date >= since 的行 (增量刷新)。
+        矩阵、指纹与 meta 在同一个 BEGIN IMMEDIATE 事务内 DELETE + INSERT (不 DROP / 重建表)，
+        并发的读取方要么看到旧的完整矩阵，要么看到新的。
+        """
+        cols = self._store_columns(conn)
+        if set(cols) != set(df.columns) - {'ds'}:
+            raise RuntimeError(f"Feature matrix columns differ from the '{STORE_TABLE}' schema "
+                               f"(update TABLES['{STORE_TABLE}'] in src/db/schema.py with a migration)")
+        with conn:
+            begin_immediate(conn)
+            if since is None:
+                conn.execute(f"DELETE FROM {STORE_TABLE}")
+            else:
+                conn.execute(f"DELETE FROM {STORE_TABLE} WHERE date >= ?", (since,))
+            upsert_df(conn, STORE_TABLE, df[cols])
+            self._write_meta(conn, input_hash, static_hash, fingerprints)
+
+    def _refresh(self, conn, context, input_hash, static_hash, fingerprints):
+        """
+        增量刷新: 与上次构建时的日期指纹比对得到变化日期 (changeset)，
+        只重算 [最早变化日 - 1 天, 末尾] 的行 (lead_1 依赖次日，其余特征只依赖过去)。
+        计算时向前多读 REFRESH_LOOKBACK_YEARS 个完整年份，保证 lag_364 / lag_365 / lag_holiday_yoy
+        与全量计算一致。无法增量时返回 None (由调用方全量重算)。
+        """
+        meta = self._read_meta(conn)
+        if not meta or meta[1] != static_hash:
+            return None
+        try:
+            stored_fp = pd.read_sql(f"SELECT * FROM {FINGERPRINT_TABLE}", conn)
+        except Exception:
+            return None
+
+        changed = changed_dates(stored_fp, fingerprints)
+        if not changed:
+            # 输入内容未变 (仅行顺序不同)，矩阵仍然有效
+            with conn:
+                begin_immediate(conn)
+                self._write_meta(conn, input_hash, static_hash, fingerprints)
+            return self._read_matrix(conn)
+
+        traffic = context.sources['traffic_full']
+        window_start = pd.Timestamp(changed[0]) - pd.Timedelta(days=1)
+        calc_start = pd.Timestamp(year=window_start.year - REFRESH_LOOKBACK_YEARS, month=1, day=1)
+        if traffic.empty or calc_start <= pd.Timestamp(traffic['date'].min()):
+            return None
+
+        since = window_start.strftime('%Y-%m-%d')
+        print(f"   [Feature Store] {len(changed)} changed dates -> refreshing from {since} "
+              f"(lookback from {calc_start.date()})...")
+        # 浅拷贝共享已计算的天气聚合 / 取消率 (与 traffic_full 无关)
+        partial = copy.copy(context)
+        partial.sources = dict(context.sources)
+        partial.sources['traffic_full'] = traffic[traffic['date'] >= calc_start.strftime('%Y-%m-%d')]
+        df = build_feature_matrix(partial)
+        df = df[df['date'] >= since]
+
+        stored_cols = self._store_columns(conn)
+        if set(stored_cols) != set(df.columns) - {'ds'}:
+            return None
+        self._persist(conn, df[stored_cols + ['ds']], input_hash, static_hash, fingerprints, since=since)
+        print(f"   [Feature Store] Replaced {len(df)} rows in '{STORE_TABLE}'.")
+        return self._read_matrix(conn)
+
+    def load(self, rebuild=False, context=None):
+        """
+        返回全量特征矩阵；输入未变化时直接命中缓存，不重新计算。
+        输入有变化时按日期指纹只重算受影响的窗口，无法增量时全量重算。
+        context: 已加载的 SourceContext (train_xgb 传入，避免重复读取源表)
+        """
+        conn = self._connect()
+        try:
+            ensure_schema(conn)
+            sources = context.sources if context is not None else load_sources(conn)
+            input_hash = compute_input_hash(sources)
+
+            if not rebuild:
+                if input_hash in _MEMORY_CACHE:
+                    print(f"   [Feature Store] Memory cache hit ({input_hash[:10]}).")
+                    return _MEMORY_CACHE[input_hash].copy()
+                df = self._read_cached(conn, input_hash)
+                if df is not None:
+                    print(f"   [Feature Store] DB cache hit ({input_hash[:10]}), {len(df)} rows.")
+                    _MEMORY_CACHE.clear()
+                    _MEMORY_CACHE[input_hash] = df
+                    return df.copy()
+
+            if context is None:
+                context = SourceContext(sources, load_shadow_model())
+            if context.shadow_model is None:
+                print("   [Feature Store] WARNING: Shadow model file not found! predicted_cancel_rate = 0.")
+            static_hash = compute_static_hash(sources)
+            fingerprints = compute_date_fingerprints(sources)
+
+            df = None if rebuild else self._refresh(conn, context, input_hash, static_hash, fingerprints)
+            if df is None:
+                print(f"   [Feature Store] Building feature matrix ({input_hash[:10]})...")
+                df = build_feature_matrix(context)
+                if df.empty:
+                    return df
+                self._persist(conn, df, input_hash, static_hash, fingerprints)
+                print(f"   [Feature Store] Persisted {len(df)} rows to '{STORE_TABLE}'.")
+            _MEMORY_CACHE.clear()
+            _MEMORY_CACHE[input_hash] = df
+            return df.copy()
+        finally:
+            conn.close()
+
+    def get_slice(self, start=None, end=None, columns=None):
+        """
+        按日期区间 [start, end] 读取已持久化的特征切片 (两端均可省略)。
+        只读: 按主键区间读取 feature_store，不读取源表、不重算 —— 矩阵由 ETL / 训练 (load) 刷新。
+        尚未构建、或特征版本与 meta 不一致 (代码已更新但矩阵尚未重建) 时返回空 DataFrame。
+        """
+        conn = get_read_connection(self.db_path)
+        try:
+            stored = self._store_columns(conn)
+            if not stored:
+                print("   [Feature Store] WARNING: feature store not built yet")
+                return pd.DataFrame()
+            if columns:
+                unknown = [c for c in columns if c not in stored]
+                if unknown:
+                    raise ValueError(f"Unknown feature columns: {', '.join(unknown)}")
+                cols = ['date'] + [c for c in columns if c != 'date']
+            else:
+                cols = stored
+
+            where, params = [], [FEATURE_STORE_VERSION]
+            if start is not None:
+                where.append("s.date >= ?")
+                params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+            if end is not None:
+                where.append("s.date <= ?")
+                params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+            # 与 meta 在同一条语句中读取 (同一快照)
+            try:
+                df = pd.read_sql(f"""
+                    SELECT {', '.join('s.' + c for c in cols)}
+                    FROM {STORE_TABLE} s JOIN {META_TABLE} m ON m.id = 1 AND m.version = ?
+                    {'WHERE ' + ' AND '.join(where) if where else ''}
+                    ORDER BY s.date
+                """, conn, params=params)
+            except (sqlite3.OperationalError, pd.errors.DatabaseError) as e:
+                print(f"   [Feature Store] WARNING: feature store not built yet ({e})")
+                return pd.DataFrame(columns=cols)
+        finally:
+            conn.close()
+        if not columns:
+            df['ds'] = pd.to_datetime(df['date'])
+        return df
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Feature Store 构建/检查工具')
+    parser.add_argument('--rebuild', action='store_true', help='忽略缓存强制重算')
+    args = parser.parse_args()
+
+    matrix = FeatureStore().load(rebuild=args.rebuild)
+    print(f"Rows: {len(matrix)}")
+    if not matrix.empty:
+        print(matrix[['date', 'y'] + FEAT_HYBRID].tail(5).to_string(index=False))
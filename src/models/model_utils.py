@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from src.utils.weather_utils import severity_score
+
 def get_aggregated_weather_features(conn):
     """
     Reads 'weather' table from DB and returns a DataFrame with 
@@ -13,7 +15,17 @@ def get_aggregated_weather_features(conn):
     """
     print("   [Model Utils] Reading and aggregating weather data...")
     df_weather = pd.read_sql("SELECT * FROM weather", conn)
-    
+    return aggregate_weather_features(df_weather)
+
+def aggregate_weather_features(df_weather):
+    """
+    Pure version of get_aggregated_weather_features: aggregates an already
+    loaded per-hub 'weather' frame into the daily national Shadow Model inputs.
+    Frames without a 'severity_score' column (e.g. raw Open-Meteo pulls) are scored on the fly.
+    """
+    if 'severity_score' not in df_weather.columns:
+        df_weather = df_weather.assign(severity_score=severity_score(df_weather))
+
     # Aggregate Weather (Hubs -> National)
     # metrics: snowfall_cm, windspeed_kmh, precipitation_mm, temperature_min_c, severity_score
     
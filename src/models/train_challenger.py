@@ -15,6 +15,7 @@ import holidays
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH
+from src.db import get_read_connection
 
 # TRAIN_FILE = os.path.join(os.getcwd(), 'TSA_Final_Analysis.csv') # Legacy
 # DB_PATH = os.path.join(os.getcwd(), 'tsa_data.db')
@@ -26,7 +27,7 @@ def load_data_and_split():
         raise FileNotFoundError(f"DB Not Found: {DB_PATH}")
 
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn = get_read_connection()
         
         # 1. Load Main Traffic & Features from 'traffic_full'
         print("Reading 'traffic_full' table...")
@@ -123,12 +124,11 @@ def load_data_and_split():
     # [LAG BRIDGE] Load Predictions as Fallback for Lags
     print("Loading predictions as lag fallbacks...")
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn = get_read_connection()
         # Get LATEST prediction for each future date
         pred_df = pd.read_sql("""
             SELECT target_date as date, predicted_throughput as forecast 
-            FROM prediction_history 
-            WHERE id IN (SELECT MAX(id) FROM prediction_history GROUP BY target_date)
+            FROM prediction_latest
         """, conn)
         conn.close()
         pred_df['date'] = pd.to_datetime(pred_df['date'])
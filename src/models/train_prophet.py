@@ -9,8 +9,9 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH
+from src.db import get_read_connection
 
-conn = sqlite3.connect(DB_PATH)
+conn = get_read_connection()
 df = pd.read_sql("SELECT * FROM traffic_full", conn)
 conn.close()
 
@@ -11,12 +11,14 @@ from sklearn.metrics import mean_absolute_error, r2_score
 # Add src to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH
+from src.db import get_read_connection
+from src.utils.instrumentation import span
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_read_connection(row_factory=sqlite3.Row)
     return conn
 
+@span('train_shadow_model.load_data')
 def load_and_prep_data():
     print("Loading data from DB...")
     conn = get_db_connection()
@@ -83,6 +85,7 @@ def load_and_prep_data():
     
     return merged_df
 
+@span('train_shadow_model.train')
 def train_model():
     df = load_and_prep_data()
     print(f"Data ready. Shape: {df.shape}")
@@ -120,7 +123,8 @@ def train_model():
         ('regressor', Ridge(alpha=1.0))
     ])
     
-    model.fit(X_train, y_train)
+    with span('train_shadow_model.fit', rows=len(X_train)):
+        model.fit(X_train, y_train)
     
     # Validation
     y_pred = model.predict(X_test)
@@ -1,269 +1,197 @@
 import pandas as pd
 import numpy as np
-import holidays
 import os
-import sqlite3
 from xgboost import XGBRegressor
-from sklearn.metrics import mean_absolute_percentage_error
 import warnings
 import sys
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 # Add src to path if run directly
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH, FORECAST_MODEL_PATH
-from src.models.feature_mgr import FEAT_HYBRID, SHADOW_FEATURES, apply_blind_protocol
+from src.db import ensure_schema, get_connection
+from src.db.predictions import log_predictions
+from src.models.feature_mgr import FEAT_HYBRID, apply_blind_protocol
+from src.models.feature_store import FeatureStore, SourceContext, FORECAST_HORIZON_DAYS, get_forecast_slice
+from src.utils.instrumentation import StageClock, span
 
 warnings.filterwarnings('ignore')
 
-def run():
-    # 1. 加载数据 (From DB)
-    print("Loading data from SQLite (traffic_full)...")
-    conn = sqlite3.connect(DB_PATH)
+# ==========================================
+# Training Modes / Model Params
+# ==========================================
+
+TRAIN_MODES = ('validate', 'production', 'both')
+
+PANDEMIC_START = pd.Timestamp('2020-03-01')
+PANDEMIC_END = pd.Timestamp('2021-12-31')
+VALIDATION_TRAIN_CUTOFF = pd.Timestamp('2025-12-31')
+VALIDATION_TEST_START = pd.Timestamp('2026-01-01')
+
+VALIDATION_PARAMS = {
+    'n_estimators': 1000,
+    'learning_rate': 0.05,
+    'max_depth': 5,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'n_jobs': -1,
+    'random_state': 42,
+}
+
+FORECAST_PARAMS = {
+    'n_estimators': 1200,
+    'learning_rate': 0.05,
+    'max_depth': 5,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'n_jobs': -1,
+    'random_state': 42,
+}
+
+# ==========================================
+# Warm-start (incremental boosting)
+# ==========================================
+
+# 每 N 次运行完整重训一次；其余运行在上一版模型上追加 WARM_START_ROUNDS 棵树
+DEFAULT_REFIT_EVERY = 7
+WARM_START_ROUNDS = 60
+
+FORECAST_META_PATH = os.path.splitext(FORECAST_MODEL_PATH)[0] + '.meta.json'
+
+def load_forecast_meta():
+    if not os.path.exists(FORECAST_META_PATH) or not os.path.exists(FORECAST_MODEL_PATH):
+        return None
     try:
-        df = pd.read_sql("SELECT * FROM traffic_full", conn)
+        with open(FORECAST_META_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
     except Exception as e:
-        print(f"Error reading traffic_full: {e}")
-        conn.close()
-        return
-        
-    conn.close()
-    
-    if df.empty:
-        print("Traffic data is empty. Aborting training.")
-        return
-
-    df['ds'] = pd.to_datetime(df['date'])
-    df['y'] = df['throughput']
-    df = df.sort_values('ds').reset_index(drop=True)
-
-    # [NEW] Load Weather (Flights Removed)
+        print(f"   [WARM-START] Could not read {FORECAST_META_PATH}: {e}")
+        return None
+
+def save_forecast_meta(meta, features, trained_through):
+    meta = dict(meta)
+    meta.update({
+        'features': list(features),
+        'trained_through': trained_through.strftime('%Y-%m-%d'),
+        'saved_at': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'),
+    })
+    with open(FORECAST_META_PATH, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+def fit_forecast_model(X_full, y_full, trained_through, warm_start=False, refit_every=DEFAULT_REFIT_EVERY, n_jobs=-1):
+    """
+    生产模型训练。warm_start=True 时在已保存的模型上继续 boosting (xgb_model= continuation)，
+    返回 (model, meta)。以下情况回退到完整重训: 无历史模型 / 特征列变化 / 没有新数据 / 距上次完整重训已达 refit_every 次。
+    """
+    meta = load_forecast_meta() if warm_start else None
+    reason = None
+    if warm_start:
+        if meta is None:
+            reason = "no saved model"
+        elif meta.get('features') != list(X_full.columns):
+            reason = "feature set changed"
+        elif meta.get('trained_through', '') >= trained_through.strftime('%Y-%m-%d'):
+            reason = "no new data"
+        elif meta.get('warm_updates', 0) + 1 >= refit_every:
+            reason = f"refit cadence ({refit_every})"
+
+    if warm_start and reason is None:
+        print(f"   [WARM-START] Continuing from {FORECAST_MODEL_PATH} "
+              f"(+{WARM_START_ROUNDS} rounds, update {meta['warm_updates'] + 1}/{refit_every - 1})...")
+        model = XGBRegressor(**{**FORECAST_PARAMS, 'n_estimators': WARM_START_ROUNDS, 'n_jobs': n_jobs})
+        model.fit(X_full, y_full, xgb_model=FORECAST_MODEL_PATH)
+        return model, {'last_full_refit': meta.get('last_full_refit'), 'warm_updates': meta['warm_updates'] + 1}
+
+    if warm_start:
+        print(f"   [WARM-START] Full refit: {reason}.")
+    model = XGBRegressor(**{**FORECAST_PARAMS, 'n_jobs': n_jobs})
+    model.fit(X_full, y_full)
+    return model, {'last_full_refit': trained_through.strftime('%Y-%m-%d'), 'warm_updates': 0}
+
+@span('train_xgb.run')
+def run(mode='both', warm_start=False, refit_every=DEFAULT_REFIT_EVERY):
+    """
+    mode:
+        'validate'   - 只训练验证模型并输出 MAPE (xgb_validation.csv)
+        'production' - 只做全量重训 + 未来预测 + 写入 prediction_history (Flask 默认)
+        'both'       - 两者并行: 验证拟合在独立进程中运行
+    任何阶段失败都抛出异常 (流水线 / 任务队列据此记为 failed，命令行以非零码退出)。
+    """
+    if mode not in TRAIN_MODES:
+        raise ValueError(f"Unknown mode '{mode}', expected one of {TRAIN_MODES}")
+    clock = StageClock(prefix='train_xgb.')
+
+    # 0. 加载源表 (Loader Stage)
+    # traffic_full / daily_weather_index / weather 每张表只读取一次，
+    # 历史特征 (Feature Store) 与未来特征 (Forecast) 共用同一份内存快照。
+    print("Loading source tables (single pass)...")
     try:
-        print("Loading Weather from SQLite...")
-        conn_extra = sqlite3.connect(DB_PATH, timeout=30)
-        
-        # 2. Weather
-        try:
-            df_weather = pd.read_sql("SELECT date, weather_index FROM daily_weather_index", conn_extra)
-            df_weather['date'] = pd.to_datetime(df_weather['date'])
-        except:
-            print("   WARNING: Could not load weather_index.")
-            df_weather = pd.DataFrame(columns=['date', 'weather_index'])
-        
-        conn_extra.close()
-        
-        # Merge Weather
-        if 'weather_index' not in df.columns:
-            print("   Merging weather_index from daily_weather_index...")
-            df = df.merge(df_weather, left_on='ds', right_on='date', how='left')
-            df.drop(columns=['date_y'], inplace=True, errors='ignore')
-            df.rename(columns={'date_x': 'date'}, inplace=True, errors='ignore')
-        
-        if 'weather_index' in df.columns:
-            df['weather_index'] = df['weather_index'].fillna(0).astype(int)
-        else:
-            print("   WARNING: weather_index missing after merge! Forcing 0.")
-            df['weather_index'] = 0
-
-        # [OPTIMIZATION] Forward Fill
-        if 'total_flights' not in df.columns:
-             df['total_flights'] = 0
-             
+        ctx = SourceContext.load()
     except Exception as e:
-        print(f"   WARNING: Could not load weather: {e}")
-        if 'total_flights' not in df.columns: df['total_flights'] = 0
-        if 'weather_index' not in df.columns: df['weather_index'] = 0
-
-    # [NEW] Load Shadow Model & Generate Predicted Cancel Rate
+        print(f"Error loading source tables: {e}")
+        raise
+    clock.lap('load_sources')
+
+    # 1. 加载特征矩阵 (From Feature Store)
+    # 历史特征 (lags / revenge / shadow / holiday distance) 统一由 FeatureStore 计算并缓存，
+    # 输入表未变化时直接命中缓存，不再重复计算。
+    print("Loading feature matrix from Feature Store (traffic_full)...")
     try:
-        print("   [Shadow Model] Loading 'shadow_weather_model.pkl'...")
-        import pickle
-        from src.models.model_utils import get_aggregated_weather_features
-        
-        shadow_model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shadow_weather_model.pkl')
-        
-        if os.path.exists(shadow_model_path):
-            with open(shadow_model_path, 'rb') as f:
-                shadow_model = pickle.load(f)
-            
-            # 1. Get Features
-            conn_shadow = sqlite3.connect(DB_PATH)
-            df_weather_agg = get_aggregated_weather_features(conn_shadow)
-            conn_shadow.close()
-            
-            # 2. Predict Cancel Rate
-            print("   [Shadow Model] Predicting cancel rates for all known weather dates...")
-            shadow_features = SHADOW_FEATURES
-            
-            # Ensure features present
-            X_shadow = df_weather_agg[shadow_features].fillna(0)
-            df_weather_agg['predicted_cancel_rate'] = shadow_model.predict(X_shadow)
-            
-            # 3. Merge into Main DF
-            print("   [Shadow Model] Merging 'predicted_cancel_rate' into training data...")
-            df = df.merge(df_weather_agg[['date', 'predicted_cancel_rate']], left_on='ds', right_on='date', how='left')
-            df.drop(columns=['date'], inplace=True, errors='ignore')
-            
-            # Fill NaNs
-            df['predicted_cancel_rate'] = df['predicted_cancel_rate'].fillna(0)
-            
-            print(f"   [Shadow Model] Injection complete. Mean predicted cancel rate: {df['predicted_cancel_rate'].mean():.4f}")
-            
-        else:
-             print("   [WARNING] Shadow model file not found! Skipping injection.")
-             df['predicted_cancel_rate'] = 0
-             
+        df = FeatureStore().load(context=ctx)
     except Exception as e:
-        print(f"   [WARNING] Failed to inject Shadow Model features: {e}")
-        df['predicted_cancel_rate'] = 0
-
-    print("Generating features for XGBoost...")
-
-    # A. 时间特征 (Time Components)
-    df['day_of_week'] = df['ds'].dt.dayofweek
-    df['month'] = df['ds'].dt.month
-    df['year'] = df['ds'].dt.year
-    df['day_of_year'] = df['ds'].dt.dayofyear
-    df['week_of_year'] = df['ds'].dt.isocalendar().week.astype(int)
-    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-
-    df['lag_7'] = df['y'].shift(7).fillna(method='bfill')
-    df['lag_364'] = df['y'].shift(364).fillna(method='bfill')
-
-    # C. 业务特征 (Business Logic)
-    match_month = df['ds'].dt.month.isin([1, 2, 9, 10])
-    match_day = df['ds'].dt.dayofweek.isin([1, 2]) # Tue, Wed
-    df['is_off_peak_workday'] = (match_month & match_day).astype(int)
-
-    # History Lags
-    df['y_lag_7'] = df['y'].shift(7).fillna(method='bfill')
-
-    # [NEW] Hybrid Lag Strategy (Aligned Seasonality)
-    df['lag_364'] = df['y'].shift(364).fillna(method='bfill')
-
-    # Vectorized implementation using numpy
-    import numpy as np
-
-    # Create a 'lag_365' for fixed comparison
-    df['lag_365'] = df['y'].shift(365).fillna(method='bfill')
-
-    fixed_date_holidays = [
-        "New Year's Day", 
-        "Independence Day", 
-        "Veterans Day", 
-        "Christmas Day"
-    ]
-
-    df['is_fixed_holiday'] = 0
-    mask_fixed = df['ds'].apply(lambda d: 
-        (d.month == 1 and d.day == 1) or
-        (d.month == 7 and d.day == 4) or
-        (d.month == 11 and d.day == 11) or
-        (d.month == 12 and d.day == 25)
-    )
-    df.loc[mask_fixed, 'is_fixed_holiday'] = 1
-
-    # Apply Vectorized Swap
-    df['lag_364'] = np.where(df['is_fixed_holiday'] == 1, df['lag_365'], df['lag_364'])
-
-    # Clean up temp cols
-    df.drop(columns=['lag_365', 'is_fixed_holiday'], inplace=True)
-
-    df['throughput_lag_7'] = df['y_lag_7'] # Alias for consistency
-    # df['flight_lag_1'] = 0
-    # df['flight_ma_7'] = 0
-
-    # [NEW] Whitelist & Clamping Logic for Historical Data
-    print("   Calculating holiday distances for training data (Using Unified Tier 1/2 List)...")
-    from src.utils.holiday_utils import TARGET_HOLIDAYS, get_us_holidays
-    
-    # Load raw holidays to get dates
-    us_holidays = get_us_holidays(2019, 2030)
-
-    major_holiday_dates = []
-
-    # 1. Add Standard Federal Holidays (Filtered by Whitelist)
-    for date, name in us_holidays.items():
-        if any(target in name for target in TARGET_HOLIDAYS):
-            major_holiday_dates.append(pd.Timestamp(date))
+        print(f"Error building feature matrix: {e}")
+        raise
+    clock.lap('feature_matrix')
 
-    # 2. Add Good Friday (Easter - 2 days)
-    from dateutil.easter import easter
-    for y in range(2019, 2030):
-        try:
-            easter_date = easter(y)
-            good_friday = pd.Timestamp(easter_date) - pd.Timedelta(days=2)
-            major_holiday_dates.append(good_friday)
-        except: pass
-
-    # Remove duplicates and sort
-    major_holiday_dates = sorted(list(set(major_holiday_dates)))
-
-    df['days_to_nearest_holiday'] = 15 # Default
-    
-    # Optimize loop? For now keep iterative as it works
-    for idx, row in df.iterrows():
-        d = row['ds']
-        min_dist = 999 
-        best_dist = 15
-        for h_date in major_holiday_dates:
-            diff_days = (d - h_date).days
-            if abs(diff_days) < abs(min_dist):
-                min_dist = diff_days
-                best_dist = diff_days
-        
-        # Clamp logic: +/- 14 window
-        if best_dist > 14: best_dist = 15
-        elif best_dist < -14: best_dist = -15
-        df.at[idx, 'days_to_nearest_holiday'] = best_dist
-
-    # [NEW] Spring Break Logic
-    df['is_spring_break'] = 0
-    mask_sb = (df['ds'].dt.month.isin([3, 4])) & (df['ds'].dt.dayofweek.isin([5, 6])) & (df['is_holiday'] == 0)
-    df.loc[mask_sb, 'is_spring_break'] = 1
-
-    # [NEW] Weather Rebound Logic (Revenge Travel Index)
-    # Logic: Higher past weather indices = Higher current pent-up demand
-    # revenge_index = 0.5*w_lag_1 + 0.3*w_lag_2 + 0.2*w_lag_3
-    df['w_lag_1'] = df['weather_index'].shift(1).fillna(0)
-    df['w_lag_2'] = df['weather_index'].shift(2).fillna(0)
-    df['w_lag_3'] = df['weather_index'].shift(3).fillna(0)
-    df['revenge_index'] = (df['w_lag_1'] * 0.5) + (df['w_lag_2'] * 0.3) + (df['w_lag_3'] * 0.2)
-    
-    # [NEW] Long Weekend Logic
-    df['is_long_weekend'] = 0
-    mask_long = (df['is_holiday'] == 1) & (df['day_of_week'].isin([0, 4]))
-    df.loc[mask_long, 'is_long_weekend'] = 1
-
-    df['lag_7_adjusted'] = df['lag_7'] * (1 - df['predicted_cancel_rate'])
-    df['lag_364_adjusted'] = df['lag_364'] * (1 - df['predicted_cancel_rate'])
-    # [NEW] Fear Feature (Look-Ahead - Anticipation)
-    df['lead_1_shadow_cancel_rate'] = df['predicted_cancel_rate'].shift(-1).fillna(0)
+    if df.empty:
+        raise RuntimeError("Traffic data is empty. Aborting training.")
 
     # D. 填充缺失值
     features = FEAT_HYBRID
 
-    # Ensure cols exist
-    for col in features:
-        if col not in df.columns:
-            df[col] = 0
-
     # 丢弃无法计算 lag_364 的早期数据
     df_model = df.dropna(subset=['lag_364']).copy()
     for col in features:
         df_model[col] = df_model[col].fillna(0)
 
+    if mode == 'validate':
+        run_validation(df_model, features)
+        clock.lap('validation')
+    elif mode == 'production':
+        run_production(df, df_model, features, clock, warm_start=warm_start, refit_every=refit_every)
+    else:
+        # both: 验证拟合放到独立进程，与生产拟合并行；两边各用一半核心，避免线程过度订阅
+        half = max(1, (os.cpu_count() or 2) // 2)
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            validation = pool.submit(run_validation, df_model, features, half)
+            run_production(df, df_model, features, clock, warm_start=warm_start,
+                           refit_every=refit_every, n_jobs=half)
+            try:
+                validation.result()
+            except Exception as e:
+                print(f"ERROR in validation process: {e}")
+                raise
+        clock.lap('await_validation')
+
+    clock.summary()
+
+def _pandemic_mask(df_model):
+    return (df_model['ds'] >= PANDEMIC_START) & (df_model['ds'] <= PANDEMIC_END)
+
+@span('train_xgb.validation')
+def run_validation(df_model, features, n_jobs=-1):
+    """
+    验证模式: 在截止日前的数据上训练，对 2026-01-01 之后的数据计算 MAPE，写出 xgb_validation.csv。
+    返回 MAPE (测试集为空时返回 None)。可在独立进程中执行。
+    """
     # 3. 划分训练集与测试集 (Backtest Strategy)
-    pandemic_start = pd.Timestamp('2020-03-01')
-    pandemic_end = pd.Timestamp('2021-12-31')
-    train_cutoff = pd.Timestamp('2025-12-31')
-
-    mask_train_period = (df_model['ds'] <= train_cutoff)
-    mask_pandemic = (df_model['ds'] >= pandemic_start) & (df_model['ds'] <= pandemic_end)
-
-    train_df = df_model[mask_train_period & (~mask_pandemic)]
+    mask_train_period = (df_model['ds'] <= VALIDATION_TRAIN_CUTOFF)
+    train_df = df_model[mask_train_period & (~_pandemic_mask(df_model))]
 
     # 测试集: 2026-01-01 ~ 2026-01-13 (或最近)
-    test_start = pd.Timestamp('2026-01-01')
+    test_start = VALIDATION_TEST_START
     test_end = pd.Timestamp('2026-01-13') # Fixed range for backtest
     
     # Dynamic test end?
@@ -276,25 +204,16 @@ def run():
     y_train = train_df['y']
 
     X_test = test_df[features]
-    y_test = test_df['y']
 
-    print(f"Training XGBoost on {len(X_train)} rows...")
-    print(f"Testing on {len(X_test)} rows ({test_start.date()} ~ {test_end.date()})")
+    print(f"[VALIDATE] Training XGBoost on {len(X_train)} rows...")
+    print(f"[VALIDATE] Testing on {len(X_test)} rows ({test_start.date()} ~ {test_end.date()})")
 
     # 4. 训练模型
-    model = XGBRegressor(
-        n_estimators=1000,
-        learning_rate=0.05,
-        max_depth=5,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        n_jobs=-1,
-        random_state=42
-    )
-
+    model = XGBRegressor(**{**VALIDATION_PARAMS, 'n_jobs': n_jobs})
     model.fit(X_train, y_train)
 
     # 5. 预测与评估
+    mape = None
     if not X_test.empty:
         y_pred = model.predict(X_test)
         test_df['yhat_xgb'] = y_pred
@@ -313,287 +232,61 @@ def run():
         })
         validation_df.to_csv("xgb_validation.csv", index=False)
         print("Validation results saved to xgb_validation.csv")
+    return mape
 
+def run_production(df, df_model, features, clock, warm_start=False, refit_every=DEFAULT_REFIT_EVERY, n_jobs=-1):
+    """生产模式: 全量重训 -> 保存模型 -> 预测未来 14 天 -> 写入 prediction_history"""
     # ==========================================
-    # 7. 部署模式: 预测未来 5 天 (Production Forecast)
+    # 7. 部署模式: 预测未来 FORECAST_HORIZON_DAYS 天 (Production Forecast)
     # ==========================================
-    print("\n[FORECAST] Generating Future Forecast (Next 7 Days)...")
+    print(f"\n[FORECAST] Generating Future Forecast (Next {FORECAST_HORIZON_DAYS} Days)...")
 
     # [CRITICAL UPDATE] Retrain on FULL DATA
     print("   [RETRAIN] Retraining model on ALL available history (2019-Present)...")
-    mask_full_train = (~mask_pandemic) & (df_model['y'].notnull())
+    mask_full_train = (~_pandemic_mask(df_model)) & (df_model['y'].notnull())
     full_train_df = df_model[mask_full_train]
 
     X_full = full_train_df[features]
     y_full = full_train_df['y']
 
-    model_full = XGBRegressor(
-        n_estimators=1200, 
-        learning_rate=0.05,
-        max_depth=5,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        n_jobs=-1,
-        random_state=42
-    )
-    model_full.fit(X_full, y_full)
+    model_full, forecast_meta = fit_forecast_model(X_full, y_full, full_train_df['ds'].max(),
+                                    warm_start=warm_start, refit_every=refit_every, n_jobs=n_jobs)
     print(f"   Full Model Trained on {len(full_train_df)} rows.")
         
     print(f"   [PERSISTENCE] Saving forecast model to {FORECAST_MODEL_PATH}...")
     model_full.save_model(FORECAST_MODEL_PATH)
+    save_forecast_meta(forecast_meta, features, full_train_df['ds'].max())
     print("   [PERSISTENCE] Model saved successfully.")
+    clock.lap('fit_full')
 
     # 找到最后一条"真实有数据"的日期
-    last_actual_row = df[df['y'].notnull()].iloc[-1]
-    last_actual_date = last_actual_row['ds']
+    last_actual_date = df.loc[df['y'].notnull(), 'ds'].max()
     print(f"Last Actual Data Date: {last_actual_date.date()}")
 
     # 从"有数据"的后一天开始预测
-    print("   [DEBUG] STARTING FORECAST GENERATION PHASE")
+    # [ARCH] 未来 14 天的特征与历史在同一个矩阵中、用同一套向量化逻辑计算 (Feature Store 已追加未来骨架)，
+    # 推理只是对该矩阵的切片，保证 train/serve 一致。
     try:
-        print("   [DEBUG] Generating future_dates...")
-        future_dates = pd.date_range(start=last_actual_date + pd.Timedelta(days=1), periods=14)
-        print(f"   [DEBUG] Generated {len(future_dates)} days: {future_dates[0]} to {future_dates[-1]}")
-
-        # 构建未来特征 DataFrame
-        future_df = pd.DataFrame({'ds': future_dates})
-
-        # A. 时间特征
-        future_df['day_of_week'] = future_df['ds'].dt.dayofweek
-        future_df['month'] = future_df['ds'].dt.month
-        future_df['year'] = future_df['ds'].dt.year
-        future_df['day_of_year'] = future_df['ds'].dt.dayofyear
-        future_df['week_of_year'] = future_df['ds'].dt.isocalendar().week.astype(int)
-        future_df['is_weekend'] = future_df['day_of_week'].isin([5, 6]).astype(int)
-
-        # B. 滞后特征 (Lags)
-        def get_lag_value(target_date, lag_days):
-            past_date = target_date - pd.Timedelta(days=lag_days)
-            row = df[df['ds'] == past_date]
-            if not row.empty:
-                return row.iloc[0]['y']
-            else:
-                return 0 # Fallback
-
-        future_df['lag_7'] = future_df['ds'].apply(lambda x: get_lag_value(x, 7))
-        future_df['lag_364'] = future_df['ds'].apply(lambda x: get_lag_value(x, 364))
-
-        # C. 业务特征
-        match_month = future_df['ds'].dt.month.isin([1, 2, 9, 10])
-        match_day = future_df['ds'].dt.dayofweek.isin([1, 2])
-        future_df['is_off_peak_workday'] = (match_month & match_day).astype(int)
-
-        # D. 外部特征 (Real Holiday Logic)
-        print("   Generating Future Holiday Features (Unified Utils)...")
-        from src.utils.holiday_utils import get_holiday_features, TARGET_HOLIDAYS, get_us_holidays
-        
-        # 1. Generate Flags (is_holiday, etc)
-        h_feats = get_holiday_features(future_df['ds'])
-        for c in h_feats.columns:
-            future_df[c] = h_feats[c].values
-            
-        # 2. Generate Distance (days_to_nearest_holiday)
-        # Using unified TARGET_HOLIDAYS
-        us_holidays = get_us_holidays(2025, 2030) # Future range
-        major_holiday_dates = []
-        for date, name in us_holidays.items():
-            if any(target in name for target in TARGET_HOLIDAYS):
-                major_holiday_dates.append(pd.Timestamp(date))
-                
-        from dateutil.easter import easter
-        unique_years = future_df['ds'].dt.year.unique()
-        for y in unique_years:
-            try:
-                easter_date = easter(y)
-                good_friday = pd.Timestamp(easter_date) - pd.Timedelta(days=2)
-                major_holiday_dates.append(good_friday)
-            except: pass
-            
-        major_holiday_dates = sorted(list(set(major_holiday_dates)))
-        
-        future_df['days_to_nearest_holiday'] = 15 
-        for idx, row in future_df.iterrows():
-            d = row['ds']
-            min_dist = 999 
-            best_dist = 15 
-            for h_date in major_holiday_dates:
-                diff_days = (d - h_date).days
-                if abs(diff_days) < abs(min_dist):
-                    min_dist = diff_days
-                    best_dist = diff_days
-            
-            if best_dist > 14: best_dist = 15
-            elif best_dist < -14: best_dist = -15
-            future_df.at[idx, 'days_to_nearest_holiday'] = best_dist
-            
-        # [NEW] Long Weekend Logic (Vectorized)
-        future_df['is_long_weekend'] = 0
-        mask_long = (future_df['is_holiday'] == 1) & (future_df['ds'].dt.dayofweek.isin([0, 4]))
-        future_df.loc[mask_long, 'is_long_weekend'] = 1
-
-        # [FIX] Load Real Weather Forecast
-        print("   Merging Real Weather Forecast (from DB)...")
-        try:
-            conn_w = sqlite3.connect(DB_PATH)
-            df_weather = pd.read_sql("SELECT date, weather_index FROM daily_weather_index", conn_w)
-            conn_w.close()
-            
-            df_weather['date'] = pd.to_datetime(df_weather['date'])
-            future_df = future_df.merge(df_weather[['date', 'weather_index']], left_on='ds', right_on='date', how='left')
-            future_df['weather_index'] = future_df['weather_index'].fillna(0).astype(int)
-            if 'date' in future_df.columns:
-                future_df.drop(columns=['date'], inplace=True)
-        except Exception as e:
-            print(f"   WARNING: Failed to load weather features ({e}). Defaulting to 0.")
-            future_df['weather_index'] = 0
-
-        future_df['weather_lag_1'] = future_df['weather_index'].shift(1).fillna(0)
-        # Patch first row weather lag
-        try:
-            if len(df) > 0:
-                future_df.at[0, 'weather_lag_1'] = df.iloc[-1]['weather_index']
-        except: pass
-
-        # [NEW] Flight Stats Removed
-        # print("   OpenSky Flight Stats Removed...")
-        future_df['flight_ma_7'] = 0
-        future_df['flight_lag_1'] = 0
-        
-        # [NEW] Calculate Future Revenge Index
-        # Access daily_weather_index for lags
-        try:
-            conn_rev = sqlite3.connect(DB_PATH)
-            # Pre-fetch weather history dict for fast lookup
-            w_history_df = pd.read_sql("SELECT date, weather_index FROM daily_weather_index", conn_rev)
-            conn_rev.close()
-            w_history_df['date'] = pd.to_datetime(w_history_df['date'])
-            w_map = w_history_df.set_index('date')['weather_index'].to_dict()
-            
-            def get_w(d): return w_map.get(d, 0)
-            
-            # vectorized apply is dangerous with dict lookup if huge, but here fine
-            future_df['w_lag_1'] = future_df['ds'].apply(lambda d: get_w(d - pd.Timedelta(days=1)))
-            future_df['w_lag_2'] = future_df['ds'].apply(lambda d: get_w(d - pd.Timedelta(days=2)))
-            future_df['w_lag_3'] = future_df['ds'].apply(lambda d: get_w(d - pd.Timedelta(days=3)))
-            
-            future_df['revenge_index'] = (future_df['w_lag_1'] * 0.5) + \
-                                         (future_df['w_lag_2'] * 0.3) + \
-                                         (future_df['w_lag_3'] * 0.2)
-        except Exception as e:
-             print(f"Failed to calc future revenge index: {e}")
-             future_df['revenge_index'] = 0
-
-        # Real Spring Break
-        future_df['is_spring_break'] = 0
-        mask_sb = (future_df['ds'].dt.month.isin([3, 4])) & \
-                  (future_df['ds'].dt.dayofweek.isin([5, 6])) & \
-                  (future_df['is_holiday'] == 0)
-        future_df.loc[mask_sb, 'is_spring_break'] = 1
-
-        # E. [NEW] Inject Shadow Model for Future
-        if 'predicted_cancel_rate' in features:
-             try:
-                 # We already loaded df_weather from DB in previous block (lines 406+)
-                 # But we need aggregated features, not just 'weather_index'.
-                 # We need to re-fetch/re-calculate aggregated features for future dates.
-                 # Since 'load_and_prep' reads from DB, we can just merge again if DB has forecast weather in 'weather' table.
-                 
-                 # Optimization: Re-use the df_weather_agg we calculated earlier if possible, 
-                 # OR re-run get_aggregated_weather_features to get distinct future rows
-                 
-                 conn_shadow_future = sqlite3.connect(DB_PATH)
-                 df_weather_agg_future = get_aggregated_weather_features(conn_shadow_future)
-                 conn_shadow_future.close()
-                 
-                 # Predict
-                 X_shadow_f = df_weather_agg_future[shadow_features].fillna(0)
-                 df_weather_agg_future['predicted_cancel_rate'] = shadow_model.predict(X_shadow_f)
-                 
-                 # Merge
-                 future_df = future_df.merge(df_weather_agg_future[['date', 'predicted_cancel_rate']], left_on='ds', right_on='date', how='left')
-                 
-                 # Fill NaNs
-                 future_df['predicted_cancel_rate'] = future_df['predicted_cancel_rate'].fillna(0)
-                 
-                 if 'date' in future_df.columns: future_df.drop(columns=['date'], inplace=True)
-                 
-                 print(f"   [Shadow Model] Forecast injection complete for future dates.")
-                 
-             except Exception as e:
-                 print(f"   [WARNING] Future Shadow Injection failed: {e}")
-                 future_df['predicted_cancel_rate'] = 0
-        else:
-             future_df['predicted_cancel_rate'] = 0
-        
-        # [NEW] Generate Interaction Features for Future
-        future_df['lag_7_adjusted'] = future_df['lag_7'] * (1 - future_df['predicted_cancel_rate'])
-        future_df['lag_364_adjusted'] = future_df['lag_364'] * (1 - future_df['predicted_cancel_rate'])
+        future_df = get_forecast_slice(df, FORECAST_HORIZON_DAYS)
+        print(f"   Forecast window: {len(future_df)} days, "
+              f"{future_df['ds'].min().date()} to {future_df['ds'].max().date()}")
+        if future_df.empty:
+            raise RuntimeError("No future rows in the feature matrix. Run merge_db first.")
+        clock.lap('future_features')
 
         # F. 预测
         X_future = future_df[features]
-        # Ensure all columns exist
-        for col in features:
-             if col not in X_future.columns: X_future[col] = 0
-
         y_future_pred = model_full.predict(X_future)
         future_df['predicted_throughput'] = y_future_pred.astype(int)
 
-        # [NEW] Blind Flight Protocol (Tuned Weather Circuit Breaker + Hangover Rule)
+        # [NEW] Blind Flight Protocol (Tuned Weather Circuit Breaker + Hangover Rule, Scheme B: Dynamic Floor)
+        # w_lag_1 / weather_index / lead_1_shadow_cancel_rate 均已在特征矩阵中
         print("   [POST-PROCESS] Applying Blind Flight Protocol...")
-        
-        # We need w_lag_1 (Yesterday's Weather Index)
-        # Since future_df is small and contiguous, simple shift works IF we have context.
-        # But for robustness, let's just use a simple lookup since we have df_weather_agg earlier.
-        # Assuming df_weather still exists in memory (it does).
-        
-        def get_lag_weather(date_obj):
-            yesterday = date_obj - pd.Timedelta(days=1)
-            # Find in df_weather_agg if possible, or future_df
-            # Note: df_weather_agg has 'date' column as datetime
-            # We need to make sure we can find it.
-            # Simplified: just use what we have.
-            return 0 # Placeholder if complex lookup fails
-            
-        # Better approach: Vectorized shift on effective full range?
-        # Let's rely on the fact that we ran get_aggregated_weather_features and merge.
-        # Actually, let's just do a manual lookup in the loop for robustness.
-        
-        # [NEW] Prepare w_lag_1 for future_df
-        # We can re-fetch previous day's weather from DB for the first row of future_df
-        # But for now, let's assume we are predicting a sequence.
-        # Let's simple use the 'weather_index' col and shift it, filling first with last known.
-        
-        # Hack: Since we are running this usually for "Next 7 Days", we likely have today's weather in DB.
-        # Let's try to map 'w_lag_1' by joining.
-        
-        # [NEW] Applying Blind Flight Protocol (Scheme B: Dynamic Floor)
         future_df['predicted_throughput'] = future_df.apply(
             lambda row: apply_blind_protocol(row['predicted_throughput'], row, baseline_pred=row.get('lag_7', 0)), 
             axis=1
         )
-        
-        # We need to ensure 'w_lag_1' is in future_df
-        # Let's pull it from the DB for accuracy
-        conn_temp = sqlite3.connect(DB_PATH)
-        df_w_hist = pd.read_sql("SELECT date, weather_index FROM daily_weather_index", conn_temp)
-        conn_temp.close()
-        df_w_hist['ds'] = pd.to_datetime(df_w_hist['date'])
-        # df_w_hist['w_lag_1_ref'] = df_w_hist['weather_index'].shift(1).fillna(0) 
-
-        # Efficient Join for Lag 1
-        df_w_hist['next_day'] = df_w_hist['ds'] + pd.Timedelta(days=1)
-        future_df = future_df.merge(df_w_hist[['next_day', 'weather_index']], 
-                                   left_on='ds', right_on='next_day', how='left')
-        future_df.rename(columns={'weather_index_y': 'w_lag_1'}, inplace=True)
-        if 'weather_index_x' in future_df.columns: future_df.rename(columns={'weather_index_x': 'weather_index'}, inplace=True)
-        def fix_cols(df):
-             if 'next_day' in df.columns: df.drop(columns=['next_day'], inplace=True)
-             df['w_lag_1'] = df['w_lag_1'].fillna(0)
-             return df
-        future_df = fix_cols(future_df)
-
-        # (Already applied above with Scheme B logic)
-        # future_df['predicted_throughput'] = future_df.apply(apply_blind_protocol, axis=1)
+        future_df['w_lag_1'] = future_df['w_lag_1'].fillna(0)
 
         # 保存预测结果
         future_df[['ds', 'predicted_throughput']].to_csv("xgb_forecast.csv", index=False)
@@ -601,6 +294,8 @@ def run():
         print("\n[FORECAST RESULTS] Future Forecast:")
         print(future_df[['ds', 'predicted_throughput', 'w_lag_1', 'lead_1_shadow_cancel_rate']].to_string(index=False)) # Show all
         
+        clock.lap('predict')
+
         # [NEW] Save to Persistent History Log (SQLite)
         today_str = pd.Timestamp.now().strftime('%Y-%m-%d')
 
@@ -612,36 +307,10 @@ def run():
         new_log['target_date'] = new_log['target_date'].dt.strftime('%Y-%m-%d')
 
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Delete dupes for same run date
-            dt_list = new_log['target_date'].tolist()
-            cursor.executemany("DELETE FROM prediction_history WHERE target_date = ? AND model_run_date = ?", 
-                               [(d, today_str) for d in dt_list])
-            
-            records = []
-            for _, row in new_log.iterrows():
-                records.append({
-                    'target_date': str(row['target_date']),
-                    'predicted_throughput': int(row['predicted_throughput']),
-                    'model_run_date': str(row['model_run_date']),
-                    'weather_index': int(row.get('weather_index', 0)),
-                    'is_holiday': int(row.get('is_holiday', 0)),
-                    'flight_volume': int(row.get('flight_volume', 0)), 
-                    'is_weekend': int(row.get('is_weekend', 0))
-                })
-            
-            cursor.executemany('''
-                INSERT INTO prediction_history (
-                    target_date, predicted_throughput, model_run_date, 
-                    weather_index, is_holiday, flight_volume, is_weekend
-                )
-                VALUES (
-                    :target_date, :predicted_throughput, :model_run_date,
-                    :weather_index, :is_holiday, :flight_volume, :is_weekend
-                )
-            ''', records)
+            conn = get_connection()
+            ensure_schema(conn)
+            # [NEW] prediction_history + prediction_latest + 版本号在同一事务内写入 (src/db/predictions.py)
+            log_predictions(conn, new_log)
             
             conn.commit()
             conn.close()
@@ -649,11 +318,20 @@ def run():
             
         except Exception as e:
             print(f"ERROR logging to database: {e}")
+            raise
+        clock.lap('log_predictions')
 
     except Exception as e:
         print(f"   [CRITICAL ERROR] Forecast Generation Failed: {e}")
-        import traceback
-        traceback.print_exc()
+        raise
 
 if __name__ == "__main__":
-    run()
+    import argparse
+    parser = argparse.ArgumentParser(description='XGBoost 训练与预测')
+    parser.add_argument('--mode', choices=TRAIN_MODES, default='both',
+                        help='validate: 仅验证集 MAPE; production: 仅全量重训+预测; both: 两者并行 (默认)')
+    parser.add_argument('--warm-start', action='store_true', help='在已保存的生产模型上继续 boosting，而不是从零训练')
+    parser.add_argument('--refit-every', type=int, default=DEFAULT_REFIT_EVERY,
+                        help=f'warm-start 模式下每 N 次运行完整重训一次 (默认: {DEFAULT_REFIT_EVERY})')
+    args = parser.parse_args()
+    run(mode=args.mode, warm_start=args.warm_start, refit_every=args.refit_every)
@@ -1,41 +1,170 @@
 import sys
 import os
 import time
+import datetime
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 # Ensure src is in path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.db import ensure_schema, get_connection
 from src.etl import build_tsa_db, fetch_polymarket, get_weather_features, merge_db
 from src.models import train_xgb
 
-def run_all():
+# ==========================================
+# Pipeline DAG
+# ==========================================
+# 每个步骤声明输入 (上游 changeset 名) 与输出 (本步骤产生的 changeset 名)。
+# - 没有输入的步骤 (抓取) 彼此独立，并发执行
+# - 有输入的步骤在所有上游完成后执行；上游 changeset 全部为空时跳过 (force=True 时照常执行)
+# - 上游全部失败时下游标记为 blocked；部分抓取失败时下游照常按其余 changeset 判断
+# 步骤函数接收 {changeset 名: 值} 并返回本步骤的 changeset (日期列表 / 计数；空 = 无变化)，
+# 声明了输出的步骤返回 None 视为失败 (get_weather_features.run 内部捕获异常后返回 None)；
+# 没有输出的步骤 (train) 以异常表示失败 (train_xgb.run 任何阶段失败都会抛出)。
+# 并发的抓取步骤写同一个 SQLite 文件: "先读后写" 的写事务均以 BEGIN IMMEDIATE 开启 (src.db.begin_immediate)，
+# 写锁按 busy_timeout 排队，不会因 WAL 快照过期直接报 "database is locked"。
+
+STATUS_OK = 'ok'
+STATUS_SKIPPED = 'skipped'
+STATUS_FAILED = 'failed'
+STATUS_BLOCKED = 'blocked'
+
+# 并发抓取的最大步骤数
+MAX_PARALLEL_STEPS = 3
+
+class Step:
+    def __init__(self, name, label, func, inputs=(), output=None):
+        self.name = name
+        self.label = label
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.output = output
+
+def build_steps():
+    return [
+        Step('tsa', "Fetch TSA Data",
+             lambda changes: build_tsa_db.run(latest=True), output='traffic'),
+        Step('weather', "Sync Weather",
+             lambda changes: get_weather_features.run(), output='weather'),
+        Step('market', "Fetch Market",
+             lambda changes: fetch_polymarket.run(recent=True)['written'], output='market'),
+        Step('merge', "Merge DB",
+             lambda changes: merge_db.run(changed_dates=changes.get('traffic')),
+             inputs=('traffic', 'weather'), output='traffic_full'),
+        # 原始天气 (影子模型取消率) 也是训练特征的输入
+        Step('train', "Train Model",
+             lambda changes: train_xgb.run(), inputs=('traffic_full', 'weather')),
+    ]
+
+def _producers(steps):
+    return {s.output: s for s in steps if s.output}
+
+def _size(changeset):
+    if changeset is None:
+        return None
+    return changeset if isinstance(changeset, int) else len(changeset)
+
+def save_step(conn, run_id, name, result):
+    with conn:
+        conn.execute(
+            "INSERT INTO pipeline_runs (run_id, step, status, started_at, finished_at, seconds, changed, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, name, result['status'], result.get('started_at'), result.get('finished_at'),
+             result.get('seconds'), result.get('changed'), result.get('error'))
+        )
+
+def _execute(step, changes):
+    started = datetime.datetime.now()
+    t0 = time.perf_counter()
+    result = {'started_at': started.strftime('%Y-%m-%d %H:%M:%S')}
+    try:
+        result['changeset'] = step.func(changes)
+        if step.output and result['changeset'] is None:
+            raise RuntimeError("step returned no changeset")
+        result['status'] = STATUS_OK
+        result['changed'] = _size(result['changeset'])
+    except (Exception, SystemExit) as e:   # 步骤内的 sys.exit() 也只记为失败
+        traceback.print_exc()
+        result['status'] = STATUS_FAILED
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - t0, 3)
+    result['finished_at'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return result
+
+def run_dag(steps, force=False, max_workers=MAX_PARALLEL_STEPS, db_path=None):
+    """
+    按依赖关系执行步骤，每个步骤完成后写入 pipeline_runs。
+    返回 {step name: result}，result 含 status / seconds / changed / error。
+    """
+    producers = _producers(steps)
+    run_id = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    changes, results = {}, {}
+    pending = {s.name: s for s in steps}
+    running = {}
+
+    conn = get_connection(db_path)
+    try:
+        ensure_schema(conn)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pipeline') as pool:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    upstream = [producers[i].name for i in step.inputs if i in producers]
+                    if any(u not in results for u in upstream):
+                        continue
+                    del pending[name]
+                    if upstream and all(results[u]['status'] in (STATUS_FAILED, STATUS_BLOCKED) for u in upstream):
+                        results[name] = {'status': STATUS_BLOCKED}
+                        print(f"\n⛔ {step.label}: 上游全部失败，未执行", flush=True)
+                    elif step.inputs and not force and not any(changes.get(i) for i in step.inputs):
+                        results[name] = {'status': STATUS_SKIPPED}
+                        print(f"\n⏭️  {step.label}: 上游无变化 ({', '.join(step.inputs)})，跳过", flush=True)
+                    else:
+                        print(f"\n👉 {step.label}...", flush=True)
+                        running[pool.submit(_execute, step, dict(changes))] = step
+                        continue
+                    save_step(conn, run_id, name, results[name])
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    result = future.result()
+                    results[step.name] = result
+                    if step.output and result['status'] == STATUS_OK:
+                        changes[step.output] = result['changeset']
+                    if result['status'] == STATUS_OK:
+                        print(f"   ✅ {step.label} Completed in {result['seconds']:.1f}s "
+                              f"(changes: {result['changed'] if result['changed'] is not None else '-'})", flush=True)
+                    else:
+                        print(f"   ❌ {step.label} FAILED: {result['error']}", flush=True)
+                    save_step(conn, run_id, step.name, result)
+    finally:
+        conn.close()
+    return results
+
+def run_all(force=False):
     print("🚀 [Mikon AI] Starting Headless Pipeline...", flush=True)
     start_time = time.time()
-    
-    steps = [
-        ("1. Fetch TSA Data", build_tsa_db.run, {'latest': True}),
-        ("2. Sync Weather", get_weather_features.run, {}),
-        ("3. Sync Flights (Skipped)", lambda **k: None, {}),
-        ("4. Fetch Market", fetch_polymarket.run, {'recent': True}),
-        ("5. Merge DB", merge_db.run, {}),
-        ("6. Train Model", train_xgb.run, {})
-    ]
-    
-    for name, func, kwargs in steps:
-        print(f"\n👉 {name}...", flush=True)
-        try:
-            func(**kwargs)
-            print(f"   ✅ {name} Completed.")
-        except Exception as e:
-            print(f"   ❌ {name} FAILED: {e}", flush=True)
-            # Fail fast or continue? User prefers defined reliability. 
-            # If TSA or Merge fails, pipeline is broken.
-            # If Market/Flight fails, maybe recoverable?
-            # For n8n, usually better to fail hard so we get notified.
-            sys.exit(1)
-            
+
+    results = run_dag(build_steps(), force=force)
+
     elapsed = time.time() - start_time
+    print(f"\n{'Step':<10}{'Status':<10}{'Seconds':>9}{'Changes':>9}")
+    for name, r in results.items():
+        changed = r.get('changed')
+        print(f"{name:<10}{r['status']:<10}{r.get('seconds', 0):>9.1f}{'-' if changed is None else changed:>9}")
+
+    if any(r['status'] in (STATUS_FAILED, STATUS_BLOCKED) for r in results.values()):
+        # For n8n, usually better to fail hard so we get notified.
+        print(f"\n❌ Pipeline Finished With Failures in {elapsed:.1f}s", flush=True)
+        sys.exit(1)
     print(f"\n✨ Pipeline Finished Successfully in {elapsed:.1f}s", flush=True)
 
 if __name__ == "__main__":
-    run_all()
+    parser = argparse.ArgumentParser(description="Headless ETL + training pipeline")
+    parser.add_argument('--force', action='store_true', help='Run merge / train even when upstream changesets are empty')
+    args = parser.parse_args()
+    run_all(force=args.force)
@@ -0,0 +1,273 @@
+"""
+Job Queue (后台任务子系统)
+
+- 有界线程池: 同时最多 MAX_WORKERS 个后台任务，其余排队。
+- Single-flight: 同一 job_type 同一时间只允许一个排队/运行中的任务，重复提交直接返回已有的 job_id (合并)。
+- 互斥区: 不同 job_type 的任务若写同一资源 (例如都会重训生产模型)，在 jobs.exclusive(key) 内串行执行。
+- 状态持久化: 每个任务的 status / progress / message / duration / result 写入 SQLite `jobs` 表，
+  Flask 重启后仍可查询。
+- 多进程: 每行记录提交进程 owner = <boot_id>:<pid>。启动时只把 owner 已退出 (pid 不存在 / 机器已重启)
+  的 queued/running 任务标记为 interrupted；同类型任务正由其他存活进程排队/运行时，提交直接返回其 job_id。
+  (互斥区 exclusive() 仍是进程内锁。)
+
+Usage:
+    from src.services.job_queue import jobs
+    job_id, created = jobs.submit('run_prediction', fn)   # fn(job) -> JSON 可序列化结果
+    jobs.get(job_id)
+
+    def fn(job):
+        with jobs.exclusive('retrain_production', job):
+            ...
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.db import begin_immediate, ensure_schema, get_connection, get_read_connection
+
+try:
+    import psutil   # 可选: 跨平台判断 pid 是否存活
+except ImportError:
+    psutil = None
+
+MAX_WORKERS = 2
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINISHED_STATUSES = ('succeeded', 'failed', 'interrupted')
+
+JOB_COLUMNS = ['job_id', 'job_type', 'status', 'progress', 'message', 'result', 'error',
+               'created_at', 'started_at', 'finished_at', 'duration_sec']
+
+
+def _now():
+    return pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _boot_id():
+    """本次开机的唯一 ID (Linux)；其他平台退回主机名 (无法识别重启，只依赖 pid 判断)"""
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except OSError:
+        return socket.gethostname()
+
+
+_BOOT_ID = _boot_id()
+
+
+def _owner():
+    # 每次取 os.getpid()：gunicorn 等在 import 之后 fork worker
+    return f"{_BOOT_ID}:{os.getpid()}"
+
+
+def _pid_alive(pid):
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name != 'posix':
+        return True   # 无法判断时保守地视为存活 (Windows 上 os.kill 会终止进程)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _other_owner_alive(owner):
+    """owner 是否为本机仍存活的其他进程；旧行 (owner 为空) / 已重启 / 本进程 pid (pid 复用) 均视为已退出"""
+    boot_id, _, pid = (owner or '').rpartition(':')
+    if boot_id != _BOOT_ID or not pid.isdigit() or int(pid) == os.getpid():
+        return False
+    return _pid_alive(int(pid))
+
+
+class Job:
+    """传给任务函数的句柄: job.progress(0.5, '正在合并...') 更新进度"""
+
+    def __init__(self, manager, job_id, job_type):
+        self.manager = manager
+        self.job_id = job_id
+        self.job_type = job_type
+
+    def progress(self, fraction, message=None):
+        self.manager._update(self.job_id, progress=round(max(0.0, min(1.0, fraction)), 3), message=message)
+
+
+class JobManager:
+    def __init__(self, db_path=None, max_workers=MAX_WORKERS):
+        self.db_path = db_path
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._active = {}   # job_type -> job_id (queued / running)
+        self._exclusive = {}   # key -> threading.Lock (跨 job_type 的互斥区)
+        self._ready = False
+
+    # ------------------------------------------
+    # Persistence
+    # ------------------------------------------
+
+    def _init_db(self):
+        if self._ready:
+            return
+        conn = get_connection(self.db_path)
+        try:
+            ensure_schema(conn)
+            with conn:
+                begin_immediate(conn)
+                rows = conn.execute("SELECT job_id, owner FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+                stale = [(_now(), job_id) for job_id, owner in rows if not _other_owner_alive(owner)]
+                conn.executemany(
+                    "UPDATE jobs SET status = 'interrupted', error = 'Server restarted before completion', "
+                    "finished_at = ? WHERE job_id = ?", stale
+                )
+        finally:
+            conn.close()
+        self._ready = True
+
+    def _update(self, job_id, **fields):
+        fields = {k: v for k, v in fields.items() if v is not None}
+        if not fields:
+            return
+        assignments = ', '.join(f"{k} = ?" for k in fields)
+        conn = get_connection(self.db_path)
+        try:
+            with conn:
+                conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_dict(row):
+        job = dict(zip(JOB_COLUMNS, row))
+        if job['result']:
+            try:
+                job['result'] = json.loads(job['result'])
+            except ValueError:
+                pass
+        return job
+
+    # ------------------------------------------
+    # Public API
+    # ------------------------------------------
+
+    def submit(self, job_type, fn, *args, **kwargs):
+        """
+        提交任务 fn(job, *args, **kwargs)。
+        返回 (job_id, created)；同类型任务已在排队/运行时 (本进程或其他存活进程) created=False，返回已有的 job_id。
+        """
+        with self._lock:
+            self._init_db()
+            existing = self._active.get(job_type)
+            if existing is not None:
+                return existing, False
+
+            job_id = uuid.uuid4().hex[:12]
+            conn = get_connection(self.db_path)
+            try:
+                # 检查 + 插入在同一个写事务内，两个进程同时提交时只有一个能插入
+                with conn:
+                    begin_immediate(conn)
+                    rows = conn.execute(
+                        "SELECT job_id, owner FROM jobs WHERE job_type = ? AND status IN ('queued', 'running') "
+                        "ORDER BY created_at DESC", (job_type,)
+                    ).fetchall()
+                    for other_id, owner in rows:
+                        if _other_owner_alive(owner):
+                            return other_id, False
+                    conn.execute(
+                        "INSERT INTO jobs (job_id, job_type, status, progress, created_at, owner) "
+                        "VALUES (?, ?, 'queued', 0, ?, ?)",
+                        (job_id, job_type, _now(), _owner())
+                    )
+            finally:
+                conn.close()
+            self._active[job_type] = job_id
+
+        self._pool.submit(self._execute, Job(self, job_id, job_type), fn, args, kwargs)
+        return job_id, True
+
+    def _execute(self, job, fn, args, kwargs):
+        t0 = time.perf_counter()
+        self._update(job.job_id, status='running', started_at=_now())
+        print(f"🧵 [Job] {job.job_type} ({job.job_id}) started")
+        try:
+            result = fn(job, *args, **kwargs)
+            self._update(job.job_id, status='succeeded', progress=1.0,
+                         result=json.dumps(result, default=str) if result is not None else None,
+                         finished_at=_now(), duration_sec=round(time.perf_counter() - t0, 2))
+            print(f"✅ [Job] {job.job_type} ({job.job_id}) succeeded in {time.perf_counter() - t0:.1f}s")
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job.job_id, status='failed', error=str(e),
+                         finished_at=_now(), duration_sec=round(time.perf_counter() - t0, 2))
+            print(f"❌ [Job] {job.job_type} ({job.job_id}) failed: {e}")
+        finally:
+            with self._lock:
+                if self._active.get(job.job_type) == job.job_id:
+                    del self._active[job.job_type]
+
+    @contextmanager
+    def exclusive(self, key, job=None):
+        """
+        跨 job_type 的互斥区: single-flight 只合并同类型任务，不同类型但写同一资源的任务在此排队。
+        需要等待时把 job 的 message 更新为等待状态 (任务仍占用一个 worker)。
+        """
+        with self._lock:
+            lock = self._exclusive.setdefault(key, threading.Lock())
+        if not lock.acquire(blocking=False):
+            if job is not None:
+                self._update(job.job_id, message=f'等待 {key} 完成...')
+            print(f"⏳ [Job] waiting for '{key}'")
+            lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def get(self, job_id):
+        """任务记录 dict；不存在时返回 None"""
+        conn = get_read_connection(self.db_path)
+        try:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        except Exception:
+            row = None
+        finally:
+            conn.close()
+        return self._row_to_dict(row) if row else None
+
+    def recent(self, job_type=None, limit=20):
+        """最近的任务 (按创建时间倒序)"""
+        sql = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+        params = []
+        if job_type:
+            sql += " WHERE job_type = ?"
+            params.append(job_type)
+        sql += " ORDER BY created_at DESC, rowid DESC LIMIT ?"
+        params.append(limit)
+        conn = get_read_connection(self.db_path)
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except Exception:
+            rows = []
+        finally:
+            conn.close()
+        return [self._row_to_dict(r) for r in rows]
+
+    def active(self):
+        with self._lock:
+            return dict(self._active)
+
+
+# 进程级单例 (Flask 使用)
+jobs = JobManager()
@@ -0,0 +1,111 @@
+"""
+Market Sentiment (Polymarket 赔率 + N 小时涨跌)
+
+每个 (target_date, outcome) 的最新价格，与 "最近一次抓取时间 - lookback" 时刻的价格相比较。
+快照表为变化点存储 (src/db/snapshots.py)，某时刻的价格 = 该时刻之前的最后一行，
+由 price_at() 在 SQLite 中按 key 做索引 as-of 查找，不再读取整段历史逐行扫描。
+"""
+import os
+import re
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.db.snapshots import SNAPSHOT_TABLE, price_at
+
+DEFAULT_LOOKBACK = '6h'
+MAX_LOOKBACK_HOURS = 24 * 7
+
+_LOOKBACK_RE = re.compile(r'^(\d+)([mhd])$')
+_UNIT_MINUTES = {'m': 1, 'h': 60, 'd': 24 * 60}
+
+KEY_COLS = ['target_date', 'outcome_label']
+
+
+def parse_lookback(label):
+    """'1h' / '6h' / '24h' / '90m' / '2d' -> pd.Timedelta；非法或超出范围时抛 ValueError"""
+    m = _LOOKBACK_RE.match((label or '').strip().lower())
+    if not m:
+        raise ValueError(f"Invalid lookback '{label}', expected e.g. 1h, 6h, 24h")
+    minutes = int(m.group(1)) * _UNIT_MINUTES[m.group(2)]
+    if minutes <= 0 or minutes > MAX_LOOKBACK_HOURS * 60:
+        raise ValueError(f"Lookback must be within (0, {MAX_LOOKBACK_HOURS}h]")
+    return pd.Timedelta(minutes=minutes)
+
+
+def canonical_lookback(label):
+    """
+    规范化 lookback 标签: 整小时 -> 'Nh'，否则 'Nm' (如 '06h' / '360m' -> '6h'，'1d' -> '24h'，'90m' -> '90m')
+    用作缓存 key 与 change_<lookback> 字段名，等价写法共享同一份缓存；非法时抛 ValueError
+    """
+    minutes = int(parse_lookback(label).total_seconds()) // 60
+    return f"{minutes // 60}h" if minutes % 60 == 0 else f"{minutes}m"
+
+
+def load_latest(conn):
+    """每个 (date, outcome) 的最新快照 (MAX(id))"""
+    return pd.read_sql("""
+        SELECT target_date, outcome_label, price as current_price, fetched_at, market_slug
+        FROM market_sentiment_snapshots
+        WHERE id IN (
+            SELECT MAX(id)
+            FROM market_sentiment_snapshots
+            GROUP BY target_date, outcome_label
+        )
+        ORDER BY target_date ASC, outcome_label ASC
+    """, conn)
+
+
+def load_reference(conn, target_dates, lookback):
+    """lookback 前的参考价格: 锚点 = 全表最近一次抓取时间 - lookback；锚点之前尚无快照的 key 取其第一条"""
+    as_of = conn.execute(f"SELECT MAX(fetched_at) FROM {SNAPSHOT_TABLE}").fetchone()[0]
+    if as_of is None:
+        return pd.DataFrame(columns=KEY_COLS + ['price'])
+    return price_at(conn, pd.Timestamp(as_of) - lookback, target_dates, fallback_first=True)
+
+
+def compute_price_changes(latest, reference):
+    """
+    latest: load_latest() 结果; reference: load_reference() 结果。
+    返回与 latest 行一一对应的涨跌 Series (没有参考价格的 key 为 0)。
+    """
+    change = pd.Series(0.0, index=latest.index)
+    if latest.empty or reference.empty:
+        return change
+    ref = latest[KEY_COLS].merge(reference[KEY_COLS + ['price']], on=KEY_COLS, how='left')
+    has_ref = ref['price'].notna().values
+    change[has_ref] = latest['current_price'].values[has_ref] - ref['price'].values[has_ref]
+    return change
+
+
+def build_market_sentiment(conn, lookback_label=DEFAULT_LOOKBACK):
+    """
+    /api/market_sentiment 的响应体: {target_date: [ {target_date, market_slug, outcome, price, change_<lookback>, fetched_at}, ... ]}
+    仅包含 TSA 官网尚未出分 (未结盘) 的日期。
+    """
+    lookback = parse_lookback(lookback_label)
+    change_field = f"change_{canonical_lookback(lookback_label)}"
+
+    # 1. 识别已结盘日期 (TSA 官网已出分)
+    resolved_dates = {row[0] for row in conn.execute("SELECT date FROM traffic WHERE throughput IS NOT NULL")}
+
+    # 2. 每个 (date, outcome) 的最新快照，剔除已结盘日期
+    latest = load_latest(conn)
+    latest = latest[~latest['target_date'].isin(resolved_dates)].reset_index(drop=True)
+
+    # 3. lookback 前的价格 (as-of 索引查找)
+    reference = load_reference(conn, latest['target_date'].unique().tolist(), lookback) if not latest.empty else pd.DataFrame()
+    changes = compute_price_changes(latest, reference)
+
+    grouped = {}
+    for row, change in zip(latest.itertuples(index=False), changes.tolist()):
+        grouped.setdefault(row.target_date, []).append({
+            'target_date': row.target_date,
+            'market_slug': row.market_slug,
+            'outcome': row.outcome_label,
+            'price': row.current_price,
+            change_field: round(change, 3),
+            'fetched_at': row.fetched_at
+        })
+    return grouped
@@ -0,0 +1,100 @@
+"""
+Response Cache (仪表盘只读接口的响应缓存)
+
+缓存键 = (接口名, 相关数据版本号, 额外键)。数据版本号由 ETL / 模型写入方在提交时 +1 (src/db/versions.py)，
+两次流水线运行之间的仪表盘刷新直接返回预序列化的 JSON 字节，不再读表 / pandas 处理。
+支持 ETag / If-None-Match -> 304。
+
+Usage:
+    @app.route('/api/data')
+    def get_data():
+        return response_cache.serve('data', ('traffic',), build_data_payload, extra=today)
+"""
+import hashlib
+import os
+import sys
+import threading
+
+from flask import Response, current_app, request
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.db import get_read_connection, get_versions
+
+
+class UncacheableResponse(Exception):
+    """builder 产生了降级 / 错误结果时抛出: 照常返回 payload，但不写入缓存"""
+
+    def __init__(self, payload, status=200):
+        super().__init__()
+        self.payload = payload
+        self.status = status
+
+
+class ResponseCache:
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._entries = {}   # endpoint -> (key, body_bytes, etag)
+        self.hits = 0
+        self.misses = 0
+
+    def _versions(self, names):
+        conn = get_read_connection(self.db_path)
+        try:
+            return tuple(sorted(get_versions(conn, names).items()))
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _serialize(payload):
+        # 与 jsonify 完全相同的字节 (紧凑分隔符 / debug 缩进 / 末尾换行)
+        return current_app.json.response(payload).get_data()
+
+    @staticmethod
+    def _respond(body, etag, status=200):
+        if status == 200 and etag and etag in request.if_none_match:
+            resp = Response(status=304)
+        else:
+            resp = Response(body, status=status, mimetype='application/json')
+        if etag:
+            resp.set_etag(etag)
+            resp.headers['Cache-Control'] = 'no-cache'   # 浏览器每次都带 If-None-Match 重新验证
+        return resp
+
+    def serve(self, endpoint, version_names, builder, extra=None):
+        """
+        命中时直接返回缓存的字节；未命中时调用 builder() 构建 payload 并序列化缓存。
+        每个 endpoint 只保留最新一份 (旧版本自动淘汰)。
+        """
+        key = (self._versions(version_names), extra)
+        with self._lock:
+            entry = self._entries.get(endpoint)
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return self._respond(entry[1], entry[2])
+
+        self.misses += 1
+        try:
+            payload = builder()
+        except UncacheableResponse as e:
+            return self._respond(self._serialize(e.payload), None, e.status)
+
+        body = self._serialize(payload)
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        with self._lock:
+            self._entries[endpoint] = (key, body, etag)
+        return self._respond(body, etag)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            endpoints = {name: {'bytes': len(body), 'etag': etag}
+                         for name, (_, body, etag) in self._entries.items()}
+        return {'hits': self.hits, 'misses': self.misses, 'entries': endpoints}
+
+
+# 进程级单例 (Flask 使用)
+response_cache = ResponseCache()
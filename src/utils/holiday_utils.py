@@ -1,7 +1,14 @@
+import os
+import tempfile
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 import holidays
 from dateutil.easter import easter
 
+from src.config import CACHE_DIR
+
 # ==========================================
 # 1. Holiday Configuration (The "Master List")
 # ==========================================
@@ -41,147 +48,178 @@ def get_holiday_features(date_series):
     Generate detailed holiday features for a given Series of dates.
     Returns a DataFrame with columns: 
     [is_holiday, is_holiday_exact_day, is_holiday_travel_window, holiday_name, is_spring_break]
+
+    Pure lookup into the int-coded calendar of get_holiday_calendar(min_year, max_year),
+    so the cost per call is a single array gather regardless of the number of holidays.
     """
     # Ensure Series for .dt accessor consistency
     dates = pd.to_datetime(date_series)
     if isinstance(dates, pd.DatetimeIndex):
         dates = dates.to_series(index=dates)
-        
-    years = dates.dt.year.unique()
-    min_year, max_year = int(min(years)), int(max(years))
-    
-    # Load Holidays
+
+    if len(dates) == 0:
+        return pd.DataFrame({c: pd.Series(dtype=object if c == 'holiday_name' else np.int64)
+                             for c in HOLIDAY_FEATURE_COLUMNS})
+
+    years = dates.dt.year
+    cal = get_holiday_calendar(int(years.min()), int(years.max()))
+
+    pos = _to_day_numbers(dates) - cal['day0']
+    code = cal['name_code'][pos]
+
+    return pd.DataFrame({
+        'is_holiday': cal['is_holiday'][pos].astype(np.int64),
+        'is_holiday_exact_day': cal['is_exact_day'][pos].astype(np.int64),
+        'is_holiday_travel_window': cal['is_travel_window'][pos].astype(np.int64),
+        'holiday_name': cal['names'][code],
+        'is_spring_break': cal['is_spring_break'][pos].astype(np.int64),
+    })
+
+# ==========================================
+# 2b. Holiday Calendar Table (per year range)
+# ==========================================
+
+HOLIDAY_FEATURE_COLUMNS = ['is_holiday', 'is_holiday_exact_day', 'is_holiday_travel_window', 'holiday_name', 'is_spring_break']
+
+# Bump when the calendar rules below change, invalidates the on-disk cache
+HOLIDAY_CALENDAR_VERSION = 1
+
+# Travel window half-width (days) per holiday tier
+TIER_WINDOW_DAYS = {'tier1': 6, 'tier2': 3}
+
+def _build_holiday_calendar(min_year, max_year):
+    """
+    Build the int-coded calendar for every day of [min_year-01-01, max_year-12-31].
+    Rules (unchanged from the original per-row implementation):
+      1. Base holiday = US federal holiday name, else Easter Sunday / Good Friday.
+      2. Exact day = base name matches TARGET_HOLIDAYS, or Good Friday.
+      3. Travel window = within +/-6 (Tier 1) or +/-3 (Tier 2, Easter, Good Friday) days
+         of a target event, excluding the event day itself. Empty names become
+         "Travel Window (<event>)", first event in calendar order wins.
+      4. Spring break = Mar/Apr weekend that is not a base holiday.
+    """
     us_holidays = get_us_holidays(min_year, max_year)
-    
-    # Pre-calculate Easter & Super Bowl for these years to avoid repeated calc
-    easter_dates = {}
-    good_fridays = {}
-    
+    day_index = pd.date_range(f"{min_year}-01-01", f"{max_year}-12-31", freq='D')
+    day0 = int(_to_day_numbers(day_index[:1])[0])
+    n = len(day_index)
+
+    names = ['']
+    name_codes = {'': 0}
+    def code_of(name):
+        if name not in name_codes:
+            name_codes[name] = len(names)
+            names.append(name)
+        return name_codes[name]
+
+    name_code = np.zeros(n, dtype=np.int32)
+    is_exact_day = np.zeros(n, dtype=np.int8)
+
+    # 1. Base holidays (federal first, Easter / Good Friday only fill empty days)
+    easter_days = []
     for y in range(min_year, max_year + 1):
-        try:
-            e_date = pd.Timestamp(easter(y))
-            easter_dates[e_date] = 'Easter Sunday'
-            good_fridays[e_date - pd.Timedelta(days=2)] = 'Good Friday'
-        except: pass
-        
-    # Result container
-    results = []
-    
-    for d in dates:
-        dt = d.date()
-        res = {
-            'is_holiday': 0,
-            'is_holiday_exact_day': 0,
-            'is_holiday_travel_window': 0,
-            'holiday_name': '',
-            'is_spring_break': 0
-        }
-        
-        # 1. Base Holiday Check
-        name = us_holidays.get(dt)
-        if not name:
-            if d in easter_dates: name = easter_dates[d]
-            elif d in good_fridays: name = good_fridays[d]
-            
-        if name:
-            res['is_holiday'] = 1
-            res['holiday_name'] = name
-            
-            # Check if it is a "Target Holiday" (Exact Day)
-            if any(t in name for t in TARGET_HOLIDAYS) or name == 'Good Friday':
-                res['is_holiday_exact_day'] = 1
-        
-        # 2. Travel Window Logic (The "Window" Check)
-        # Check against ALL target holidays to see if d falls in their window
-        # This scans the calendar around d
-        # Optimization: Scan only reasonable range? No, easier to iterate targets for this year
-        
-        # Better approach: We need to know if 'd' is close to ANY target holiday
-        # Let's find the closest target holiday
-        # (This duplicates some "nearest_holiday" logic but is needed for the window flag)
-        
-        # Actually, for the 'is_holiday_travel_window' flag, we can be simpler:
-        # Is this day within the window of a Tier 1 or Tier 2 holiday?
-        
-        # We need the DATE of the target holidays for this year (and prev/next year for boundary)
-        # This is expensive to do per row. 
-        # Vectorized approach is better, but function is per-row? No, input is Series.
-        pass # Will implement vectorized below
-        
-        results.append(res)
-        
-    # Vectorized Implementation
-    df_res = pd.DataFrame(results) # Init with base
-    df_res['date'] = dates.values # Use values to ignore index alignment
-    
-    # Re-eval Windows efficiently
-    # Generate all Target Holiday Dates
-    target_events = []
+        e_date = pd.Timestamp(easter(y))
+        easter_days.append((e_date, 'Easter Sunday'))
+        easter_days.append((e_date - pd.Timedelta(days=2), 'Good Friday'))
+
+    for date, name in list(us_holidays.items()) + easter_days:
+        pos = (pd.Timestamp(date) - day_index[0]).days
+        if not (0 <= pos < n) or name_code[pos] != 0:
+            continue
+        name_code[pos] = code_of(name)
+        if any(t in name for t in TARGET_HOLIDAYS) or name == 'Good Friday':
+            is_exact_day[pos] = 1
+
+    is_holiday = (name_code != 0).astype(np.int8)
+
+    # 2. Travel windows
+    events = []
     for date, name in us_holidays.items():
         if any(t in name for t in TARGET_HOLIDAYS):
-            target_events.append({'date': pd.Timestamp(date), 'name': name, 'type': 'tier1' if any(t1 in name for t1 in TIER_1_HOLIDAYS) else 'tier2'})
-            
-    # Add Easter/Good Friday
-    for y in range(min_year, max_year + 1):
-        try:
-            ed = pd.Timestamp(easter(y))
-            target_events.append({'date': ed, 'name': 'Easter Sunday', 'type': 'tier2'}) # Easter is short window
-            target_events.append({'date': ed - pd.Timedelta(days=2), 'name': 'Good Friday', 'type': 'tier2'})
-        except: pass
-        
-    # Mark Windows
-    # Create mask
-    window_mask = pd.Series(0, index=df_res.index)
-    window_names = pd.Series('', index=df_res.index) # Append names?
-    
-    for event in target_events:
-        e_date = event['date']
-        w_size = 6 if event['type'] == 'tier1' else 3
-        
-        # Define window range
-        win_start = e_date - pd.Timedelta(days=w_size)
-        win_end = e_date + pd.Timedelta(days=w_size)
-        
-        # Find rows in this window
-        mask = (df_res['date'] >= win_start) & (df_res['date'] <= win_end) & (df_res['date'] != e_date)
-        
-        df_res.loc[mask, 'is_holiday_travel_window'] = 1
-        
-        # Optional: Add window name if empty
-        # If multiple windows overlap, we just say "Travel Window"
-        # Or "Travel Window (HolidayName)"
-        # For simplicity in 'traffic_full', we often just want the flag.
-        
-        # Updating name for windows? Current logic in merge_db was:
-        # holiday_name = "Travel Window (Name)"
-        # Let's support that
-        
-        current_names = df_res.loc[mask, 'holiday_name']
-        new_name = f"Travel Window ({event['name']})"
-        
-        # Only overwrite if empty or append?
-        # If it's already a holiday (e.g. overlap), keep existing name
-        # If it's empty, set it.
-        # If it's "Travel Window (Other)", maybe append?
-        
-        # Vectorized update
-        # 1. Empty names -> Set
-        # 2. Non-empty -> Keep (Priority to actual holiday or existing window)
-        mask_empty = mask & (df_res['holiday_name'] == '')
-        df_res.loc[mask_empty, 'holiday_name'] = new_name
-        
+            events.append((pd.Timestamp(date), name, 'tier1' if any(t1 in name for t1 in TIER_1_HOLIDAYS) else 'tier2'))
+    for e_date, name in easter_days:
+        events.append((e_date, name, 'tier2'))
+
+    is_travel_window = np.zeros(n, dtype=np.int8)
+    for e_date, name, tier in events:
+        center = (e_date - day_index[0]).days
+        w_size = TIER_WINDOW_DAYS[tier]
+        window = np.arange(max(center - w_size, 0), min(center + w_size, n - 1) + 1)
+        window = window[window != center]
+        if len(window) == 0:
+            continue
+        is_travel_window[window] = 1
+        empty = window[name_code[window] == 0]
+        if len(empty):
+            name_code[empty] = code_of(f"Travel Window ({name})")
+
     # 3. Spring Break
-    # Month 3, 4 + Weekend + Not Holiday
-    df_res['dow'] = df_res['date'].dt.dayofweek
-    df_res['month'] = df_res['date'].dt.month
-    
-    mask_sb = (df_res['month'].isin([3, 4])) & \
-              (df_res['dow'].isin([5, 6])) & \
-              (df_res['is_holiday'] == 0)
-              
-    df_res.loc[mask_sb, 'is_spring_break'] = 1
-    
-    return df_res[['is_holiday', 'is_holiday_exact_day', 'is_holiday_travel_window', 'holiday_name', 'is_spring_break']]
+    is_spring_break = (np.isin(day_index.month, [3, 4]) &
+                       np.isin(day_index.dayofweek, [5, 6]) &
+                       (is_holiday == 0)).astype(np.int8)
+
+    return {
+        'day0': day0,
+        'name_code': name_code,
+        'is_holiday': is_holiday,
+        'is_exact_day': is_exact_day,
+        'is_travel_window': is_travel_window,
+        'is_spring_break': is_spring_break,
+        'names': np.array(names, dtype=object),
+    }
+
+def _calendar_cache_path(min_year, max_year):
+    return os.path.join(CACHE_DIR, f"holiday_calendar_v{HOLIDAY_CALENDAR_VERSION}_"
+                                   f"h{holidays.__version__}_{min_year}_{max_year}.npz")
+
+def _load_calendar_from_disk(path):
+    with np.load(path, allow_pickle=False) as data:
+        cal = {k: data[k] for k in data.files}
+    cal['day0'] = int(cal['day0'])
+    cal['names'] = np.array(cal['names'].tolist(), dtype=object)
+    return cal
+
+def _save_calendar_to_disk(path, cal):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    payload = dict(cal)
+    payload['names'] = np.array(cal['names'].tolist(), dtype=str)
+    # 每个写入者一个唯一的临时文件 (多个进程 / 线程同时重建同一区间时互不覆盖)，写完后原子替换。
+    # 写入文件对象而不是路径: np.savez 不会再追加 .npz 后缀
+    tmp = tempfile.NamedTemporaryFile(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp', delete=False)
+    try:
+        with tmp:
+            np.savez(tmp, **payload)
+        os.replace(tmp.name, path)
+    except Exception:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+        raise
+
+@lru_cache(maxsize=32)
+def get_holiday_calendar(min_year, max_year):
+    """
+    Int-coded holiday calendar for [min_year, max_year] (read-only arrays).
+    Lookup order: in-process LRU -> data/cache/*.npz -> rebuild (and persist).
+    """
+    path = _calendar_cache_path(min_year, max_year)
+    cal = None
+    if os.path.exists(path):
+        try:
+            cal = _load_calendar_from_disk(path)
+        except Exception as e:
+            print(f"⚠️ Holiday calendar cache unreadable ({e}), rebuilding...")
+
+    if cal is None:
+        cal = _build_holiday_calendar(min_year, max_year)
+        try:
+            _save_calendar_to_disk(path, cal)
+        except Exception as e:
+            print(f"⚠️ Could not persist holiday calendar cache: {e}")
+
+    for v in cal.values():
+        if isinstance(v, np.ndarray):
+            v.flags.writeable = False
+    return cal
 
 # ==========================================
 # 3. New Optimization Features (Classic v2)
@@ -222,3 +260,61 @@ def get_clean_lag_date(date, holiday_dates, lag_days=7):
         
     return current_lag_date # Fallback if everything is a holiday (unlikely for 4 weeks)
 
+
+# ==========================================
+# 4. Holiday Calendar Index (Nearest Holiday Lookup)
+# ==========================================
+
+# Distances beyond +/- HOLIDAY_DISTANCE_CLAMP days collapse to +/-(clamp + 1)
+HOLIDAY_DISTANCE_CLAMP = 14
+
+def _to_day_numbers(dates):
+    """Convert any date-like input to int64 day numbers (days since 1970-01-01)."""
+    values = pd.to_datetime(pd.Series(dates)).values
+    return values.astype('datetime64[D]').astype(np.int64)
+
+@lru_cache(maxsize=None)
+def get_major_holiday_days(start_year=2019, end_year=2030):
+    """
+    Sorted int64 day numbers of all major holidays in [start_year, end_year]:
+    whitelisted federal holidays (TARGET_HOLIDAYS, incl. observed days) + Good Friday.
+    The returned array is cached and read-only.
+    """
+    days = set()
+    for date, name in get_us_holidays(start_year, end_year).items():
+        if any(target in name for target in TARGET_HOLIDAYS):
+            days.add(pd.Timestamp(date))
+    for y in range(start_year, end_year + 1):
+        days.add(pd.Timestamp(easter(y)) - pd.Timedelta(days=2))
+
+    arr = _to_day_numbers(sorted(days))
+    arr.flags.writeable = False
+    return arr
+
+def days_to_nearest_holiday(dates, start_year=2019, end_year=2030, clamp=HOLIDAY_DISTANCE_CLAMP):
+    """
+    Signed distance in days from each date to its nearest major holiday
+    (positive = after the holiday), clamped to +/-(clamp + 1).
+
+    Uses np.searchsorted over the precomputed holiday index, so the cost is
+    O(rows * log(holidays)). Ties between a past and an upcoming holiday
+    resolve to the past one, matching the original per-row loop.
+    """
+    day = _to_day_numbers(dates)
+    hol = get_major_holiday_days(start_year, end_year)
+    n = len(hol)
+    if n == 0:
+        return np.full(len(day), clamp + 1, dtype=np.int64)
+
+    idx = np.searchsorted(hol, day, side='left')
+    has_prev = idx > 0
+    has_next = idx < n
+    dist_prev = day - hol[np.clip(idx - 1, 0, n - 1)]   # >= 0
+    dist_next = day - hol[np.clip(idx, 0, n - 1)]       # <= 0
+
+    use_prev = has_prev & (~has_next | (dist_prev <= -dist_next))
+    dist = np.where(use_prev, dist_prev, dist_next)
+
+    dist = np.where(dist > clamp, clamp + 1, dist)
+    dist = np.where(dist < -clamp, -(clamp + 1), dist)
+    return dist.astype(np.int64)
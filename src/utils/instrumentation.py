@@ -0,0 +1,358 @@
+"""
+Instrumentation (分阶段计时 / 剖析)
+
+span(name) 既可作为上下文管理器也可作为装饰器，记录:
+    wall_s   - 墙钟耗时
+    cpu_s    - 进程 CPU 时间 (所有线程合计；cpu_s / wall_s > 1 表示多核并行)
+    rss_mb   - 结束时的常驻内存；rss_delta_mb - 相对开始时的变化
+嵌套的 span 按线程记录父子关系。完成的 span 先进入进程内缓冲，
+由最外层 span 结束时批量写入 SQLite 表 metric_spans (Flask 通过 /api/metrics 读取)。
+
+环境变量:
+    TSA_PROFILE=cprofile              最外层 span 同时开启 cProfile，结果写入 data/profiles/*.prof
+    TSA_PROFILE=pyinstrument          同上，使用 pyinstrument (未安装时回退 cProfile)，输出 *.html
+    TSA_PROFILE=cprofile:train_xgb    只剖析名称以 train_xgb 开头的 span
+    TSA_METRICS=0                     不写入 metric_spans (只打印 / 剖析)
+    TSA_METRICS_RETENTION_DAYS=14     metric_spans 保留天数 (写入时顺带清理，另有 MAX_SPAN_ROWS 行数上限)
+
+Usage:
+    with span('merge.load_sources'):
+        ...
+
+    @span('train_xgb.run')
+    def run(...):
+        ...
+"""
+import atexit
+import contextlib
+import copy
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.config import PROJECT_ROOT
+
+try:
+    import psutil   # 可选: 跨平台 RSS；未安装时 Linux 读取 /proc，其余平台记为空
+    _PROCESS = psutil.Process()
+except ImportError:
+    psutil = None
+
+SPAN_TABLE = 'metric_spans'
+PROFILE_DIR = os.path.join(PROJECT_ROOT, 'data', 'profiles')
+
+# 缓冲写入: 最外层 span 结束时，缓冲达到 FLUSH_SPANS 条或距上次写入超过 FLUSH_SECONDS 秒才写库
+FLUSH_SPANS = 50
+FLUSH_SECONDS = 5.0
+
+# 保留策略: 写入时按天数 + 行数上限删除旧 span，每个进程最多每 PRUNE_SECONDS 秒清理一次
+RETENTION_DAYS = int(os.environ.get('TSA_METRICS_RETENTION_DAYS', 14))
+MAX_SPAN_ROWS = 200_000
+PRUNE_SECONDS = 600.0
+
+# /api/metrics 未指定 since 时的汇总窗口
+SUMMARY_DAYS = 7
+
+_TIME_FMT = '%Y-%m-%d %H:%M:%S.%f'
+
+_MB = 1024 * 1024
+_local = threading.local()
+_buffer = []
+_buffer_lock = threading.Lock()
+_last_flush = 0.0
+_last_prune = {}
+_schema_ready = set()
+
+
+def current_rss_mb():
+    """当前进程常驻内存 (MB)，无法获取时返回 None"""
+    if psutil is not None:
+        return _PROCESS.memory_info().rss / _MB
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / _MB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _profile_setting():
+    """TSA_PROFILE -> (工具, 名称前缀)；未开启时工具为 None"""
+    value = os.environ.get('TSA_PROFILE', '').strip()
+    if not value or value == '0':
+        return None, ''
+    tool, _, prefix = value.partition(':')
+    tool = tool.lower()
+    return ('pyinstrument' if tool == 'pyinstrument' else 'cprofile'), prefix
+
+
+def _metrics_enabled():
+    return os.environ.get('TSA_METRICS', '1') != '0'
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+class _Profiler:
+    """cProfile / pyinstrument 的统一包装；启动失败 (例如另一线程已在剖析) 时静默跳过"""
+
+    def __init__(self, tool):
+        self.tool = tool
+        self._impl = None
+
+    def start(self):
+        try:
+            if self.tool == 'pyinstrument':
+                try:
+                    from pyinstrument import Profiler
+                    self._impl = Profiler()
+                except ImportError:
+                    print("⚠️ [Profile] pyinstrument 未安装，改用 cProfile")
+                    self.tool = 'cprofile'
+            if self.tool == 'cprofile':
+                import cProfile
+                self._impl = cProfile.Profile()
+                self._impl.enable()
+            else:
+                self._impl.start()
+        except (ValueError, RuntimeError) as e:
+            print(f"⚠️ [Profile] 无法开启剖析: {e}")
+            self._impl = None
+        return self
+
+    def stop(self, name):
+        if self._impl is None:
+            return None
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        safe = ''.join(c if c.isalnum() or c in '._-' else '_' for c in name)
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if self.tool == 'cprofile':
+            self._impl.disable()
+            path = os.path.join(PROFILE_DIR, f"{safe}-{stamp}.prof")
+            self._impl.dump_stats(path)
+        else:
+            self._impl.stop()
+            path = os.path.join(PROFILE_DIR, f"{safe}-{stamp}.html")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self._impl.output_html())
+        print(f"   🔬 [Profile] {name} -> {path}")
+        return path
+
+
+def _make_record(name, parent, depth, started_at, wall, cpu, rss0, rss, status='ok', tags=None):
+    return {
+        'name': name,
+        'parent': parent,
+        'depth': depth,
+        'started_at': started_at.strftime(_TIME_FMT)[:-3],
+        'wall_s': round(wall, 6),
+        'cpu_s': round(cpu, 6),
+        'rss_mb': None if rss is None else round(rss, 1),
+        'rss_delta_mb': None if rss is None or rss0 is None else round(rss - rss0, 1),
+        'status': status,
+        'tags': json.dumps(tags, default=str) if tags else None,
+    }
+
+
+class Span(contextlib.ContextDecorator):
+    def __init__(self, name, **tags):
+        self.name = name
+        self.tags = tags
+        self.record = None
+
+    def _recreate_cm(self):
+        # 作为装饰器时每次调用使用独立实例 (支持递归 / 多线程并发调用)
+        return copy.copy(self)
+
+    def __enter__(self):
+        stack = _stack()
+        self._parent = stack[-1].name if stack else None
+        self._depth = len(stack)
+        stack.append(self)
+
+        self._profiler = None
+        tool, prefix = _profile_setting()
+        if tool and self._depth == 0 and self.name.startswith(prefix):
+            self._profiler = _Profiler(tool).start()
+
+        self._started_at = datetime.datetime.now()
+        self._rss0 = current_rss_mb()
+        self._cpu0 = time.process_time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._t0
+        cpu = time.process_time() - self._cpu0
+        rss = current_rss_mb()
+        profile_path = self._profiler.stop(self.name) if self._profiler else None
+
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+
+        tags = {**self.tags, 'profile': profile_path} if profile_path else self.tags
+        self.record = _make_record(self.name, self._parent, self._depth, self._started_at, wall, cpu,
+                                   self._rss0, rss, 'error' if exc_type else 'ok', tags)
+        _record(self.record, root=self._depth == 0)
+        return False
+
+
+def span(name, **tags):
+    """计时 span (上下文管理器 / 装饰器)。tags 作为 JSON 随 span 保存。"""
+    return Span(name, **tags)
+
+
+class StageClock:
+    """
+    分阶段计时: lap(name) 记录距上一次 lap 的区间 (墙钟 / CPU / RSS)，
+    作为当前 span 的子 span 保存；summary() 打印汇总。
+    """
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.timings = {}
+        stack = _stack()
+        self._parent = stack[-1].name if stack else None
+        self._depth = len(stack)
+        self._mark()
+
+    def _mark(self):
+        self._last = time.perf_counter()
+        self._last_cpu = time.process_time()
+        self._last_rss = current_rss_mb()
+        self._last_at = datetime.datetime.now()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        wall = now - self._last
+        cpu = time.process_time() - self._last_cpu
+        rss = current_rss_mb()
+        self.timings[name] = self.timings.get(name, 0.0) + wall
+        print(f"   ⏱️ [Stage] {name}: {self.timings[name]:.2f}s")
+        _record(_make_record(f"{self.prefix}{name}", self._parent, self._depth, self._last_at,
+                             wall, cpu, self._last_rss, rss), root=self._depth == 0)
+        self._mark()
+
+    def summary(self):
+        total = sum(self.timings.values())
+        print("\n[TIMING] Stage breakdown:")
+        for name, sec in self.timings.items():
+            print(f"   {name:<20} {sec:8.2f}s  ({sec / total * 100 if total else 0:5.1f}%)")
+        print(f"   {'total':<20} {total:8.2f}s")
+
+
+# ==========================================
+# Persistence
+# ==========================================
+
+_COLUMNS = ['name', 'parent', 'depth', 'started_at', 'wall_s', 'cpu_s', 'rss_mb', 'rss_delta_mb', 'status', 'tags']
+
+
+def _record(record, root):
+    if not _metrics_enabled():
+        return
+    with _buffer_lock:
+        _buffer.append(record)
+        due = len(_buffer) >= FLUSH_SPANS or time.monotonic() - _last_flush >= FLUSH_SECONDS
+    if root and due:
+        flush()
+
+
+def flush(db_path=None):
+    """把缓冲中的 span 写入 metric_spans (失败时只打印，不影响调用方)"""
+    global _last_flush
+    with _buffer_lock:
+        rows = [tuple(r[c] for c in _COLUMNS) for r in _buffer]
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    if not rows:
+        return 0
+    try:
+        from src.db import ensure_schema, get_connection
+        conn = get_connection(db_path)
+        try:
+            if db_path not in _schema_ready:
+                ensure_schema(conn)
+                _schema_ready.add(db_path)
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO {SPAN_TABLE} ({', '.join(_COLUMNS)}) VALUES ({', '.join(['?'] * len(_COLUMNS))})",
+                    rows
+                )
+                if time.monotonic() - _last_prune.get(db_path, float('-inf')) >= PRUNE_SECONDS:
+                    prune(conn)
+                    _last_prune[db_path] = time.monotonic()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"⚠️ [Metrics] 写入 {SPAN_TABLE} 失败: {e}")
+        return 0
+    return len(rows)
+
+
+atexit.register(flush)
+
+
+def prune(conn, retention_days=RETENTION_DAYS, max_rows=MAX_SPAN_ROWS):
+    """删除 retention_days 天前的 span，并只保留最近 max_rows 行；返回删除行数 (调用方负责提交)"""
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=retention_days)).strftime(_TIME_FMT)[:-3]
+    deleted = conn.execute(f"DELETE FROM {SPAN_TABLE} WHERE started_at < ?", (cutoff,)).rowcount
+    deleted += conn.execute(
+        f"DELETE FROM {SPAN_TABLE} WHERE id <= (SELECT id FROM {SPAN_TABLE} ORDER BY id DESC LIMIT 1 OFFSET ?)",
+        (max_rows,)
+    ).rowcount
+    return deleted
+
+
+def query_spans(conn, name=None, since=None, limit=200):
+    """
+    读取 span: 按名称前缀 / 起始时间过滤 (since 默认最近 SUMMARY_DAYS 天)。
+    返回 {'summary': [每个名称的次数 / 墙钟 p50 p95 max / CPU 均值 / RSS 峰值], 'recent': [最近 limit 条]}
+    汇总在 SQLite 中用窗口函数完成 (p50 / p95 取 nearest-rank)，不把整段窗口读入 pandas。
+    """
+    if not since:
+        since = (datetime.datetime.now() - datetime.timedelta(days=SUMMARY_DAYS)).strftime('%Y-%m-%d')
+    where, params = ["started_at >= ?"], [since]
+    if name:
+        where.append("name LIKE ?")
+        params.append(f"{name}%")
+    clause = f"WHERE {' AND '.join(where)}"
+
+    summary = pd.read_sql(f"""
+        WITH ranked AS (
+            SELECT name, wall_s, cpu_s, rss_mb, status, started_at,
+                   ROW_NUMBER() OVER (PARTITION BY name ORDER BY wall_s) AS rn,
+                   COUNT(*) OVER (PARTITION BY name) AS n
+            FROM {SPAN_TABLE} {clause}
+        )
+        SELECT name,
+               COUNT(*) AS count,
+               ROUND(MAX(CASE WHEN rn = (n * 50 + 99) / 100 THEN wall_s END), 4) AS wall_p50,
+               ROUND(MAX(CASE WHEN rn = (n * 95 + 99) / 100 THEN wall_s END), 4) AS wall_p95,
+               ROUND(MAX(wall_s), 4) AS wall_max,
+               ROUND(AVG(cpu_s), 4) AS cpu_mean,
+               ROUND(MAX(rss_mb), 4) AS rss_max,
+               SUM(status = 'error') AS errors,
+               MAX(started_at) AS last_at
+        FROM ranked
+        GROUP BY name
+        ORDER BY wall_p95 DESC
+    """, conn, params=params)
+    if summary.empty:
+        return {'summary': [], 'recent': []}
+    summary = summary.astype(object).where(summary.notna(), None)
+
+    recent = pd.read_sql(f"SELECT {', '.join(_COLUMNS)} FROM {SPAN_TABLE} {clause} ORDER BY id DESC LIMIT ?",
+                         conn, params=params + [limit])
+    recent['tags'] = recent['tags'].map(lambda t: json.loads(t) if t else None)
+    recent = recent.astype(object).where(recent.notna(), None)
+    return {'summary': summary.to_dict(orient='records'), 'recent': recent.to_dict(orient='records')}
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 1. Severity Configuration
+# ==========================================
+
+# 单机场恶劣天气评分 (阈值累加: 超过每一档各加对应分数)
+SNOW_THRESHOLDS_CM = [(1.0, 1), (5.0, 2)]                    # >5cm gets +3 total
+WIND_THRESHOLDS_KMH = [(29.0, 1), (40.0, 2)]                 # >40kmh gets +3 total
+# Flash Freeze Logic - Tuned for Southern Hub Sensitivity (低于阈值加分)
+FREEZE_THRESHOLDS_C = [(-5.0, 1), (-10.0, 1), (-15.0, 1)]    # <-10 gets +2 (DFW), <-15 gets +3 (ORD)
+
+# 全美指数: 评分 >= BAD_HUB_SCORE 的机场为 "坏点"，按坏点数量加罚分 (取满足的最高一档)
+BAD_HUB_SCORE = 3
+BAD_HUB_PENALTIES = [(3, 20), (2, 10)]
+
+# ==========================================
+# 2. Logic Functions
+# ==========================================
+
+def severity_score(df):
+    """
+    Per-hub severity score for a weather frame with columns
+    [snowfall_cm, windspeed_kmh, temperature_min_c]. Returns an int64 ndarray aligned with df.
+    Missing values never score (NaN comparisons are False), same as the original row-wise rule.
+    """
+    snow = df['snowfall_cm'].to_numpy(dtype=float)
+    wind = df['windspeed_kmh'].to_numpy(dtype=float)
+    temp = df['temperature_min_c'].to_numpy(dtype=float)
+
+    score = np.zeros(len(df), dtype=np.int64)
+    for threshold, points in SNOW_THRESHOLDS_CM:
+        score += (snow > threshold) * points
+    for threshold, points in WIND_THRESHOLDS_KMH:
+        score += (wind > threshold) * points
+    for threshold, points in FREEZE_THRESHOLDS_C:
+        score += (temp < threshold) * points
+    return score
+
+def national_weather_index(df, date_col='date', score_col='severity_score'):
+    """
+    Daily national weather index from per-hub scores:
+        index = sum(score) + penalty(count of hubs with score >= BAD_HUB_SCORE)
+    Returns a DataFrame [date_col, 'weather_index'] sorted by date.
+    If score_col is missing it is computed with severity_score().
+    """
+    scores = df[score_col] if score_col in df.columns else pd.Series(severity_score(df), index=df.index)
+    frame = pd.DataFrame({
+        date_col: df[date_col],
+        'base': scores,
+        'bad': (scores >= BAD_HUB_SCORE).astype(np.int64),
+    })
+    agg = frame.groupby(date_col, sort=True).agg(base=('base', 'sum'), bad=('bad', 'sum'))
+
+    penalty = np.select([agg['bad'].to_numpy() >= n for n, _ in BAD_HUB_PENALTIES],
+                        [p for _, p in BAD_HUB_PENALTIES], default=0)
+    return pd.DataFrame({
+        date_col: agg.index,
+        'weather_index': agg['base'].to_numpy() + penalty,
+    })
@@ -1,6 +1,28 @@
 // api.js - Centralized API Service
 
+const JOB_POLL_INTERVAL_MS = 1500;
+
 const API = {
+    // [NEW] 后台任务轮询: 提交后拿到 job_id，直到任务结束再返回 (与旧的同步响应结构保持一致)
+    async getJob(jobId) {
+        const res = await fetch(`/api/jobs/${jobId}`);
+        if (!res.ok) throw new Error('Failed to fetch job status');
+        return await res.json();
+    },
+
+    async waitForJob(submitted, onProgress = null) {
+        if (!submitted.job_id) return submitted;
+        while (true) {
+            const job = await this.getJob(submitted.job_id);
+            if (onProgress) onProgress(job);
+            if (job.status === 'succeeded') return { status: 'success', data: job.result, job };
+            if (job.status === 'failed' || job.status === 'interrupted') {
+                return { status: 'error', message: job.error || job.status, job };
+            }
+            await new Promise(r => setTimeout(r, JOB_POLL_INTERVAL_MS));
+        }
+    },
+
     async getHistory() {
         const res = await fetch('/api/data');
         if (!res.ok) throw new Error('Failed to fetch history');
@@ -31,10 +53,10 @@ const API = {
         return await res.json();
     },
 
-    async runPrediction() {
+    async runPrediction(onProgress = null) {
         const res = await fetch('/api/run_prediction', { method: 'POST' });
         if (!res.ok) throw new Error('Prediction run failed');
-        return await res.json();
+        return await this.waitForJob(await res.json(), onProgress);
     },
 
     async runSniper() {
@@ -43,10 +65,10 @@ const API = {
         return await res.json();
     },
 
-    async runChallenger() {
+    async runChallenger(onProgress = null) {
         const res = await fetch('/api/run_challenger', { method: 'POST' });
         if (!res.ok) throw new Error('Challenger run failed');
-        return await res.json();
+        return await this.waitForJob(await res.json(), onProgress);
     },
 
     async syncMarketSentiment() {
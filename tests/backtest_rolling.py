@@ -10,8 +10,8 @@ import sys
 # 设置路径
 sys.path.append(os.getcwd())
 from src.config import DB_PATH
-from src.utils.holiday_utils import get_holiday_features, TARGET_HOLIDAYS, get_us_holidays
-from dateutil.easter import easter
+from src.db import get_connection
+from src.utils.holiday_utils import get_holiday_features, days_to_nearest_holiday
 
 def generate_base_features(df):
     """
@@ -82,31 +82,8 @@ def generate_advanced_features(df):
         
     df['lag_holiday_yoy'] = df.apply(get_holiday_yoy, axis=1)
 
-    # 5. 距离重大假日的距离 (Ramp-up)
-    us_holidays = get_us_holidays(2019, 2030)
-    major_holiday_dates = []
-    for date, name in us_holidays.items():
-        if any(target in name for target in TARGET_HOLIDAYS):
-            major_holiday_dates.append(pd.Timestamp(date))
-    
-    # 加入 Good Friday
-    for y in df['ds'].dt.year.unique():
-        try:
-            ed = pd.Timestamp(easter(y))
-            major_holiday_dates.append(ed - pd.Timedelta(days=2))
-        except: pass
-    major_holiday_dates = sorted(list(set(major_holiday_dates)))
-    
-    def get_dist(d):
-        d_ts = pd.Timestamp(d)
-        min_diff = 999
-        for h in major_holiday_dates:
-            diff = (d_ts - h).days
-            if abs(diff) < abs(min_diff):
-                min_diff = diff
-        return np.clip(min_diff, -15, 15)
-
-    df['days_to_nearest_holiday'] = df['ds'].apply(get_dist)
+    # 5. 距离重大假日的距离 (Ramp-up) - 向量化节日索引
+    df['days_to_nearest_holiday'] = days_to_nearest_holiday(df['ds'])
 
     # 6. Off-Peak 工作日 (Tue/Wed in Jan/Feb/Sep/Oct)
     match_month = df['ds'].dt.month.isin([1, 2, 9, 10])
@@ -124,7 +101,7 @@ def run_rolling_backtest():
     print("🚀 开始步进式回测 (Rolling Walk-Forward)...")
     
     # 1. 加载数据
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     raw_df = pd.read_sql("SELECT date as ds, throughput as y, weather_index FROM traffic_full ORDER BY date", conn)
     conn.close()
     
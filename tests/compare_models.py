@@ -7,12 +7,13 @@ from xgboost import XGBRegressor
 
 sys.path.append(os.getcwd())
 from src.config import DB_PATH
+from src.db import get_connection
 
 def run_comparison():
     print("Starting Model Comparison...")
     
     # 1. Load Data
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     try:
         print("  Loading data from traffic_full...")
         df = pd.read_sql("SELECT * FROM traffic_full", conn)
@@ -51,8 +52,7 @@ def run_comparison():
     # Holiday Features (Advanced)
     print("  Generating Advanced Holiday Features...")
     try:
-        from src.utils.holiday_utils import get_holiday_features, TARGET_HOLIDAYS, get_us_holidays
-        from dateutil.easter import easter
+        from src.utils.holiday_utils import get_holiday_features, days_to_nearest_holiday
         
         # 1. Base Flags
         ds_series = df['ds'] if isinstance(df['ds'], pd.Series) else pd.Series(df['ds'])
@@ -60,34 +60,8 @@ def run_comparison():
         for c in h_feats.columns:
             df[c] = h_feats[c].values
             
-        # 2. Distance to Holiday (Critical for Ramp-up)
-        us_holidays = get_us_holidays(2019, 2030)
-        major_holiday_dates = []
-        for date, name in us_holidays.items():
-            if any(target in name for target in TARGET_HOLIDAYS):
-                major_holiday_dates.append(pd.Timestamp(date))
-        
-        # Add Good Friday
-        for y in df['ds'].dt.year.unique():
-            try:
-                ed = pd.Timestamp(easter(y))
-                major_holiday_dates.append(ed - pd.Timedelta(days=2))
-            except: pass
-        major_holiday_dates = sorted(list(set(major_holiday_dates)))
-        
-        def get_dist(d):
-            best_dist = 15
-            d_ts = pd.Timestamp(d)
-            min_diff = 999
-            for h in major_holiday_dates:
-                diff = (d_ts - h).days
-                if abs(diff) < abs(min_diff):
-                    min_diff = diff
-            if min_diff > 14: return 15
-            if min_diff < -14: return -15
-            return min_diff
-
-        df['days_to_nearest_holiday'] = df['ds'].apply(get_dist)
+        # 2. Distance to Holiday (Critical for Ramp-up) - Vectorized Holiday Index
+        df['days_to_nearest_holiday'] = days_to_nearest_holiday(df['ds'])
 
         # 3. Off-Peak Workday (Tue/Wed in Jan/Feb/Sep/Oct)
         match_month = df['ds'].dt.month.isin([1, 2, 9, 10])
@@ -145,7 +119,7 @@ def run_comparison():
     try:
         import pickle
         from src.models.model_utils import get_aggregated_weather_features
-        conn_shadow = sqlite3.connect(DB_PATH)
+        conn_shadow = get_connection()
         df_weather_agg = get_aggregated_weather_features(conn_shadow)
         conn_shadow.close()
         
@@ -7,11 +7,12 @@ import sys
 
 sys.path.append(os.getcwd())
 from src.config import DB_PATH
+from src.db import get_connection
 
 def run_classic_backtest():
     print("🚀 Running CLASSIC Backtest (No Weather Penalties)...")
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     df = pd.read_sql("SELECT date, throughput FROM traffic_full", conn)
     conn.close()
     
@@ -11,13 +11,14 @@ import sys
 # Add src to path if run directly
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH, FORECAST_MODEL_PATH
+from src.db import get_connection
 
 warnings.filterwarnings('ignore')
 
 def run():
     # 1. 加载数据 (From DB)
     print("Loading data from SQLite (Classic Mode)...")
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     try:
         df = pd.read_sql("SELECT * FROM traffic_full", conn)
     except Exception as e:
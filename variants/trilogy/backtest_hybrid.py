@@ -8,12 +8,13 @@ from xgboost import XGBRegressor
 # Add src to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH
+from src.db import get_connection
 from src.models.model_utils import get_aggregated_weather_features
 
 def run_backtest():
     print("🚀 Starting Rolling Backtest (2023, 2024, 2025, 2026)...")
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     df = pd.read_sql("SELECT * FROM traffic_full ORDER BY date", conn)
     
     # Load Weather for Shadow Model
@@ -43,7 +44,7 @@ def run_backtest():
             with open(shadow_model_path, 'rb') as f:
                 shadow_model = pickle.load(f)
             
-            conn_shad = sqlite3.connect(DB_PATH)
+            conn_shad = get_connection()
             df_w_agg = get_aggregated_weather_features(conn_shad)
             conn_shad.close()
             
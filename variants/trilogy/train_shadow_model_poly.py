@@ -11,9 +11,10 @@ from sklearn.metrics import mean_absolute_error, r2_score
 # Add src to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH
+from src.db import get_connection
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     conn.row_factory = sqlite3.Row
     return conn
 
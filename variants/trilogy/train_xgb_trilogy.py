@@ -11,13 +11,15 @@ import sys
 # Add src to path if run directly
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.config import DB_PATH, FORECAST_MODEL_PATH
+from src.db import ensure_schema, get_connection
+from src.db.predictions import log_predictions
 
 warnings.filterwarnings('ignore')
 
 def run():
     # 1. 加载数据 (From DB)
     print("Loading data from SQLite (traffic_full)...")
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     try:
         df = pd.read_sql("SELECT * FROM traffic_full", conn)
     except Exception as e:
@@ -38,7 +40,7 @@ def run():
     # [NEW] Load Weather (Flights Removed)
     try:
         print("Loading Weather from SQLite...")
-        conn_extra = sqlite3.connect(DB_PATH, timeout=30)
+        conn_extra = get_connection()
         
         # 2. Weather
         try:
@@ -85,7 +87,7 @@ def run():
                 shadow_model = pickle.load(f)
             
             # 1. Get Features
-            conn_shadow = sqlite3.connect(DB_PATH)
+            conn_shadow = get_connection()
             df_weather_agg = get_aggregated_weather_features(conn_shadow)
             conn_shadow.close()
             
@@ -184,47 +186,8 @@ def run():
 
     # [NEW] Whitelist & Clamping Logic for Historical Data
     print("   Calculating holiday distances for training data (Using Unified Tier 1/2 List)...")
-    from src.utils.holiday_utils import TARGET_HOLIDAYS, get_us_holidays
-    
-    # Load raw holidays to get dates
-    us_holidays = get_us_holidays(2019, 2030)
-
-    major_holiday_dates = []
-
-    # 1. Add Standard Federal Holidays (Filtered by Whitelist)
-    for date, name in us_holidays.items():
-        if any(target in name for target in TARGET_HOLIDAYS):
-            major_holiday_dates.append(pd.Timestamp(date))
-
-    # 2. Add Good Friday (Easter - 2 days)
-    from dateutil.easter import easter
-    for y in range(2019, 2030):
-        try:
-            easter_date = easter(y)
-            good_friday = pd.Timestamp(easter_date) - pd.Timedelta(days=2)
-            major_holiday_dates.append(good_friday)
-        except: pass
-
-    # Remove duplicates and sort
-    major_holiday_dates = sorted(list(set(major_holiday_dates)))
-
-    df['days_to_nearest_holiday'] = 15 # Default
-    
-    # Optimize loop? For now keep iterative as it works
-    for idx, row in df.iterrows():
-        d = row['ds']
-        min_dist = 999 
-        best_dist = 15
-        for h_date in major_holiday_dates:
-            diff_days = (d - h_date).days
-            if abs(diff_days) < abs(min_dist):
-                min_dist = diff_days
-                best_dist = diff_days
-        
-        # Clamp logic: +/- 14 window
-        if best_dist > 14: best_dist = 15
-        elif best_dist < -14: best_dist = -15
-        df.at[idx, 'days_to_nearest_holiday'] = best_dist
+    from src.utils.holiday_utils import days_to_nearest_holiday
+    df['days_to_nearest_holiday'] = days_to_nearest_holiday(df['ds'])
 
     # [NEW] Weather Rebound Logic (Revenge Travel Index)
     # Logic: Higher past weather indices = Higher current pent-up demand
@@ -401,46 +364,15 @@ def run():
 
         # D. 外部特征 (Real Holiday Logic)
         print("   Generating Future Holiday Features (Unified Utils)...")
-        from src.utils.holiday_utils import get_holiday_features, TARGET_HOLIDAYS, get_us_holidays
+        from src.utils.holiday_utils import get_holiday_features, days_to_nearest_holiday
         
         # 1. Generate Flags (is_holiday, etc)
         h_feats = get_holiday_features(future_df['ds'])
         for c in h_feats.columns:
             future_df[c] = h_feats[c].values
             
-        # 2. Generate Distance (days_to_nearest_holiday)
-        # Using unified TARGET_HOLIDAYS
-        us_holidays = get_us_holidays(2025, 2030) # Future range
-        major_holiday_dates = []
-        for date, name in us_holidays.items():
-            if any(target in name for target in TARGET_HOLIDAYS):
-                major_holiday_dates.append(pd.Timestamp(date))
-                
-        from dateutil.easter import easter
-        unique_years = future_df['ds'].dt.year.unique()
-        for y in unique_years:
-            try:
-                easter_date = easter(y)
-                good_friday = pd.Timestamp(easter_date) - pd.Timedelta(days=2)
-                major_holiday_dates.append(good_friday)
-            except: pass
-            
-        major_holiday_dates = sorted(list(set(major_holiday_dates)))
-        
-        future_df['days_to_nearest_holiday'] = 15 
-        for idx, row in future_df.iterrows():
-            d = row['ds']
-            min_dist = 999 
-            best_dist = 15 
-            for h_date in major_holiday_dates:
-                diff_days = (d - h_date).days
-                if abs(diff_days) < abs(min_dist):
-                    min_dist = diff_days
-                    best_dist = diff_days
-            
-            if best_dist > 14: best_dist = 15
-            elif best_dist < -14: best_dist = -15
-            future_df.at[idx, 'days_to_nearest_holiday'] = best_dist
+        # 2. Generate Distance (days_to_nearest_holiday) - Vectorized Holiday Index
+        future_df['days_to_nearest_holiday'] = days_to_nearest_holiday(future_df['ds'])
             
         # [NEW] Long Weekend Logic (Vectorized)
         future_df['is_long_weekend'] = 0
@@ -450,7 +382,7 @@ def run():
         # [FIX] Load Real Weather Forecast
         print("   Merging Real Weather Forecast (from DB)...")
         try:
-            conn_w = sqlite3.connect(DB_PATH)
+            conn_w = get_connection()
             df_weather = pd.read_sql("SELECT date, weather_index FROM daily_weather_index", conn_w)
             conn_w.close()
             
@@ -478,7 +410,7 @@ def run():
         # [NEW] Calculate Future Revenge Index
         # Access daily_weather_index for lags
         try:
-            conn_rev = sqlite3.connect(DB_PATH)
+            conn_rev = get_connection()
             # Pre-fetch weather history dict for fast lookup
             w_history_df = pd.read_sql("SELECT date, weather_index FROM daily_weather_index", conn_rev)
             conn_rev.close()
@@ -517,7 +449,7 @@ def run():
                  # Optimization: Re-use the df_weather_agg we calculated earlier if possible, 
                  # OR re-run get_aggregated_weather_features to get distinct future rows
                  
-                 conn_shadow_future = sqlite3.connect(DB_PATH)
+                 conn_shadow_future = get_connection()
                  df_weather_agg_future = get_aggregated_weather_features(conn_shadow_future)
                  conn_shadow_future.close()
                  
@@ -615,7 +547,7 @@ def run():
         
         # We need to ensure 'w_lag_1' is in future_df
         # Let's pull it from the DB for accuracy
-        conn_temp = sqlite3.connect(DB_PATH)
+        conn_temp = get_connection()
         df_w_hist = pd.read_sql("SELECT date, weather_index FROM daily_weather_index", conn_temp)
         conn_temp.close()
         df_w_hist['ds'] = pd.to_datetime(df_w_hist['date'])
@@ -652,36 +584,10 @@ def run():
         new_log['target_date'] = new_log['target_date'].dt.strftime('%Y-%m-%d')
 
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Delete dupes for same run date
-            dt_list = new_log['target_date'].tolist()
-            cursor.executemany("DELETE FROM prediction_history WHERE target_date = ? AND model_run_date = ?", 
-                               [(d, today_str) for d in dt_list])
-            
-            records = []
-            for _, row in new_log.iterrows():
-                records.append({
-                    'target_date': str(row['target_date']),
-                    'predicted_throughput': int(row['predicted_throughput']),
-                    'model_run_date': str(row['model_run_date']),
-                    'weather_index': int(row.get('weather_index', 0)),
-                    'is_holiday': int(row.get('is_holiday', 0)),
-                    'flight_volume': int(row.get('flight_volume', 0)), 
-                    'is_weekend': int(row.get('is_weekend', 0))
-                })
-            
-            cursor.executemany('''
-                INSERT INTO prediction_history (
-                    target_date, predicted_throughput, model_run_date, 
-                    weather_index, is_holiday, flight_volume, is_weekend
-                )
-                VALUES (
-                    :target_date, :predicted_throughput, :model_run_date,
-                    :weather_index, :is_holiday, :flight_volume, :is_weekend
-                )
-            ''', records)
+            conn = get_connection()
+            ensure_schema(conn)
+            # 与 src/models/train_xgb.py 相同的写入路径: 同时刷新 prediction_latest 并递增版本号
+            log_predictions(conn, new_log)
             
             conn.commit()
             conn.close()
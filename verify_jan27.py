@@ -1,5 +1,4 @@
 import pandas as pd
-import sqlite3
 import numpy as np
 import sys
 import os
@@ -8,93 +7,20 @@ from xgboost import XGBRegressor
 # Add src to path
 sys.path.append(os.getcwd())
 try:
-    from src.config import DB_PATH
     from src.models.feature_mgr import apply_blind_protocol, FEAT_HYBRID
+    from src.models.feature_store import FeatureStore
 except ImportError:
     # Use absolute path fallback if needed
     sys.path.append(r"d:\codingPojiect\tsa")
-    from src.config import DB_PATH
     from src.models.feature_mgr import apply_blind_protocol, FEAT_HYBRID
+    from src.models.feature_store import FeatureStore
 
 def run_verification():
     print("=== Jan 27 Blind Verification Test (Fixed) ===")
     
-    # 1. Load Data
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql("SELECT * FROM traffic_full", conn)
-    conn.close()
-    
-    df['ds'] = pd.to_datetime(df['date'])
-    df['y'] = df['throughput']
-    df = df.sort_values('ds').reset_index(drop=True)
-    
+    # 1. Load Data + Feature Engineering (Shared Feature Store, mirrors train_xgb.py)
+    df = FeatureStore().load()
     print(f"Loaded {len(df)} rows.")
-
-    # ==========================================
-    # Feature Engineering (Mirrors train_xgb.py)
-    # ==========================================
-    
-    # A. Time Components
-    df['day_of_week'] = df['ds'].dt.dayofweek
-    df['month'] = df['ds'].dt.month
-    df['year'] = df['ds'].dt.year
-    df['day_of_year'] = df['ds'].dt.dayofyear
-    df['week_of_year'] = df['ds'].dt.isocalendar().week.astype(int)
-    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-    
-    # B. Lags
-    df['lag_7'] = df['y'].shift(7).fillna(method='bfill')
-    df['y_lag_7'] = df['lag_7']
-    df['throughput_lag_7'] = df['lag_7']
-    
-    df['lag_364'] = df['y'].shift(364).fillna(method='bfill')
-    df['lag_365'] = df['y'].shift(365).fillna(method='bfill')
-    
-    # Fixed Holiday Logic for Lags
-    df['is_fixed_holiday'] = 0
-    mask_fixed = df['ds'].apply(lambda d: 
-        (d.month == 1 and d.day == 1) or
-        (d.month == 7 and d.day == 4) or
-        (d.month == 11 and d.day == 11) or
-        (d.month == 12 and d.day == 25)
-    )
-    df.loc[mask_fixed, 'is_fixed_holiday'] = 1
-    df['lag_364'] = np.where(df['is_fixed_holiday'] == 1, df['lag_365'], df['lag_364'])
-    
-    # C. Business Logic
-    match_month = df['ds'].dt.month.isin([1, 2, 9, 10])
-    match_day = df['ds'].dt.dayofweek.isin([1, 2])
-    df['is_off_peak_workday'] = (match_month & match_day).astype(int)
-    
-    # D. Missing Cols from traffic_full (if any)
-    required_cols = ['is_holiday', 'days_to_nearest_holiday', 'weather_index', 'total_flights']
-    for c in required_cols:
-        if c not in df.columns:
-            df[c] = 0
-            
-    # Normalize names
-    if 'flight_volume' not in df.columns and 'total_flights' in df.columns:
-        df['flight_volume'] = df['total_flights']
-    
-    # E. Advanced Lags
-    df['is_spring_break'] = 0 # Placeholder
-    
-    # Revenge Index
-    df['w_lag_1'] = df['weather_index'].shift(1).fillna(0)
-    df['w_lag_2'] = df['weather_index'].shift(2).fillna(0)
-    df['w_lag_3'] = df['weather_index'].shift(3).fillna(0)
-    df['revenge_index'] = (df['w_lag_1'] * 0.5) + (df['w_lag_2'] * 0.3) + (df['w_lag_3'] * 0.2)
-    
-    df['is_long_weekend'] = 0
-    
-    # Shadow Model Features (Mock or basic)
-    # If predicted_cancel_rate missing, fill 0
-    if 'predicted_cancel_rate' not in df.columns:
-        df['predicted_cancel_rate'] = 0
-        
-    df['lag_7_adjusted'] = df['lag_7'] * (1 - df['predicted_cancel_rate'])
-    df['lag_364_adjusted'] = df['lag_364'] * (1 - df['predicted_cancel_rate'])
-    df['lead_1_shadow_cancel_rate'] = df['predicted_cancel_rate'].shift(-1).fillna(0)
     
     # Drop rows where lag_364 is NaN (early data)
     df_model = df.dropna(subset=['lag_364']).copy()